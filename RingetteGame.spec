@@ -17,7 +17,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['numpy', 'pkg_resources'],
     noarchive=False,
 )
 pyz = PYZ(a.pure)
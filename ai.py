@@ -0,0 +1,303 @@
+# Computer-controlled skaters and goalies that decide from lookup tables. The
+# tables are worked out offline by simulation (python ai.py, a minute or so
+# with NumPy) and shipped as assets/ai_tables.bin, so what an AI player does
+# each frame comes down to a few array lookups:
+#
+#   shots       chance that a shot scores, per attacked goal, rink cell and
+#               aim angle, from BatchSim shots against goalies caught
+#               anywhere on their patrol
+#   intercepts  per ring state (cell, direction, speed, decay): where each
+#               goalie has to stand to meet the ring and where it comes to
+#               rest, from trajectory.py
+#
+# Loading the tables needs only the standard library, so the packaged game
+# doesn't carry NumPy. They are built for the default Rules; rebuild them
+# after changing the balance settings.
+#
+#   python ai.py                 rebuild assets/ai_tables.bin
+#   python main.py --ai          play with AI teammates, opponents and goalies
+import argparse
+import math
+import os
+import struct
+import zlib
+from array import array
+from game import *
+from asset_cache import get_asset_path
+
+TABLES_FILE = "ai_tables.bin"
+MAGIC = b"RGAI"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHHHHfI")  # Magic, version, cell size, columns, rows, angles, speeds, speed step, payload length
+CELL_SIZE = 40
+COLUMNS = WIDTH // CELL_SIZE
+ROWS = HEIGHT // CELL_SIZE
+CELLS = COLUMNS * ROWS
+ANGLES = 32
+SPEEDS = 8
+SPEED_STEP = 0.75  # Ring speed covered by each speed bin
+DECAYS = 2  # Shot decay, then save decay
+SHOT_STATES = 2 * CELLS * ANGLES  # Team 0 attacks the right goal, team 1 the left
+RING_STATES = CELLS * ANGLES * SPEEDS * DECAYS
+NO_INTERCEPT = 255  # The ring never reaches that goalie's line
+REST_SCALE = 4  # Rest points are stored in units of this many pixels
+SHOT_SAMPLES = 16  # Simulated shots per cell and angle
+SHOT_FRAMES = 10 * FPS  # Longest a simulated shot is followed
+SHOOT_CHANCE = 0.35  # AI skaters shoot once a shot is at least this likely to score
+AIM_DISTANCE = 200
+SUPPORT_DISTANCE = 150  # How far up the ice teammates of the carrier skate
+LOOSE_RING_SPEED = 1  # Chasers go for the ring itself once it is this slow
+LAUNCH_OFFSET = (PLAYER_WIDTH // 2, PLAYER_HEIGHT // 2 - RING_SIZE // 2)  # Skater center to a shot's ring center
+
+
+def cell_index(center):
+    column = min(max(int(center[0] // CELL_SIZE), 0), COLUMNS - 1)
+    row = min(max(int(center[1] // CELL_SIZE), 0), ROWS - 1)
+    return row * COLUMNS + column
+
+
+def cell_center(cell):
+    row, column = divmod(cell, COLUMNS)
+    return ((column + 0.5) * CELL_SIZE, (row + 0.5) * CELL_SIZE)
+
+
+def angle_index(dx, dy):
+    return round(math.atan2(dy, dx) / (2 * math.pi) * ANGLES) % ANGLES
+
+
+def bin_angle(index):
+    return index * 2 * math.pi / ANGLES
+
+
+class Lane:
+    # The whole line a goalie skates along, as a target for Trajectory.first_hit
+    def __init__(self, goalie):
+        self.rect = pygame.Rect(goalie.rect.x, 0, goalie.rect.width, HEIGHT)
+
+
+class AITables:
+    def __init__(self, shots, intercepts):
+        self.shots = shots  # array('B') of chance * 255, by attacking team, cell and angle
+        # array('B')s by ring state: top y offset for the left and right
+        # goalie, then where the ring rests in units of REST_SCALE pixels
+        self.left_goalie, self.right_goalie, self.rest_x, self.rest_y = intercepts
+        # The best aim from every cell and the best cell overall for each
+        # team, worked out once
+        self.best_angle = array('B')
+        self.best_chance = array('B')
+        for start in range(0, SHOT_STATES, ANGLES):
+            angles = shots[start:start + ANGLES]
+            chance = max(angles)
+            self.best_angle.append(angles.index(chance))
+            self.best_chance.append(chance)
+        self.best_cell = [self.best_chance.index(max(self.best_chance[team * CELLS:(team + 1) * CELLS]),
+                                                 team * CELLS) - team * CELLS for team in (0, 1)]
+
+    def ring_state(self, ring, save_decay):
+        # Index of a moving ring into the intercept tables
+        vx, vy = ring.velocity
+        speed = min(int(math.hypot(vx, vy) / SPEED_STEP), SPEEDS - 1)
+        decay = 1 if ring.decay_factor == save_decay else 0
+        return ((cell_index(ring.rect.center) * ANGLES + angle_index(vx, vy)) * SPEEDS + speed) * DECAYS + decay
+
+
+def build_shot_table(samples=SHOT_SAMPLES, seed=0, rules=DEFAULT_RULES):
+    # Shoots samples rings from random spots in every cell at every angle bin
+    # and counts how many end up in each goal, rebounds included, before a
+    # catch or the ring stopping
+    import numpy as np
+    from batch_sim import BatchSim, GOALIE_TOP, GOALIE_BOTTOM
+
+    generator = np.random.default_rng(seed)
+    tables = (array('B'), array('B'))  # Right goal, left goal
+    count = COLUMNS * ANGLES * samples  # One row of cells at a time
+    columns = np.repeat(np.arange(COLUMNS), ANGLES * samples)
+    angles = np.tile(np.repeat(np.arange(ANGLES), samples), COLUMNS) * 2 * np.pi / ANGLES
+    for row in range(ROWS):
+        sim = BatchSim(count, seeds=range(row * count, (row + 1) * count), rules=rules)
+        # Goalies caught anywhere on their patrol, skating either way
+        sim.goalie_y[:] = generator.integers(GOALIE_TOP, GOALIE_BOTTOM - GOALIE_HEIGHT + 1, size=(count, 2))
+        sim.goalie_direction[:] = generator.choice([-1, 1], size=(count, 2))
+        x = (columns + generator.random(count)) * CELL_SIZE - RING_SIZE / 2
+        y = (row + generator.random(count)) * CELL_SIZE - RING_SIZE / 2
+        sim.shoot(x, y, np.cos(angles) * rules.ring_speed, np.sin(angles) * rules.ring_speed)
+        goal = np.full(count, -1)  # Index of the goal each shot ended up in
+        done = np.zeros(count, dtype=bool)
+        for _ in range(SHOT_FRAMES):
+            sim.step()
+            goal = np.where(~done & (sim.hits >= 2), sim.hits - 2, goal)
+            stopped = sim.ring_active & (sim.ring_vx == 0) & (sim.ring_vy == 0)
+            done |= (sim.hits >= 2) | sim.events["catch"] | stopped
+            if done.all():
+                break
+        for table, index in zip(tables, (1, 0)):
+            chance = (goal == index).reshape(COLUMNS, ANGLES, samples).mean(axis=2)
+            table.extend(np.round(chance * 255).astype(np.uint8).ravel().tolist())
+    return tables[0] + tables[1]
+
+
+def build_intercept_tables(rules=DEFAULT_RULES):
+    # Follows a ring from the middle of every cell, in every direction, at the
+    # middle speed of every bin, for both decays
+    from trajectory import Trajectory
+
+    state = GameState(rules=rules)
+    lanes = [Lane(goalie) for goalie in state.goalies]
+    tables = (array('B'), array('B'), array('B'), array('B'))
+    for cell in range(CELLS):
+        x, y = cell_center(cell)
+        for angle in range(ANGLES):
+            dx, dy = math.cos(bin_angle(angle)), math.sin(bin_angle(angle))
+            for speed_bin in range(SPEEDS):
+                speed = (speed_bin + 0.5) * SPEED_STEP
+                for decay in (rules.shot_decay, rules.save_decay):
+                    path = Trajectory((x - RING_SIZE / 2, y - RING_SIZE / 2), (dx * speed, dy * speed), decay)
+                    for goalie, lane, table in zip(state.goalies, lanes, tables):
+                        hit = path.first_hit([lane])
+                        if hit is None:
+                            table.append(NO_INTERCEPT)
+                            continue
+                        top = round(hit[2][1] + RING_SIZE / 2 - goalie.rect.height / 2)
+                        table.append(min(max(top - goalie.goal_top, 0), goalie.goal_bottom - goalie.rect.height - goalie.goal_top))
+                    rest_x, rest_y = path.stopping_point()
+                    tables[2].append(round((rest_x + RING_SIZE / 2) / REST_SCALE))
+                    tables[3].append(round((rest_y + RING_SIZE / 2) / REST_SCALE))
+    return tables
+
+
+def save_tables(tables, path):
+    # Each table is stored whole rather than interleaved, which compresses far better
+    payload = b"".join(table.tobytes() for table in (tables.shots, tables.left_goalie, tables.right_goalie,
+                                                     tables.rest_x, tables.rest_y))
+    payload = zlib.compress(payload, 9)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, CELL_SIZE, COLUMNS, ROWS, ANGLES, SPEEDS, SPEED_STEP, len(payload)))
+        f.write(payload)
+
+
+def load_tables(path=None):
+    # The tables at path (assets/ai_tables.bin by default), or None if they
+    # are missing or were built for a different layout
+    try:
+        with open(path or get_asset_path(TABLES_FILE), "rb") as f:
+            data = f.read()
+        magic, version, *layout, length = HEADER.unpack_from(data)
+        payload = zlib.decompress(data[HEADER.size:HEADER.size + length])
+    except (OSError, struct.error, zlib.error):
+        return None
+    if magic != MAGIC or version != VERSION or layout != [CELL_SIZE, COLUMNS, ROWS, ANGLES, SPEEDS, SPEED_STEP]:
+        return None
+    if len(payload) != SHOT_STATES + 4 * RING_STATES:
+        return None
+    intercepts = [array('B', payload[start:start + RING_STATES])
+                  for start in range(SHOT_STATES, len(payload), RING_STATES)]
+    return AITables(array('B', payload[:SHOT_STATES]), intercepts)
+
+
+class AI:
+    # Attach to GameState.goalie_ai for reactive goalies, and pass
+    # skater_inputs(state) to GameState.step() for AI skaters
+    def __init__(self, tables, rules=DEFAULT_RULES):
+        self.tables = tables
+        self.rules = rules
+        self.spots = {}  # Formation spot (center) of every skater seen so far
+
+    def goalie_target(self, state, goalie):
+        # Top y for the goalie to skate to, or None to patrol
+        ring = state.ring
+        own_half = (ring.rect.centerx < WIDTH // 2) == (goalie.facing == 1)
+        if ring.active and ring.velocity != [0, 0]:
+            offsets = self.tables.left_goalie if goalie.facing == 1 else self.tables.right_goalie
+            offset = offsets[self.tables.ring_state(ring, self.rules.save_decay)]
+            if offset != NO_INTERCEPT:
+                return goalie.goal_top + offset
+        elif own_half and not any(other.has_ring for other in state.goalies):
+            # A carried or resting ring in this half: stay level with it
+            return ring.rect.centery - goalie.rect.height // 2
+        return None
+
+    def spot(self, state, skater):
+        spot = self.spots.get(skater)
+        if spot is None:
+            for team in (0, 1):
+                members = [member for member in state.skaters if member.team == team]
+                for member, (x, y) in zip(members, formation(team, len(members))):
+                    self.spots[member] = (x + PLAYER_WIDTH // 2, y + PLAYER_HEIGHT // 2)
+            spot = self.spots[skater]
+        return spot
+
+    def carry(self, state, skater):
+        # Shoot from here if it is likely enough to score, otherwise skate to
+        # the best spot on the ice and shoot from there
+        tables = self.tables
+        team = skater.team * CELLS
+        launch = (skater.rect.centerx + LAUNCH_OFFSET[0], skater.rect.centery + LAUNCH_OFFSET[1])
+        cell = team + cell_index(launch)
+        best_x, best_y = cell_center(tables.best_cell[skater.team])
+        spot = (best_x - LAUNCH_OFFSET[0], best_y - LAUNCH_OFFSET[1])
+        inputs = steer(skater.rect, spot, state.rules.player_speed)
+        arrived = not (inputs.left or inputs.right or inputs.up or inputs.down)
+        if tables.best_chance[cell] < SHOOT_CHANCE * 255 and not arrived:
+            return inputs
+        angle = bin_angle(tables.best_angle[cell])
+        origin = (skater.rect.right + 10, skater.rect.bottom)  # Where shoot() aims from
+        return Inputs(shoot=True, aim=(round(origin[0] + math.cos(angle) * AIM_DISTANCE),
+                                       round(origin[1] + math.sin(angle) * AIM_DISTANCE)))
+
+    def skater_inputs(self, state):
+        # Inputs for every skater but state.player. The skater of each team
+        # closest to where the ring is going chases it (a carrier is chased
+        # by the other team only); everyone else holds their spot, pushed up
+        # the ice while a teammate has the ring.
+        ring = state.ring
+        carrier = state.carrier
+        speed = state.rules.player_speed
+        ring_speed = math.hypot(*ring.velocity) if ring.active else 0
+        target, teams = None, ()
+        if carrier is not None:
+            target, teams = carrier.rect.center, (1 - carrier.team,)
+        elif not any(goalie.has_ring for goalie in state.goalies):
+            target, teams = ring.rect.center, (0, 1)
+            if ring_speed > LOOSE_RING_SPEED:
+                index = self.tables.ring_state(ring, self.rules.save_decay)
+                target = (self.tables.rest_x[index] * REST_SCALE, self.tables.rest_y[index] * REST_SCALE)
+        chasers = {}
+        for skater in state.skaters:
+            if skater.team in teams:
+                distance = (skater.rect.centerx - target[0]) ** 2 + (skater.rect.centery - target[1]) ** 2
+                if skater.team not in chasers or distance < chasers[skater.team][0]:
+                    chasers[skater.team] = (distance, skater)
+
+        controls = {}
+        for skater in state.skaters[1:]:
+            if skater.has_ring:
+                controls[skater] = self.carry(state, skater)
+            elif skater.team in chasers and chasers[skater.team][1] is skater:
+                inputs = steer(skater.rect, target, speed)
+                if carrier is None and ring_speed <= LOOSE_RING_SPEED:
+                    dx = ring.rect.centerx - skater.rect.centerx
+                    dy = ring.rect.centery - skater.rect.centery
+                    inputs.pickup = dx * dx + dy * dy <= state.rules.pickup_range ** 2
+                controls[skater] = inputs
+            else:
+                x, y = self.spot(state, skater)
+                if carrier is not None and carrier.team == skater.team:
+                    x += SUPPORT_DISTANCE if skater.team == 0 else -SUPPORT_DISTANCE
+                controls[skater] = steer(skater.rect, (x, y), speed)
+        return controls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the AI lookup tables")
+    parser.add_argument("--samples", type=int, default=SHOT_SAMPLES, help="simulated shots per cell and angle")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", TABLES_FILE),
+                        help="where to write the tables")
+    args = parser.parse_args(argv)
+    tables = AITables(build_shot_table(args.samples), build_intercept_tables())
+    save_tables(tables, args.out)
+    chance = max(tables.best_chance) / 255
+    print(f"Wrote {args.out} ({os.path.getsize(args.out)} bytes); best shot scores {chance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
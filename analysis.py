@@ -0,0 +1,202 @@
+# Season analytics over match logs written by matchlog.py.
+#
+#   python analysis.py logs/
+#   python analysis.py logs/*.rgm --team 0 --shot-map shots.png
+#
+# load_matches() reads each file's blocks straight into NumPy arrays and
+# joins every column once, adding the number of the match each record came
+# from. Everything after that is whole-array arithmetic: shot maps are one
+# np.bincount over grid cells, save percentages count the first stop after
+# each shot, and possession times pair each pickup with the record that
+# follows it.
+import argparse
+import glob
+import json
+import os
+import time
+import numpy as np
+from game import *
+from matchlog import BLOCK, HEADER, MAGIC, VERSION
+from replay import EVENT_NAMES, GOALIE_CARRIER
+
+KIND = {name: i for i, name in enumerate(EVENT_NAMES)}
+POSSESSION_ENDS = ("shot", "drop", "check", "shot_clock")
+SHOT_OUTCOMES = ("save", "catch", "goal")
+CELL_SIZE = 40  # Shot map cells, in rink units
+POSSESSION_BIN = 0.25  # Seconds per bar of the possession histogram
+
+
+def read_blocks(path):
+    # The header of a match log and a list of arrays per column, one per block
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a match log this version can read")
+    header = json.loads(data[HEADER.size:HEADER.size + length])
+    dtypes = [np.dtype(dtype) for _, dtype in header["columns"]]
+    row_size = sum(dtype.itemsize for dtype in dtypes)
+    blocks = [[] for _ in dtypes]
+    offset = HEADER.size + length
+    while offset + BLOCK.size <= len(data):
+        rows, = BLOCK.unpack_from(data, offset)
+        if offset + BLOCK.size + rows * row_size > len(data):
+            break  # The last block of a file cut short
+        offset += BLOCK.size
+        for column, dtype in zip(blocks, dtypes):
+            column.append(np.frombuffer(data, dtype, rows, offset))
+            offset += rows * dtype.itemsize
+    return header, blocks
+
+
+def match_paths(patterns):
+    # Files named by patterns, with directories standing for every log in them
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths += sorted(glob.glob(os.path.join(pattern, "*.rgm")))
+        else:
+            paths += sorted(glob.glob(pattern)) or [pattern]
+    return paths
+
+
+def load_matches(paths):
+    # Every record of every file as {column: array}, plus "match", the index
+    # into paths of the file each record came from
+    names = None
+    columns = None
+    matches = []
+    for match, path in enumerate(paths):
+        header, blocks = read_blocks(path)
+        if names is None:
+            names = [name for name, _ in header["columns"]]
+            columns = [[] for _ in names]
+        for column, parts in zip(columns, blocks):
+            column += parts
+        matches.append(np.full(sum(len(part) for part in blocks[0]), match, np.uint32))
+    if names is None:
+        return {}
+    events = {name: np.concatenate(parts) for name, parts in zip(names, columns)}
+    events["match"] = np.concatenate(matches)
+    return events
+
+
+def select(events, *kinds, team=None):
+    mask = np.isin(events["kind"], [KIND[kind] for kind in kinds])
+    if team is not None:
+        mask &= events["team"] == team
+    return mask
+
+
+def grid_counts(events, mask, cell=CELL_SIZE):
+    # Records in mask counted by the cell of the rink they happened in, as a
+    # rows x columns array
+    columns, rows = WIDTH // cell, HEIGHT // cell
+    x = np.clip((events["x"][mask] // cell).astype(np.intp), 0, columns - 1)
+    y = np.clip((events["y"][mask] // cell).astype(np.intp), 0, rows - 1)
+    return np.bincount(y * columns + x, minlength=rows * columns).reshape(rows, columns)
+
+
+def shot_map(events, team=None, cell=CELL_SIZE):
+    # (shots, goals) taken from each cell of the rink, goals counted where
+    # their shot was taken
+    return (grid_counts(events, select(events, "shot", team=team), cell),
+            grid_counts(events, select(events, "goal", team=team), cell))
+
+
+def save_percentages(events):
+    # For each goalie: shots stopped, goals against and the fraction of shots
+    # that reached them that they stopped. A shot (or a ring knocked loose)
+    # counts once, by the first save, catch or goal after it: a ring that
+    # bounces off a goalie twice is one save, and one that goes in after a
+    # save is only that save.
+    kind, actor, team, match = events["kind"], events["actor"], events["team"], events["match"]
+    stops = [KIND[name] for name in SHOT_OUTCOMES]
+    first = np.isin(kind, stops)
+    first[1:] &= ~np.isin(kind[:-1], stops) | (match[1:] != match[:-1])
+    stopped = first & (kind != KIND["goal"])
+    scored = first & (kind == KIND["goal"])
+    results = []
+    for goalie_team, code in enumerate(GOALIE_CARRIER):
+        saves = int(np.count_nonzero(stopped & (actor == code)))
+        # goalie1 guards the left goal, which team 1 scores on
+        goals = int(np.count_nonzero(scored & (team == 1 - goalie_team)))
+        faced = saves + goals
+        results.append({"saves": saves, "goals": goals, "percentage": saves / faced if faced else float("nan")})
+    return results
+
+
+def possession_times(events, fps=FPS):
+    # (seconds, team) of every possession: a pickup until the same skater
+    # shoots, drops the ring, is checked or runs out the shot clock
+    mask = select(events, "pickup", *POSSESSION_ENDS)
+    kind, frame, actor = events["kind"][mask], events["frame"][mask], events["actor"][mask]
+    match, team = events["match"][mask], events["team"][mask]
+    paired = ((kind[:-1] == KIND["pickup"]) & np.isin(kind[1:], [KIND[name] for name in POSSESSION_ENDS])
+              & (match[1:] == match[:-1]) & (actor[1:] == actor[:-1]))
+    seconds = (frame[1:][paired].astype(np.int64) - frame[:-1][paired]) / fps
+    return seconds, team[:-1][paired]
+
+
+def save_shot_map(path, shots, goals, cell=CELL_SIZE):
+    # The rink with every cell shaded by how many shots came from it, and
+    # the share that went in written on top
+    import pygame
+    from main import draw_rink
+
+    pygame.font.init()
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    draw_rink(surface)
+    font = pygame.font.Font(None, 18)
+    most = max(int(shots.max()), 1)
+    for (row, column), count in np.ndenumerate(shots):
+        if not count:
+            continue
+        rect = pygame.Rect(column * cell, row * cell, cell, cell)
+        shade = pygame.Surface(rect.size, pygame.SRCALPHA)
+        shade.fill((255, 60, 0, 40 + int(180 * count / most)))
+        surface.blit(shade, rect)
+        label = font.render(f"{goals[row, column] / count:.0%}", True, (0, 0, 0))
+        surface.blit(label, label.get_rect(center=rect.center))
+    pygame.image.save(surface, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shot maps, save percentages and possession times from match logs")
+    parser.add_argument("logs", nargs="+", help="match log files or directories of them")
+    parser.add_argument("--team", type=int, choices=(0, 1), help="only this team's shots and possessions")
+    parser.add_argument("--shot-map", metavar="PNG", help="draw the shot map to an image")
+    args = parser.parse_args(argv)
+
+    paths = match_paths(args.logs)
+    started = time.perf_counter()
+    events = load_matches(paths)
+    if not events:
+        parser.error("no match logs found")
+    loaded = time.perf_counter() - started
+    print(f"{len(paths)} matches, {len(events['kind'])} events, loaded in {loaded * 1000:.0f} ms")
+
+    shots, goals = shot_map(events, args.team)
+    print(f"{shots.sum()} shots, {goals.sum()} goals ({goals.sum() / max(shots.sum(), 1):.1%} scored)")
+    for name, goalie in zip(("Left goalie", "Right goalie"), save_percentages(events)):
+        print(f"{name}: {goalie['saves']} saves, {goalie['goals']} goals against, "
+              f"{goalie['percentage']:.1%} saved")
+
+    seconds, teams = possession_times(events)
+    if args.team is not None:
+        seconds = seconds[teams == args.team]
+    if len(seconds):
+        p50, p90 = np.percentile(seconds, [50, 90])
+        print(f"{len(seconds)} possessions: median {p50:.1f} s, 90th percentile {p90:.1f} s")
+        counts, edges = np.histogram(seconds, np.arange(0, seconds.max() + POSSESSION_BIN, POSSESSION_BIN))
+        scale = 50 / max(counts.max(), 1)
+        for count, start in zip(counts, edges):
+            if count:
+                print(f"{start:5.1f} s {'#' * max(1, round(count * scale))} {count}")
+    if args.shot_map:
+        save_shot_map(args.shot_map, shots, goals)
+        print(f"Wrote {args.shot_map}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Rasterized images kept on disk between launches. Parsing the SVG logo takes
+# far longer than the rest of startup's drawing, so the scaled result is stored
+# as raw RGBA pixels under a hash of the source file and the size it was
+# scaled to. Changing the file or the size just makes a new entry.
+import hashlib
+import io
+import os
+import sys
+import pygame
+
+CACHE_VERSION = 1  # Bump to ignore everything cached by older versions
+
+
+# Get the base path for assets
+def get_asset_path(filename):
+    # If we're running as a PyInstaller bundle
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, 'assets', filename)
+
+
+def cache_dir():
+    if os.environ.get("RINGETTE_CACHE_DIR"):
+        return os.environ["RINGETTE_CACHE_DIR"]
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "RingetteGame")
+
+
+def cache_key(source, size):
+    digest = hashlib.sha256(source)
+    digest.update(f"{CACHE_VERSION}:{size[0]}x{size[1]}".encode("ascii"))
+    return digest.hexdigest()
+
+
+def load_image(path, size):
+    # The image at path scaled to size, rasterized only if it isn't cached yet
+    with open(path, "rb") as f:
+        source = f.read()
+    cache_path = os.path.join(cache_dir(), cache_key(source, size) + ".rgba")
+    try:
+        with open(cache_path, "rb") as f:
+            pixels = f.read()
+        if len(pixels) == size[0] * size[1] * 4:
+            return pygame.image.frombytes(pixels, size, "RGBA")
+    except OSError:
+        pass
+
+    image = pygame.image.load(io.BytesIO(source), os.path.basename(path))
+    image = pygame.transform.scale(image, size)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write then rename so a half-written file is never read back
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(pygame.image.tobytes(image, "RGBA"))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # A read-only home directory just means no cache
+    return image
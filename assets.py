@@ -13,8 +13,19 @@ BLUE_LINE_1_X = RINK_WIDTH // 3
 BLUE_LINE_2_X = RINK_WIDTH * 2 // 3
 GOAL_LINE_1_X = 50
 GOAL_LINE_2_X = RINK_WIDTH - 50
+CIRCLE_RADIUS = 60
+DOT_RADIUS = 6
+DOT_OFFSET = CIRCLE_RADIUS // 2  # Halfway between center and edge
 
 # Player dimensions
 PLAYER_WIDTH = 40
 PLAYER_HEIGHT = 40
-PLAYER_COLOR = (255, 0, 0)  # Red player 
\ No newline at end of file
+PLAYER_COLOR = (255, 0, 0)  # Red player
+OPPONENT_COLOR = (255, 200, 0)  # Yellow opposing skaters
+
+# Ring, goal and goalie dimensions
+RING_SIZE = 20
+GOAL_WIDTH = 20
+GOAL_HEIGHT = 100
+GOALIE_WIDTH = 20
+GOALIE_HEIGHT = 40
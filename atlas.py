@@ -0,0 +1,170 @@
+# Sprite atlas. Every sprite is drawn into one image with a manifest of where
+# each one sits. build.py bakes it into assets/ so the packaged game reads a
+# single PNG instead of parsing the SVG logo and drawing the rest on launch;
+# running from source builds the same atlas in memory. Either way the atlas is
+# converted to the display's pixel format once and every sprite is a
+# subsurface of it, so blits don't convert pixels every frame. Larger windows
+# get an atlas of their own, drawn once per scale when the window is resized.
+import json
+import os
+import sys
+import pygame
+from assets import *
+from asset_cache import get_asset_path, load_image
+
+ATLAS_VERSION = 1  # Bump when a sprite or the layout changes
+ATLAS_IMAGE = "atlas.png"
+ATLAS_MANIFEST = "atlas.json"
+ATLAS_WIDTH = 256
+PADDING = 1  # Transparent pixels between sprites
+
+
+def create_ring_sprite():
+    surface = pygame.Surface((20, 20), pygame.SRCALPHA)
+    # Draw a blue ring
+    pygame.draw.circle(surface, RING_COLOR, (10, 10), 10)
+    pygame.draw.circle(surface, ICE_WHITE, (10, 10), 5)
+    return surface
+
+def create_goalie_sprite():
+    surface = pygame.Surface((20, 40), pygame.SRCALPHA)
+    
+    # Body (red jersey)
+    pygame.draw.rect(surface, (220, 20, 20), (5, 10, 10, 20))  # Torso
+    
+    # Head
+    pygame.draw.circle(surface, (255, 218, 185), (10, 7), 5)  # Flesh color
+    
+    # Arms (holding stick)
+    pygame.draw.line(surface, (220, 20, 20), (5, 15), (3, 25), 3)   # Left arm
+    pygame.draw.line(surface, (220, 20, 20), (15, 15), (17, 25), 3) # Right arm
+    
+    # Hands (holding stick)
+    pygame.draw.circle(surface, (255, 218, 185), (3, 25), 2)  # Left hand
+    pygame.draw.circle(surface, (255, 218, 185), (17, 25), 2)  # Right hand
+    
+    # Legs (slightly spread)
+    pygame.draw.line(surface, (0, 0, 0), (7, 30), (7, 38), 3)  # Left leg
+    pygame.draw.line(surface, (0, 0, 0), (13, 30), (13, 38), 3)  # Right leg
+    
+    # Goalie stick (held horizontally)
+    pygame.draw.line(surface, (139, 69, 19), (3, 25), (17, 25), 3)  # Brown stick
+    
+    return surface
+
+def create_player_sprite(lynx_logo, color=PLAYER_COLOR):
+    if lynx_logo:
+        return lynx_logo
+    # Create a simple player shape for now
+    surface = pygame.Surface((PLAYER_WIDTH, PLAYER_HEIGHT), pygame.SRCALPHA)
+    # Draw a simple player shape
+    pygame.draw.ellipse(surface, color, (0, 0, PLAYER_WIDTH, PLAYER_HEIGHT))
+    # Add a stick
+    pygame.draw.line(surface, (139, 69, 19),
+                    (PLAYER_WIDTH//2, PLAYER_HEIGHT//2),
+                    (PLAYER_WIDTH, PLAYER_HEIGHT//2), 3)
+    return surface
+
+def create_goal_sprite():
+    surface = pygame.Surface((GOAL_WIDTH, GOAL_HEIGHT), pygame.SRCALPHA)
+    pygame.draw.rect(surface, RINK_BLUE, (0, 0, GOAL_WIDTH, GOAL_HEIGHT))
+    return surface
+
+def load_logo(size=(PLAYER_WIDTH, PLAYER_HEIGHT)):
+    try:
+        # Rasterized once per size and then read back from the asset cache
+        return load_image(get_asset_path('lynxLogo.svg'), size)
+    except Exception as e:
+        print(f"Warning: Could not load lynxLogo.svg: {str(e)}. Using default player shape.")
+        return None
+
+
+def scaled_size(size, scale):
+    width, height = size
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+
+def draw_sprites(scale=1):
+    sprites = {
+        "ring": create_ring_sprite(),
+        "goalie": create_goalie_sprite(),
+        "goal": create_goal_sprite(),
+        "opponent": create_player_sprite(None, OPPONENT_COLOR),
+    }
+    if scale != 1:
+        sprites = {name: pygame.transform.smoothscale(sprite, scaled_size(sprite.get_size(), scale))
+                   for name, sprite in sprites.items()}
+    # The logo is rasterized again at the new size rather than stretched
+    player_size = scaled_size((PLAYER_WIDTH, PLAYER_HEIGHT), scale)
+    player = create_player_sprite(load_logo(player_size))
+    if player.get_size() != player_size:
+        player = pygame.transform.smoothscale(player, player_size)
+    sprites["player"] = player
+    return sprites
+
+
+def pack(sizes):
+    # Shelf packing, tallest first: each row is as high as its first sprite.
+    # Rows are widened for sprites scaled up past the usual width.
+    atlas_width = max([ATLAS_WIDTH] + [width for width, height in sizes.values()])
+    rects = {}
+    x = y = row_height = 0
+    for name in sorted(sizes, key=lambda name: (-sizes[name][1], name)):
+        width, height = sizes[name]
+        if x + width > atlas_width:
+            x, y = 0, y + row_height + PADDING
+            row_height = 0
+        rects[name] = (x, y, width, height)
+        x += width + PADDING
+        row_height = max(row_height, height)
+    return rects, (atlas_width, y + row_height)
+
+
+def bake(sprites):
+    rects, size = pack({name: sprite.get_size() for name, sprite in sprites.items()})
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    for name, sprite in sprites.items():
+        surface.blit(sprite, rects[name][:2])
+    return surface, rects
+
+
+def save_atlas(directory):
+    surface, rects = bake(draw_sprites())
+    pygame.image.save(surface, os.path.join(directory, ATLAS_IMAGE))
+    with open(os.path.join(directory, ATLAS_MANIFEST), "w") as f:
+        json.dump({"version": ATLAS_VERSION, "sprites": rects}, f, indent=2, sort_keys=True)
+
+
+def read_baked_atlas():
+    # The atlas baked by build.py, or None if there isn't a usable one
+    try:
+        with open(get_asset_path(ATLAS_MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != ATLAS_VERSION:
+            return None
+        return pygame.image.load(get_asset_path(ATLAS_IMAGE)), manifest["sprites"]
+    except (OSError, ValueError, KeyError, pygame.error):
+        return None
+
+
+# The last atlas converted, by scale
+atlas_cache = {}
+
+def load_atlas(scale=1):
+    # Every sprite by name at scale times its size in rink units, as
+    # subsurfaces of one display-format surface. Needs the display mode to be set.
+    sprites = atlas_cache.get(scale)
+    if sprites is None:
+        baked = read_baked_atlas() if scale == 1 and getattr(sys, 'frozen', False) else None
+        surface, rects = baked or bake(draw_sprites(scale))
+        surface = surface.convert_alpha()
+        sprites = {name: surface.subsurface(rect) for name, rect in rects.items()}
+        atlas_cache.clear()
+        atlas_cache[scale] = sprites
+    return sprites
+
+
+if __name__ == "__main__":
+    # Bake the atlas into assets/ (build.py runs this before packaging)
+    save_atlas(os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"))
+    print(f"Baked {ATLAS_IMAGE} and {ATLAS_MANIFEST} into assets/")
@@ -0,0 +1,310 @@
+# Steps thousands of independent rinks at once for Monte Carlo shot analysis.
+# Every rink is a row in a set of NumPy arrays and follows the same rules as
+# game.GameState stepped without player input: ring decay, swept wall, goalie
+# and goal collisions, goalie patrol/catch/bounce/throw and the shot clock. Each rink has its
+# own random.Random, so a rink seeded like a GameState makes the same draws and
+# ends up in exactly the same place.
+import random
+import numpy as np
+from game import *
+
+GOALIE_X = np.array([GOAL_LINE_1_X + 30, GOAL_LINE_2_X - 30])
+GOALIE_FACING = np.array([1, -1])
+GOALIE_START_Y = HEIGHT // 2 - 30
+GOALIE_TOP = HEIGHT // 2 - 50
+GOALIE_BOTTOM = HEIGHT // 2 + 50
+GOAL_X = np.array([GOAL_LINE_1_X - 20, GOAL_LINE_2_X])
+GOAL_Y = HEIGHT // 2 - 50
+# Where the ring restarts after a goal in each net
+RESTART_CENTERS = np.array([LEFT_CENTER_DOT, RIGHT_CENTER_DOT])
+
+EVENT_NAMES = ("throw", "catch", "save", "goal", "shot_clock")
+
+
+def round_half_away(values):
+    # pygame.Rect rounds float coordinates half away from zero
+    whole = np.trunc(values)
+    return (whole + np.copysign(np.abs(values - whole) >= 0.5, values)).astype(np.int64)
+
+
+def sweep_times(x, y, motion_x, motion_y, left, top, right, bottom):
+    # Vectorised game.sweep_time, with np.inf where the ring misses
+    enter = np.zeros_like(x)
+    leave = np.ones_like(x)
+    hit = np.ones(x.shape, dtype=bool)
+    for start, distance, low, high in (
+        (x, motion_x, left - RING_SIZE, right),
+        (y, motion_y, top - RING_SIZE, bottom),
+    ):
+        still = distance == 0
+        hit &= ~still | ((low < start) & (start < high))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            low_time = (low - start) / distance
+            high_time = (high - start) / distance
+        enter = np.where(still, enter, np.maximum(enter, np.minimum(low_time, high_time)))
+        leave = np.where(still, leave, np.minimum(leave, np.maximum(low_time, high_time)))
+    return np.where(hit & (enter < leave), enter, np.inf)
+
+
+def wall_times(start, distance, limit):
+    # Vectorised game.wall_time, with np.inf where no wall is reached
+    with np.errstate(divide="ignore", invalid="ignore"):
+        low_wall = (distance < 0) & (start + distance < 0)
+        high_wall = (distance > 0) & (start + distance > limit)
+        times = np.where(low_wall, -start / distance, (limit - start) / distance)
+    return np.where(low_wall | high_wall, times, np.inf)
+
+
+class BatchSim:
+    def __init__(self, count, seeds=None, rules=DEFAULT_RULES):
+        if seeds is None:
+            seeds = [None] * count
+        if len(seeds) != count:
+            raise ValueError("Need one seed per rink")
+        self.count = count
+        self.rules = rules
+        self.randoms = [random.Random(seed) for seed in seeds]
+
+        # Ring (exact top-left corner, like Ring.position)
+        start_x, start_y = LEFT_CENTER_DOT
+        self.ring_x = np.full(count, start_x - RING_SIZE / 2)
+        self.ring_y = np.full(count, start_y - RING_SIZE / 2)
+        self.ring_vx = np.zeros(count)
+        self.ring_vy = np.zeros(count)
+        self.ring_active = np.zeros(count, dtype=bool)
+        self.ring_decay = np.full(count, rules.shot_decay)
+
+        # Goalies, one column per net (left goalie first)
+        self.goalie_y = np.full((count, 2), GOALIE_START_Y, dtype=np.int64)
+        self.goalie_direction = np.ones((count, 2), dtype=np.int64)
+        self.goalie_speed = np.full((count, 2), rules.goalie_speed)
+        self.goalie_has_ring = np.zeros((count, 2), dtype=bool)
+        self.goalie_hold_time = np.zeros((count, 2), dtype=np.int64)
+        self.goalie_throw_cooldown = np.zeros((count, 2), dtype=np.int64)
+        self.goalie_throw_dy = np.zeros((count, 2))
+
+        self.score = np.zeros(count, dtype=np.int64)
+        self.shot_clock = np.full(count, rules.shot_clock_duration, dtype=np.int64)
+        self.shot_clock_elapsed = np.zeros(count)
+        self.ring_picked_up_since_goal = np.zeros(count, dtype=bool)
+        self.frame = 0
+        # Which rinks saw each event during the last step
+        self.events = {name: np.zeros(count, dtype=bool) for name in EVENT_NAMES}
+        # Index into collision_targets() each ring ran into during the last step, or -1
+        self.hits = np.full(count, -1)
+
+    @classmethod
+    def from_states(cls, states):
+        # Copy a list of GameStates (including their RNG state) into one batch;
+        # they must all share the same rules
+        sim = cls(len(states), rules=states[0].rules)
+        for i, state in enumerate(states):
+            sim.randoms[i].setstate(state.random.getstate())
+            ring = state.ring
+            sim.ring_x[i], sim.ring_y[i] = ring.position
+            sim.ring_vx[i], sim.ring_vy[i] = ring.velocity
+            sim.ring_active[i] = ring.active
+            sim.ring_decay[i] = ring.decay_factor
+            for j, goalie in enumerate(state.goalies):
+                sim.goalie_y[i, j] = goalie.rect.y
+                sim.goalie_direction[i, j] = goalie.direction
+                sim.goalie_speed[i, j] = goalie.speed
+                sim.goalie_has_ring[i, j] = goalie.has_ring
+                sim.goalie_hold_time[i, j] = goalie.hold_time
+                sim.goalie_throw_cooldown[i, j] = goalie.throw_cooldown
+                sim.goalie_throw_dy[i, j] = goalie.throw_direction[1]
+            sim.score[i] = state.score
+            sim.shot_clock[i] = state.shot_clock
+            sim.shot_clock_elapsed[i] = state.shot_clock_elapsed
+            sim.ring_picked_up_since_goal[i] = state.ring_picked_up_since_goal
+        return sim
+
+    def shoot(self, x, y, vx, vy, rinks=slice(None)):
+        # Launch the ring from the top-left position (x, y) as a player shot
+        self.ring_x[rinks] = x
+        self.ring_y[rinks] = y
+        self.ring_vx[rinks] = vx
+        self.ring_vy[rinks] = vy
+        self.ring_active[rinks] = True
+        self.ring_decay[rinks] = self.rules.shot_decay
+        self.shot_clock[rinks] = self.rules.shot_clock_duration
+        self.ring_picked_up_since_goal[rinks] = True
+
+    def place_ring(self, rinks, centers):
+        self.ring_x[rinks] = centers[..., 0] - RING_SIZE / 2
+        self.ring_y[rinks] = centers[..., 1] - RING_SIZE / 2
+
+    def update_shot_clock(self, dt):
+        self.shot_clock_elapsed += dt
+        tick = self.shot_clock_elapsed >= 1
+        counting = tick & self.ring_picked_up_since_goal
+        self.shot_clock[counting] -= 1
+        expired = counting & (self.shot_clock <= 0)
+        self.ring_active[expired] = False
+        self.ring_vx[expired] = 0
+        self.ring_vy[expired] = 0
+        self.place_ring(expired, RESTART_CENTERS[0])
+        self.shot_clock[expired] = self.rules.shot_clock_duration
+        self.ring_picked_up_since_goal[expired] = False
+        self.shot_clock_elapsed[tick] = 0.0
+        self.events["shot_clock"] |= expired
+
+    def update_goalies(self):
+        # Patrol the crease while not holding the ring
+        free = ~self.goalie_has_ring
+        moved = round_half_away(self.goalie_y + self.goalie_speed * self.goalie_direction)
+        self.goalie_y = np.where(free, moved, self.goalie_y)
+        at_top = free & (self.goalie_y <= GOALIE_TOP)
+        at_bottom = free & ~at_top & (self.goalie_y + GOALIE_HEIGHT >= GOALIE_BOTTOM)
+        self.goalie_direction[at_top] = 1
+        self.goalie_direction[at_bottom] = -1
+        cooling = free & (self.goalie_throw_cooldown > 0)
+        self.goalie_throw_cooldown[cooling] -= 1
+
+        # Throw the ring back out after holding it
+        holding = ~free
+        self.goalie_hold_time[holding] += 1
+        throws = holding & (self.goalie_hold_time >= self.rules.goalie_hold_frames)
+        self.goalie_has_ring[throws] = False
+        self.goalie_throw_cooldown[throws] = self.rules.goalie_throw_cooldown
+        self.goalie_hold_time[throws] = 0
+        for j in range(2):
+            rinks = throws[:, j]
+            if not rinks.any():
+                continue
+            centers = np.stack([
+                np.full(rinks.sum(), GOALIE_X[j] + GOALIE_WIDTH // 2 + 20 * GOALIE_FACING[j]),
+                self.goalie_y[rinks, j] + GOALIE_HEIGHT // 2,
+            ], axis=1)
+            self.ring_active[rinks] = True
+            self.place_ring(rinks, centers)
+            throw_speed = self.rules.ring_speed * 0.5  # Half speed for goalie throws
+            self.ring_vx[rinks] = GOALIE_FACING[j] * throw_speed
+            self.ring_vy[rinks] = self.goalie_throw_dy[rinks, j] * throw_speed
+            self.ring_decay[rinks] = self.rules.save_decay
+            self.shot_clock[rinks] = self.rules.shot_clock_duration
+            self.events["throw"] |= rinks
+
+    def collision_targets(self, rinks):
+        # (can be hit, left, top, right, bottom) in GameState.collision_targets order
+        targets = []
+        for j in range(2):
+            top = self.goalie_y[rinks, j]
+            can_catch = ~self.goalie_has_ring[rinks, j] & (self.goalie_throw_cooldown[rinks, j] == 0)
+            targets.append((can_catch, GOALIE_X[j], top, GOALIE_X[j] + GOALIE_WIDTH, top + GOALIE_HEIGHT))
+        for j in range(2):
+            targets.append((True, GOAL_X[j], GOAL_Y, GOAL_X[j] + GOAL_WIDTH, GOAL_Y + GOAL_HEIGHT))
+        return targets
+
+    def update_ring(self):
+        # Returns the index into collision_targets() each ring ran into, or -1
+        hit_target = np.full(self.count, -1)
+        rinks = np.flatnonzero(self.ring_active)  # Only moving rings do any work
+        if len(rinks) == 0:
+            return hit_target
+        vx = self.ring_vx[rinks] * self.ring_decay[rinks]
+        vy = self.ring_vy[rinks] * self.ring_decay[rinks]
+        # Stop very slow movement to prevent endless sliding
+        stopped = (np.abs(vx) < STOP_SPEED) & (np.abs(vy) < STOP_SPEED)
+        vx[stopped] = 0.0
+        vy[stopped] = 0.0
+
+        targets = self.collision_targets(rinks)
+        x = np.clip(self.ring_x[rinks], 0, WIDTH - RING_SIZE)
+        y = np.clip(self.ring_y[rinks], 0, HEIGHT - RING_SIZE)
+        remaining = np.ones(len(rinks))
+        moving = np.ones(len(rinks), dtype=bool)
+        hits = np.full(len(rinks), -1)
+        for _ in range(MAX_BOUNCES_PER_STEP):
+            motion_x = vx * remaining
+            motion_y = vy * remaining
+            hit = np.full(len(rinks), -1)
+            hit_time = np.full(len(rinks), np.inf)
+            for k, (can_hit, left, top, right, bottom) in enumerate(targets):
+                times = sweep_times(x, y, motion_x, motion_y, left, top, right, bottom)
+                earlier = can_hit & (times < hit_time)
+                hit = np.where(earlier, k, hit)
+                hit_time = np.where(earlier, times, hit_time)
+            wall_x = wall_times(x, motion_x, WIDTH - RING_SIZE)
+            wall_y = wall_times(y, motion_y, HEIGHT - RING_SIZE)
+            bounce_time = np.minimum(wall_x, wall_y)
+
+            stops = moving & (hit >= 0) & (hit_time <= bounce_time)
+            hits[stops] = hit[stops]
+            clear = moving & ~stops & (bounce_time == np.inf)
+            bounces = moving & ~stops & ~clear
+            # Move to the hit, the whole way, or to the wall
+            travel = np.where(stops, hit_time, np.where(clear, 1.0, np.where(bounces, bounce_time, 0.0)))
+            x = np.where(moving, x + motion_x * travel, x)
+            y = np.where(moving, y + motion_y * travel, y)
+
+            # Bounce off walls at the exact point of contact
+            flip_x = bounces & (wall_x == bounce_time)
+            flip_y = bounces & (wall_y == bounce_time)
+            x = np.where(flip_x, np.where(motion_x < 0, 0.0, float(WIDTH - RING_SIZE)), x)
+            y = np.where(flip_y, np.where(motion_y < 0, 0.0, float(HEIGHT - RING_SIZE)), y)
+            vx[flip_x] *= -1
+            vy[flip_y] *= -1
+            remaining = np.where(bounces, remaining * (1 - bounce_time), remaining)
+            moving = bounces
+            if not moving.any():
+                break
+
+        self.ring_x[rinks] = x
+        self.ring_y[rinks] = y
+        self.ring_vx[rinks] = vx
+        self.ring_vy[rinks] = vy
+        hit_target[rinks] = hits
+        return hit_target
+
+    def resolve_hits(self, hit_target):
+        # Only rinks that hit a goalie draw random numbers, in GameState order
+        for j in range(2):
+            hits = hit_target == j
+            for i in np.flatnonzero(hits):
+                rng = self.randoms[i]
+                if rng.random() < self.rules.catch_chance:
+                    self.ring_active[i] = False
+                    self.goalie_has_ring[i, j] = True
+                    self.goalie_hold_time[i, j] = 0
+                    self.goalie_throw_dy[i, j] = rng.uniform(-1, 1)
+                    self.ring_x[i] = GOALIE_X[j] + GOALIE_WIDTH // 2 - RING_SIZE / 2
+                    self.ring_y[i] = self.goalie_y[i, j] + GOALIE_HEIGHT // 2 - RING_SIZE / 2
+                    self.events["catch"][i] = True
+                else:
+                    self.ring_vx[i] = -self.ring_vx[i] + rng.uniform(-1, 1)
+                    self.ring_vy[i] = -self.ring_vy[i] + rng.uniform(-1, 1)
+                    self.ring_decay[i] = self.rules.save_decay
+                    self.events["save"][i] = True
+            self.shot_clock[hits] = self.rules.shot_clock_duration
+
+        for j in range(2):
+            goals = hit_target == 2 + j
+            self.score[goals] += 1
+            self.ring_active[goals] = False
+            self.place_ring(goals, RESTART_CENTERS[j])
+            self.ring_vx[goals] = 0.0
+            self.ring_vy[goals] = 0.0
+            self.shot_clock[goals] = self.rules.shot_clock_duration
+            self.ring_picked_up_since_goal[goals] = False
+            self.events["goal"] |= goals
+
+    def step(self, dt=1 / FPS):
+        # Advance every rink by one frame, in the same order as GameState.step
+        for flags in self.events.values():
+            flags[:] = False
+        self.update_shot_clock(dt)
+        self.update_goalies()
+        self.hits = self.update_ring()
+        self.resolve_hits(self.hits)
+        self.frame += 1
+        return self.events
+
+    def run(self, steps, dt=1 / FPS):
+        # Step repeatedly and count how often each event happened in each rink
+        totals = {name: np.zeros(self.count, dtype=np.int64) for name in EVENT_NAMES}
+        for _ in range(steps):
+            self.step(dt)
+            for name, flags in self.events.items():
+                totals[name] += flags
+        return totals
@@ -0,0 +1,366 @@
+# Performance benchmarks with regression checks.
+#
+#   python bench.py --save              measure and store the baseline
+#   python bench.py                     measure and compare with the baseline
+#   python bench.py --threshold 0.2 --threshold draw_rink_ms=0.5
+#
+# Everything runs headless on SDL's dummy video driver. Each benchmark repeats
+# the same work over several rounds and keeps the best one, since other load on
+# the machine only ever makes a round slower. Baselines are only comparable on
+# the machine that saved them. A metric that got worse than its baseline by
+# more than the threshold (a fraction, 0.15 by default) fails the run with
+# exit status 1.
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+import pygame
+from game import *
+
+DEFAULT_BASELINE = "bench_baseline.json"
+DEFAULT_THRESHOLD = 0.15
+ROUNDS = 5
+DIRTY_FRAMES = 400  # Frames in each round of the dirty rect benchmark
+STARTUP_RUNS = 3
+ROSTER = (6, 6)  # Full teams for the rendering and contact benchmarks
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# Name, unit and whether a higher value is better
+METRICS = (
+    ("draw_rink_ms", "ms", False),
+    ("render_frame_ms", "ms", False),
+    ("render_dirty_frame_ms", "ms", False),
+    ("physics_steps_per_s", "steps/s", True),
+    ("roster_steps_per_s", "steps/s", True),
+    ("collision_chain_per_s", "rings/s", True),
+    ("ai_frame_ms", "ms", False),
+    ("particles_ms", "ms", False),
+    ("startup_ms", "ms", False),
+    ("peak_rss_mb", "MB", False),
+)
+
+
+def timed_rounds(setup, run, calls, rounds=ROUNDS):
+    # Best seconds per call of run(context). Every round starts from a fresh
+    # setup() and makes the same number of calls, so they all do the same work.
+    run(setup())  # Warm up caches
+    results = []
+    for _ in range(rounds):
+        context = setup()
+        started = time.perf_counter()
+        for _ in range(calls):
+            run(context)
+        results.append((time.perf_counter() - started) / calls)
+    return min(results)
+
+
+def random_inputs(generator):
+    return Inputs(generator.random() < 0.3, generator.random() < 0.3,
+                  generator.random() < 0.3, generator.random() < 0.3,
+                  shoot=generator.random() < 0.01, pickup=generator.random() < 0.02,
+                  aim=(generator.uniform(0, WIDTH), generator.uniform(0, HEIGHT)))
+
+
+class Scene:
+    # A window's worth of sprites and HUD built the way main.py builds them
+    def __init__(self):
+        import main
+        from atlas import load_atlas
+        from hud import Hud
+        from view import View
+
+        self.screen = pygame.display.get_surface()
+        self.state = GameState(seed=1, roster=ROSTER)
+        view = View(self.screen.get_size())
+        self.hud = Hud(view)
+        self.background = main.get_rink_background(view)
+        self.sprites = pygame.sprite.RenderUpdates()
+        sprites = load_atlas(view.scale)
+        self.sprites.add(main.EntitySprite(self.state.ring, "ring", view, sprites))
+        for skater in self.state.skaters:
+            name = "player" if skater.team == 0 else "opponent"
+            self.sprites.add(main.EntitySprite(skater, name, view, sprites))
+        for entity, name in ((self.state.goal1, "goal"), (self.state.goal2, "goal"),
+                             (self.state.goalie1, "goalie"), (self.state.goalie2, "goalie")):
+            self.sprites.add(main.EntitySprite(entity, name, view, sprites))
+        self.random = random.Random(2)
+        self.hud_rects = []
+        self.screen.blit(self.background, (0, 0))
+
+    def step(self):
+        for sprite in self.sprites:
+            sprite.remember()
+        skater_inputs = {skater: random_inputs(self.random) for skater in self.state.skaters[1:]}
+        self.state.step(random_inputs(self.random), skater_inputs=skater_inputs)
+        self.sprites.update(0.5)
+
+
+def bench_draw_rink():
+    import main
+
+    surface = pygame.display.get_surface().copy()
+    return timed_rounds(lambda: surface, main.draw_rink, 400) * 1000
+
+
+def bench_render_frame():
+    # Repainting the whole window: background, every sprite and the HUD
+    def run(scene):
+        scene.screen.blit(scene.background, (0, 0))
+        scene.sprites.draw(scene.screen)
+        scene.hud.draw(scene.screen, scene.state, False)
+
+    return timed_rounds(Scene, run, 400) * 1000
+
+
+def bench_render_dirty_frame():
+    # A frame of dirty rect drawing after a step, not counting the step itself
+    def run(scene):
+        scene.step()
+        started = time.perf_counter()
+        scene.sprites.clear(scene.screen, scene.background)
+        for rect in scene.hud_rects:
+            scene.screen.blit(scene.background, rect, rect)
+        scene.sprites.draw(scene.screen)
+        scene.hud_rects = scene.hud.draw(scene.screen, scene.state, False)
+        scene.elapsed += time.perf_counter() - started
+        scene.frames += 1
+
+    results = []
+    for _ in range(ROUNDS):
+        scene = Scene()
+        scene.elapsed, scene.frames = 0.0, 0
+        for _ in range(DIRTY_FRAMES):
+            run(scene)
+        results.append(scene.elapsed / scene.frames)
+    return min(results) * 1000
+
+
+def bench_physics_steps():
+    # One skater playing the scripted sweep game against both goalies
+    from sweep import Bot, scripted_inputs
+
+    def setup():
+        return GameState(seed=1), Bot(2)
+
+    def run(context):
+        state, bot = context
+        state.step(scripted_inputs(state, bot))
+
+    return 1 / timed_rounds(setup, run, 10000)
+
+
+def bench_roster_steps():
+    # Full teams skating around at random, so contacts and checks happen
+    def setup():
+        return GameState(seed=1, roster=ROSTER), random.Random(3)
+
+    def run(context):
+        state, generator = context
+        skater_inputs = {skater: random_inputs(generator) for skater in state.skaters[1:]}
+        state.step(random_inputs(generator), skater_inputs=skater_inputs)
+
+    return 1 / timed_rounds(setup, run, 2000)
+
+
+def bench_collision_chain():
+    # Rings shot at the right goal from all over the rink, each followed
+    # through ring.update and resolve_hit until it stops or is caught
+    def setup():
+        return GameState(seed=1), random.Random(4)
+
+    def run(context):
+        state, generator = context
+        ring = state.ring
+        for goalie in state.goalies:
+            goalie.has_ring = False
+            goalie.throw_cooldown = 0
+        ring.set_center((generator.uniform(100, WIDTH - 100), generator.uniform(50, HEIGHT - 50)))
+        ring.velocity = [generator.uniform(4, 12), generator.uniform(-3, 3)]
+        ring.decay_factor = state.rules.shot_decay
+        ring.active = True
+        while ring.active and ring.velocity != [0, 0]:
+            hit = ring.update(state.collision_targets())
+            if hit is not None:
+                state.resolve_hit(hit)
+
+    return 1 / timed_rounds(setup, run, 100)
+
+
+def bench_ai_frame():
+    # Every decision for full AI rosters in one step (all skaters' inputs and
+    # both goalie targets), not counting the step itself
+    from ai import AI, load_tables
+
+    tables = load_tables()
+    if tables is None:
+        raise SystemExit("ai_frame_ms needs the AI tables; build them with python ai.py")
+    results = []
+    for _ in range(ROUNDS):
+        state = GameState(seed=1, roster=ROSTER)
+        ai = AI(tables, state.rules)
+        elapsed = 0.0
+        for _ in range(DIRTY_FRAMES):
+            started = time.perf_counter()
+            controls = ai.skater_inputs(state)
+            for goalie in state.goalies:
+                ai.goalie_target(state, goalie)
+            elapsed += time.perf_counter() - started
+            state.step(skater_inputs=controls)
+        results.append(elapsed / DIRTY_FRAMES)
+    return min(results) * 1000
+
+
+def bench_particles():
+    # Moving, erasing and drawing a full particle system for one frame, with a
+    # burst every frame using up the spawn budget
+    from particles import CAPACITY, GOAL_BURST, ParticleSystem
+    from view import View
+
+    screen = pygame.display.get_surface()
+    view = View(screen.get_size())
+    results = []
+    for _ in range(ROUNDS):
+        scene = Scene()
+        particles = ParticleSystem(seed=1)
+        particles.set_view(view)
+        elapsed = 0.0
+        for frame in range(DIRTY_FRAMES):
+            particles.burst(GOAL_BURST, (WIDTH // 2, HEIGHT // 2), CAPACITY)
+            scene.step()
+            particles.emit(scene.state)
+            started = time.perf_counter()
+            particles.update()
+            screen.blits([(scene.background, rect, rect) for rect in particles.rects], False)
+            particles.draw(screen)
+            elapsed += time.perf_counter() - started
+        results.append(elapsed / DIRTY_FRAMES)
+    return min(results) * 1000
+
+
+def bench_startup():
+    # Launching main.py until its first frame is drawn, plus its peak memory
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy",
+               PYGAME_HIDE_SUPPORT_PROMPT="1")
+    times = []
+    for _ in range(STARTUP_RUNS):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, MAIN_PATH, "--frames", "1"], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    peak = None
+    try:
+        import resource
+    except ImportError:
+        pass  # Windows has no resource module; peak memory is skipped there
+    else:
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        peak /= 1024 * 1024 if sys.platform == "darwin" else 1024  # Bytes on macOS, KB elsewhere
+    return min(times) * 1000, peak
+
+
+def run_benchmarks(only=None):
+    pygame.init()
+    pygame.display.set_mode((WIDTH, HEIGHT))
+    results = {}
+    benchmarks = (
+        ("draw_rink_ms", bench_draw_rink),
+        ("render_frame_ms", bench_render_frame),
+        ("render_dirty_frame_ms", bench_render_dirty_frame),
+        ("physics_steps_per_s", bench_physics_steps),
+        ("roster_steps_per_s", bench_roster_steps),
+        ("collision_chain_per_s", bench_collision_chain),
+        ("ai_frame_ms", bench_ai_frame),
+        ("particles_ms", bench_particles),
+    )
+    for name, benchmark in benchmarks:
+        if not only or name in only:
+            results[name] = benchmark()
+    if not only or "startup_ms" in only or "peak_rss_mb" in only:
+        startup, peak = bench_startup()
+        results["startup_ms"] = startup
+        if peak is not None:
+            results["peak_rss_mb"] = peak
+    pygame.quit()
+    return results
+
+
+def compare(results, baseline, thresholds, default_threshold):
+    # Table rows and the names of the metrics that regressed
+    rows = []
+    regressions = []
+    for name, unit, higher_is_better in METRICS:
+        if name not in results:
+            continue
+        value = results[name]
+        old = baseline.get(name)
+        if old is None or old == 0:
+            rows.append((name, value, unit, None, "new"))
+            continue
+        change = (value - old) / old
+        worse = -change if higher_is_better else change
+        threshold = thresholds.get(name, default_threshold)
+        status = "ok"
+        if worse > threshold:
+            status = f"REGRESSED (limit {threshold:+.0%})"
+            regressions.append(name)
+        rows.append((name, value, unit, change, status))
+    return rows, regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"metrics": {}, "thresholds": {}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rendering, physics and startup")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="baseline file to compare with")
+    parser.add_argument("--save", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--threshold", action="append", default=[],
+                        help="allowed slowdown as a fraction, or name=fraction for one metric")
+    parser.add_argument("--only", help="comma separated metrics to run")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    thresholds = dict(baseline.get("thresholds", {}))
+    default_threshold = baseline.get("threshold", DEFAULT_THRESHOLD)
+    for item in args.threshold:
+        name, _, value = item.rpartition("=")
+        if name:
+            thresholds[name] = float(value)
+        else:
+            default_threshold = float(value)
+
+    only = set(args.only.split(",")) if args.only else None
+    results = run_benchmarks(only)
+    rows, regressions = compare(results, baseline["metrics"], thresholds, default_threshold)
+    for name, value, unit, change, status in rows:
+        change_text = "" if change is None else f"{change:+.1%}"
+        print(f"{name:24} {value:12.3f} {unit:8} {change_text:>8}  {status}")
+
+    if args.save:
+        baseline["metrics"] = dict(baseline["metrics"], **results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+# Live broadcast of a game to spectators.
+#
+#   python main.py --skaters 3 --opponents 3 --ai --broadcast
+#   then open http://<this machine>:8765/ on the arena screen or a phone
+#
+# The game thread hands each frame to a hub running its own asyncio loop on a
+# background thread, so the game never waits on a viewer. The hub is a small
+# WebSocket server (and serves docs/play.html, which turns into a viewer when
+# opened with ?watch). Each frame is encoded once, as net.py's snapshot
+# delta against the frame before, and the same bytes go to every viewer that
+# is keeping up. A viewer that joins, or whose socket has fallen behind,
+# gets a keyframe of the newest frame once it can take more, instead of an
+# ever growing queue of frames it will never catch up on.
+#
+#   python broadcast.py 127.0.0.1:8765 --viewers 300 --slow 20
+#
+# connects a crowd of headless viewers, some of them stalling now and then, and
+# reports what they got.
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from game import *
+from net import SnapshotCodec, snapshot_fields
+from replay import EVENT_NAMES
+
+DEFAULT_PORT = 8765
+FRAME_INTERVAL = 2  # Steps between frames (30 a second)
+# How far a viewer can fall behind before it skips frames. The kernel's send
+# buffer is kept small too, or it would hold many seconds of stale frames.
+SEND_BUFFER = 4096
+MAX_BUFFERED = 1024
+EVENTS = [name for name, _ in snapshot_fields(0)].index("events")
+DOCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docs")
+CONTENT_TYPES = {".html": "text/html; charset=utf-8", ".svg": "image/svg+xml", ".js": "text/javascript",
+                 ".json": "application/json"}
+
+# Frame types, the first byte of every binary message
+KEYFRAME = b"K"
+DELTA = b"D"
+FRAME_HEADER = struct.Struct("<cI")  # Type, game step
+
+# WebSocket (RFC 6455)
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TEXT = 0x1
+BINARY = 0x2
+CLOSE = 0x8
+PING = 0x9
+PONG = 0xA
+MAX_MESSAGE = 64 * 1024  # Largest message accepted from a viewer
+STALL_CYCLE = 30  # Seconds, for load testing with Spectator
+
+
+def websocket_accept(key):
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def websocket_frame(payload, opcode=BINARY, mask=None):
+    # One unfragmented message; clients have to mask theirs, servers must not
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask is not None else 0
+    if len(payload) < 126:
+        header.append(mask_bit | len(payload))
+    elif len(payload) < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack(">H", len(payload))
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack(">Q", len(payload))
+    if mask is None:
+        return bytes(header) + payload
+    return bytes(header) + mask + bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+
+
+async def read_websocket_frame(reader):
+    # (opcode, payload) of the next frame; raises ConnectionError on nonsense
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack(">H", await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack(">Q", await reader.readexactly(8))
+    if length > MAX_MESSAGE:
+        raise ConnectionError("Message too large")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask is not None:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return first & 0x0F, payload
+
+
+async def read_http_request(reader):
+    # The request line and headers (lower-cased names) of an HTTP request
+    data = await reader.readuntil(b"\r\n\r\n")
+    lines = data.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if value:
+            headers[name.strip().lower()] = value.strip()
+    return lines[0].split(" "), headers
+
+
+class Viewer:
+    def __init__(self, writer):
+        self.writer = writer
+        self.tick = None  # Frame it has last been sent, None if it needs a keyframe
+
+
+class BroadcastHub:
+    def __init__(self, state, host="0.0.0.0", port=DEFAULT_PORT, docs=DOCS_DIR):
+        self.host = host
+        self.port = port
+        self.docs = docs
+        self.codec = SnapshotCodec(len(state.skaters))
+        roster = [sum(1 for skater in state.skaters if skater.team == team) for team in (0, 1)]
+        self.hello = json.dumps({"fields": snapshot_fields(len(state.skaters)), "roster": roster,
+                                 "teams": [skater.team for skater in state.skaters],
+                                 "fps": FPS / FRAME_INTERVAL, "events": EVENT_NAMES}).encode("utf-8")
+        self.viewers = set()
+        self.previous = None  # (tick, values) of the last frame sent
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self.server = None
+        # Handed over from the game thread. A frame the hub hasn't picked up yet
+        # is replaced by the next one, so a busy hub can't fall behind either.
+        self.lock = threading.Lock()
+        self.pending = None
+        self.events = 0  # EVENT_NAMES bits since the last frame published
+        self.published = None  # Step of the last frame published
+        # Counters
+        self.frames = 0
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
+        self.skipped = 0
+        self.bytes_sent = 0
+
+    def start(self):
+        # Binds the port (raising OSError here if it can't) and starts the hub thread
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, self.host, self.port))
+            except OSError as error:
+                errors.append(error)
+                ready.set()
+                return
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="broadcast", daemon=True)
+        self.thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(1)
+
+    def publish(self, state):
+        # Called by the game after every step; only ever takes the lock briefly
+        for name in state.events:
+            self.events |= 1 << EVENT_NAMES.index(name)
+        if state.frame % FRAME_INTERVAL or state.frame == self.published:
+            return
+        self.published = state.frame
+        values = self.codec.capture(state, self.events)
+        self.events = 0
+        with self.lock:
+            waiting = self.pending is not None
+            if waiting:
+                # Keep the events of the frame being replaced
+                values = values[:EVENTS] + (values[EVENTS] | self.pending[1][EVENTS],) + values[EVENTS + 1:]
+            self.pending = (state.frame, values)
+        if not waiting:
+            self.loop.call_soon_threadsafe(self.send_pending)
+
+    def send_pending(self):
+        with self.lock:
+            tick, values = self.pending
+            self.pending = None
+        self.frames += 1
+        delta = None
+        if self.previous is not None:
+            delta = websocket_frame(FRAME_HEADER.pack(DELTA, tick) + self.codec.encode(values, self.previous[1]))
+        keyframe = None  # Only encoded if somebody needs it
+        for viewer in list(self.viewers):
+            transport = viewer.writer.transport
+            if transport.is_closing():
+                self.viewers.discard(viewer)
+                continue
+            if transport.get_write_buffer_size() > MAX_BUFFERED:
+                # Behind: skip frames until it has drained, then start over from a keyframe
+                viewer.tick = None
+                self.skipped += 1
+                continue
+            if delta is not None and viewer.tick == self.previous[0]:
+                data = delta
+                self.deltas_sent += 1
+            else:
+                if keyframe is None:
+                    keyframe = websocket_frame(FRAME_HEADER.pack(KEYFRAME, tick) + self.codec.encode(values))
+                data = keyframe
+                self.keyframes_sent += 1
+            viewer.writer.write(data)
+            viewer.tick = tick
+            self.bytes_sent += len(data)
+        self.previous = (tick, values)
+
+    async def handle(self, reader, writer):
+        try:
+            request, headers = await asyncio.wait_for(read_http_request(reader), 10)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        if headers.get("upgrade", "").lower() != "websocket" or "sec-websocket-key" not in headers:
+            await self.serve_file(writer, request)
+            return
+
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {websocket_accept(headers['sec-websocket-key'])}\r\n\r\n").encode("ascii"))
+        writer.write(websocket_frame(self.hello, TEXT))
+        viewer = Viewer(writer)
+        self.viewers.add(viewer)
+        try:
+            # Viewers only send control frames; reading them shows when they leave
+            while True:
+                opcode, payload = await read_websocket_frame(reader)
+                if opcode == CLOSE:
+                    writer.write(websocket_frame(b"", CLOSE))
+                    break
+                if opcode == PING:
+                    writer.write(websocket_frame(payload, PONG))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.viewers.discard(viewer)
+            writer.close()
+
+    async def serve_file(self, writer, request):
+        # Just enough HTTP to load the viewer page from the hub itself
+        path = request[1].split("?")[0] if len(request) > 1 else "/"
+        name = path.lstrip("/")
+        if request[0] == "GET" and path == "/":
+            response = b"HTTP/1.1 302 Found\r\nLocation: /play.html?watch\r\nContent-Length: 0\r\n\r\n"
+        elif request[0] == "GET" and os.path.isdir(self.docs) and name in os.listdir(self.docs):
+            with open(os.path.join(self.docs, name), "rb") as file:
+                body = file.read()
+            content_type = CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+            response = (f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                        "Cache-Control: no-cache\r\n\r\n").encode("ascii") + body
+        else:
+            response = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n"
+        writer.write(response)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+class Spectator:
+    # A headless viewer for load tests: keeps the decoded frame and counts
+    # what arrives. Stalling ones stop reading for stall seconds out of every
+    # STALL_CYCLE, like a phone dropping off wifi, with small buffers on their
+    # end so the backlog reaches the hub sooner.
+    def __init__(self, stall=0.0):
+        self.stall = stall
+        self.codec = None
+        self.values = None
+        self.keyframes = 0
+        self.deltas = 0
+        self.bytes = 0
+        self.errors = 0
+
+    async def watch(self, host, port, seconds):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.stall:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, (socket.gethostbyname(host), port))
+        reader, writer = await asyncio.open_connection(sock=sock, limit=1024 if self.stall else 2 ** 16)
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        writer.write((f"GET / HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode("ascii"))
+        request, headers = await read_http_request(reader)
+        if headers.get("sec-websocket-accept") != websocket_accept(key):
+            raise ConnectionError("Not a broadcast hub")
+        started = time.monotonic()
+        deadline = started + seconds
+        try:
+            while time.monotonic() < deadline:
+                opcode, payload = await asyncio.wait_for(read_websocket_frame(reader), deadline - time.monotonic())
+                if opcode == TEXT:
+                    hello = json.loads(payload)
+                    self.codec = SnapshotCodec(len(hello["teams"]))
+                elif opcode == BINARY:
+                    self.receive(payload)
+                if self.stall and (time.monotonic() - started) % STALL_CYCLE > STALL_CYCLE - self.stall:
+                    await asyncio.sleep(self.stall)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass  # Out of time, or the game ended
+        finally:
+            writer.write(websocket_frame(b"", CLOSE, os.urandom(4)))
+            writer.close()
+
+    def receive(self, payload):
+        kind, tick = FRAME_HEADER.unpack_from(payload)
+        self.bytes += len(payload)
+        if kind == KEYFRAME:
+            self.values = self.codec.decode(payload[FRAME_HEADER.size:])
+            self.keyframes += 1
+        elif self.values is None:
+            self.errors += 1  # A delta with nothing to apply it to
+        else:
+            self.values = self.codec.decode(payload[FRAME_HEADER.size:], self.values)
+            self.deltas += 1
+
+
+async def watch_crowd(host, port, viewers, slow, seconds):
+    spectators = [Spectator(20.0 if i < slow else 0.0) for i in range(viewers)]
+    await asyncio.gather(*(spectator.watch(host, port, seconds) for spectator in spectators))
+    return spectators
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test a game broadcast with headless viewers")
+    parser.add_argument("address", help="HOST:PORT of a game started with main.py --broadcast")
+    parser.add_argument("--viewers", type=int, default=100)
+    parser.add_argument("--slow", type=int, default=0, help="how many of them stop reading for 20 seconds out of every 30")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args(argv)
+
+    host, _, port = args.address.rpartition(":")
+    spectators = asyncio.run(watch_crowd(host, int(port), args.viewers, args.slow, args.seconds))
+    for label, group in (("fast", spectators[args.slow:]), ("slow", spectators[:args.slow])):
+        if not group:
+            continue
+        messages = sum(s.keyframes + s.deltas for s in group)
+        print(f"{len(group)} {label} viewers: {messages / len(group):.0f} frames each, "
+              f"{sum(s.keyframes for s in group) / len(group):.1f} keyframes, "
+              f"{sum(s.bytes for s in group) / max(messages, 1):.1f} bytes per frame, "
+              f"{sum(s.errors for s in group)} errors")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
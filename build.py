@@ -6,6 +6,9 @@ def build_executable():
     print("Installing requirements...")
     subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
     
+    print("Baking sprite atlas...")
+    subprocess.check_call([sys.executable, "atlas.py"])
+
     print("Building executable...")
     # Get the absolute path to the assets directory
     assets_path = os.path.abspath("assets")
@@ -18,6 +21,10 @@ def build_executable():
         "--name", "RingetteGame",
         "--add-data", f"{assets_path};assets",  # Use absolute path for assets
         "--collect-all", "assets",  # Ensure all assets are collected
+        # pygame imports these if they are installed but the game never uses them;
+        # leaving them out shrinks what the one-file build extracts on launch
+        "--exclude-module", "numpy",
+        "--exclude-module", "pkg_resources",
         "main.py"
     ])
     
@@ -0,0 +1,342 @@
+# Gym-style training environments for the rules in game.py.
+#
+#   env = RingetteEnv(roster=(1, 1), ai=True)
+#   observation, info = env.reset(seed=1)
+#   observation, reward, terminated, truncated, info = env.step(action)
+#
+#   envs = VectorEnv(64, workers=4, roster=(1, 1), ai=True)
+#   observations, infos = envs.reset(seed=1)
+#   observations, rewards, terminated, truncated, infos = envs.step(actions)
+#
+# VectorEnv runs its environments in worker processes that read actions from
+# and write observations, rewards and done flags into one block of shared
+# memory, so a step costs the learner a copy of the actions and one byte to
+# each worker, not a pickled array per environment. The arrays it returns
+# are views of that block: they change on the next step, so copy what you
+# keep. Finished environments are reset straight away. Their last
+# observation is in infos["final_observation"] at the same row.
+#
+# An action is ACTION_SIZE floats: movement in x and y (below -0.5 is left or
+# up, above 0.5 right or down), shoot and pick up (above 0.5 to press them),
+# and the point to aim at as a fraction of the rink's width and height. An
+# observation is observation_size(roster) floats, see RingetteEnv.observe.
+#
+#   python env.py --envs 64 --workers 4 --compare
+#
+# measures steps per second, against the same environments stepped in one
+# process and against workers that pickle everything through pipes.
+import argparse
+import multiprocessing
+import random
+import struct
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from game import *
+
+ACTION_SIZE = 6
+MAX_STEPS = 60 * FPS  # A minute of game time per episode
+# Reward for each thing that can happen to the controlled skater's team in one step
+REWARDS = {"goal": 1.0, "conceded": -1.0, "pickup": 0.05}
+# Events after which the next pickup starts a new possession, as does anyone
+# else (a skater or a goalie) taking the ring. Our own drops and shots don't,
+# so picking the ring back up can't farm the pickup reward.
+POSSESSION_ENDS = ("goal", "check", "shot_clock")
+
+# Commands to workers
+STEP = b"s"
+RESET = b"r"  # Followed by a seed as SEED, or NO_SEED
+CLOSE = b"q"
+SEED = struct.Struct("<q")
+NO_SEED = -1
+
+
+def observation_size(roster):
+    return 12 + 2 * sum(roster)
+
+
+def action_inputs(action):
+    move_x, move_y, shoot, pickup, aim_x, aim_y = action
+    return Inputs(move_x < -0.5, move_x > 0.5, move_y < -0.5, move_y > 0.5, shoot > 0.5, pickup > 0.5,
+                  (float(aim_x) * WIDTH, float(aim_y) * HEIGHT))
+
+
+class RingetteEnv:
+    # One game, played as state.player (team 0, attacking the right goal).
+    # With ai set, AI plays every other skater and the goalies.
+    def __init__(self, roster=(1, 0), rules=DEFAULT_RULES, max_steps=MAX_STEPS, ai=False):
+        self.roster = tuple(roster)
+        self.rules = rules
+        self.max_steps = max_steps
+        self.observation_size = observation_size(roster)
+        self.ai = None
+        if ai:
+            from ai import AI, load_tables
+
+            tables = load_tables()
+            if tables is None:
+                raise FileNotFoundError("The AI tables are missing; build them with python ai.py")
+            self.ai = AI(tables, rules)
+        self.seeds = random.Random()  # Seeds for the games after the first
+        self.state = None
+        self.steps = 0
+        self.possession_paid = False  # Pickup reward already given this possession
+
+    def reset(self, seed=None, out=None):
+        if seed is not None:
+            self.seeds.seed(seed)
+        self.state = GameState(self.seeds.getrandbits(32), self.rules, self.roster)
+        self.state.goalie_ai = self.ai
+        self.steps = 0
+        self.possession_paid = False
+        return self.observe(out), {}
+
+    def step(self, action, out=None):
+        state = self.state
+        team_scores = list(state.team_scores)
+        skater_inputs = self.ai.skater_inputs(state) if self.ai is not None else None
+        events = state.step(action_inputs(action), skater_inputs=skater_inputs)
+        self.steps += 1
+
+        reward = 0.0
+        if state.team_scores[0] > team_scores[0]:
+            reward += REWARDS["goal"]
+        if state.team_scores[1] > team_scores[1]:
+            reward += REWARDS["conceded"]
+        if "pickup" in events and state.player.has_ring and not self.possession_paid:
+            reward += REWARDS["pickup"]
+            self.possession_paid = True
+        carrier = state.carrier
+        if (any(name in POSSESSION_ENDS for name in events) or (carrier is not None and carrier is not state.player)
+                or state.goalie1.has_ring or state.goalie2.has_ring):
+            self.possession_paid = False
+        terminated = "goal" in events
+        truncated = not terminated and self.steps >= self.max_steps
+        return self.observe(out), reward, terminated, truncated, {"events": events}
+
+    def observe(self, out=None):
+        # Everything scaled to about -1..1: the ring (position, velocity,
+        # moving, whether our skater, a teammate, an opponent or a goalie
+        # has it), the goalies' heights, the shot clock, then every skater's
+        # position with our skater first
+        state = self.state
+        ring = state.ring
+        speed = self.rules.ring_speed
+        carrier = state.carrier
+        values = [ring.position[0] / WIDTH, ring.position[1] / HEIGHT, ring.velocity[0] / speed,
+                  ring.velocity[1] / speed, float(ring.active), float(carrier is state.player),
+                  float(carrier is not None and carrier is not state.player and carrier.team == 0),
+                  float(carrier is not None and carrier.team == 1),
+                  float(state.goalie1.has_ring or state.goalie2.has_ring),
+                  state.goalie1.rect.y / HEIGHT, state.goalie2.rect.y / HEIGHT,
+                  state.shot_clock / self.rules.shot_clock_duration]
+        for skater in state.skaters:
+            values += [skater.rect.x / WIDTH, skater.rect.y / HEIGHT]
+        if out is None:
+            return np.array(values, dtype=np.float32)
+        out[:] = values
+        return out
+
+
+class SharedBuffers:
+    # Every array VectorEnv shares with its workers, laid out in one block of
+    # shared memory. The learner creates it; workers attach by name.
+    def __init__(self, num_envs, observation_size, name=None):
+        shapes = [("actions", np.float32, (num_envs, ACTION_SIZE)),
+                  ("observations", np.float32, (num_envs, observation_size)),
+                  ("final_observations", np.float32, (num_envs, observation_size)),
+                  ("rewards", np.float32, (num_envs,)),
+                  ("terminated", np.bool_, (num_envs,)),
+                  ("truncated", np.bool_, (num_envs,))]
+        size = sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for _, dtype, shape in shapes)
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        offset = 0
+        for field, dtype, shape in shapes:
+            array = np.ndarray(shape, dtype, self.memory.buf, offset)
+            setattr(self, field, array)
+            offset += array.nbytes
+
+    def close(self, unlink=False):
+        # The arrays have to go before the memory under them can be closed
+        for field in ("actions", "observations", "final_observations", "rewards", "terminated", "truncated"):
+            setattr(self, field, None)
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def run_worker(connection, name, num_envs, start, stop, options):
+    # Steps envs start..stop-1 whenever the learner says so
+    env_options = dict(options)
+    buffers = SharedBuffers(num_envs, observation_size(env_options["roster"]), name)
+    envs = [RingetteEnv(**env_options) for _ in range(start, stop)]
+    try:
+        while True:
+            command = connection.recv_bytes()
+            if command == STEP:
+                for i, env in enumerate(envs, start):
+                    _, reward, terminated, truncated, _ = env.step(buffers.actions[i], buffers.observations[i])
+                    buffers.rewards[i] = reward
+                    buffers.terminated[i] = terminated
+                    buffers.truncated[i] = truncated
+                    if terminated or truncated:
+                        buffers.final_observations[i] = buffers.observations[i]
+                        env.reset(out=buffers.observations[i])
+            elif command[:1] == RESET:
+                seed, = SEED.unpack(command[1:])
+                for i, env in enumerate(envs, start):
+                    env.reset(None if seed == NO_SEED else seed + i, buffers.observations[i])
+            else:
+                break
+            connection.send_bytes(b"")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        buffers.close()
+
+
+class VectorEnv:
+    def __init__(self, num_envs, workers=None, roster=(1, 0), rules=DEFAULT_RULES, max_steps=MAX_STEPS, ai=False):
+        workers = min(workers or multiprocessing.cpu_count(), num_envs)
+        self.num_envs = num_envs
+        self.observation_size = observation_size(roster)
+        self.buffers = SharedBuffers(num_envs, self.observation_size)
+        options = {"roster": tuple(roster), "rules": rules, "max_steps": max_steps, "ai": ai}
+        self.connections = []
+        self.processes = []
+        for worker in range(workers):
+            start, stop = num_envs * worker // workers, num_envs * (worker + 1) // workers
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_worker, daemon=True,
+                                              args=(child, self.buffers.memory.name, num_envs, start, stop, options))
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def run(self, command):
+        for connection in self.connections:
+            connection.send_bytes(command)
+        for connection in self.connections:
+            connection.recv_bytes()
+
+    def reset(self, seed=None):
+        # Environment i starts from seed + i, if a seed is given
+        self.run(RESET + SEED.pack(NO_SEED if seed is None else seed))
+        return self.buffers.observations, {}
+
+    def step(self, actions):
+        self.buffers.actions[:] = actions
+        self.run(STEP)
+        buffers = self.buffers
+        return (buffers.observations, buffers.rewards, buffers.terminated, buffers.truncated,
+                {"final_observation": buffers.final_observations})
+
+    def close(self):
+        if self.buffers is None:
+            return
+        for connection in self.connections:
+            try:
+                connection.send_bytes(CLOSE)
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(5)
+        self.buffers.close(unlink=True)
+        self.buffers = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_pickling_worker(connection, options):
+    # The usual way, for comparison: actions in and results out as pickles
+    envs = None
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        if message[0] == "reset":
+            envs = [RingetteEnv(**options) for _ in range(message[1])]
+            connection.send([env.reset(seed=i)[0] for i, env in enumerate(envs)])
+        else:
+            results = []
+            for env, action in zip(envs, message[1]):
+                result = env.step(action)
+                if result[2] or result[3]:
+                    env.reset()
+                results.append(result)
+            connection.send(results)
+
+
+def bench_pickling(num_envs, workers, steps, options, actions):
+    pipes = []
+    for worker in range(workers):
+        connection, child = multiprocessing.Pipe()
+        multiprocessing.Process(target=run_pickling_worker, args=(child, options), daemon=True).start()
+        pipes.append((connection, num_envs * worker // workers, num_envs * (worker + 1) // workers))
+    for connection, start, stop in pipes:
+        connection.send(("reset", stop - start))
+    for connection, _, _ in pipes:
+        connection.recv()
+    started = time.perf_counter()
+    for step in range(steps):
+        for connection, start, stop in pipes:
+            connection.send(("step", actions[step % len(actions)][start:stop]))
+        results = [result for connection, _, _ in pipes for result in connection.recv()]
+        np.stack([result[0] for result in results])
+    elapsed = time.perf_counter() - started
+    for connection, _, _ in pipes:
+        connection.send(None)
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how fast VectorEnv steps")
+    parser.add_argument("--envs", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--skaters", type=int, default=1, help="skaters on the learner's team")
+    parser.add_argument("--opponents", type=int, default=1, help="skaters on the other team")
+    parser.add_argument("--ai", action="store_true", help="AI plays everyone but the learner's skater")
+    parser.add_argument("--compare", action="store_true",
+                        help="also time one process and workers that pickle everything")
+    args = parser.parse_args(argv)
+
+    options = {"roster": (args.skaters, args.opponents), "ai": args.ai}
+    generator = np.random.default_rng(0)
+    actions = generator.uniform(-1, 1, (64, args.envs, ACTION_SIZE)).astype(np.float32)
+    actions[:, :, 4:] = generator.uniform(0, 1, (64, args.envs, 2))
+
+    def report(label, elapsed):
+        print(f"{label:<22}{args.envs * args.steps / elapsed:>10.0f} steps/s"
+              f"{elapsed / args.steps * 1e6:>10.0f} us per batched step")
+
+    with VectorEnv(args.envs, args.workers, **options) as envs:
+        envs.reset(seed=0)
+        started = time.perf_counter()
+        for step in range(args.steps):
+            envs.step(actions[step % len(actions)])
+        report(f"shared memory ({args.workers}w)", time.perf_counter() - started)
+    if args.compare:
+        report(f"pickled pipes ({args.workers}w)",
+               bench_pickling(args.envs, args.workers, args.steps, options, actions))
+        envs = [RingetteEnv(**options) for _ in range(args.envs)]
+        for i, env in enumerate(envs):
+            env.reset(seed=i)
+        started = time.perf_counter()
+        for step in range(args.steps):
+            for env, action in zip(envs, actions[step % len(actions)]):
+                if any(env.step(action)[2:4]):
+                    env.reset()
+        report("one process", time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,588 @@
+# Game rules without any window, input polling or frame throttling.
+# main.py feeds this from the keyboard and mouse and draws the result, while
+# headless tools can call GameState.step() as fast as they like.
+import math
+import random
+import pygame  # Only pygame.Rect is used, no pygame.init() required
+from assets import *
+from spatial import SpatialHash
+
+# Constants
+WIDTH, HEIGHT = RINK_WIDTH, RINK_HEIGHT
+FPS = 60
+PLAYER_SPEED = 5
+RING_SPEED = 5  # Reduced from 8 to make the ring move slower
+PICKUP_RANGE = 70  # Range within which the player can pick up the ring
+SHOT_CLOCK_DURATION = 30  # 30 seconds shot clock
+SHOT_DECAY = 0.99  # Per-frame ring speed kept after a player shot
+SAVE_DECAY = 0.98  # Faster decay after goalie throws and saves
+STOP_SPEED = 0.1  # Ring stops once both velocity components drop below this
+CATCH_CHANCE = 0.7  # 70% chance to catch (30% chance to bounce)
+GOALIE_HOLD_FRAMES = 180  # 3 seconds at 60 FPS
+GOALIE_THROW_COOLDOWN = 120  # 2 second cooldown (60 FPS * 2)
+GOALIE_SPEED = 1  # Reduced from 4 to make goalie movement slower
+MAX_BOUNCES_PER_STEP = 3  # A corner hit plus the rest of the move
+
+RINK_RECT = pygame.Rect(0, 0, WIDTH, HEIGHT)
+# Directions a skater can face, shared so that turning allocates nothing
+FACING_LEFT, FACING_RIGHT, FACING_UP, FACING_DOWN = (-1, 0), (1, 0), (0, -1), (0, 1)
+LEFT_CENTER_DOT = (WIDTH // 2 - DOT_OFFSET, HEIGHT // 2)
+RIGHT_CENTER_DOT = (WIDTH // 2 + DOT_OFFSET, HEIGHT // 2)
+
+
+class Inputs:
+    # Everything the player did during one step
+    def __init__(self, left=False, right=False, up=False, down=False,
+                 shoot=False, pickup=False, aim=(0, 0)):
+        self.left = left
+        self.right = right
+        self.up = up
+        self.down = down
+        self.shoot = shoot  # SPACE pressed this step
+        self.pickup = pickup  # Left click this step
+        self.aim = aim  # Mouse position used for shooting
+
+
+NO_INPUTS = Inputs()
+
+
+class Rules:
+    # The balance settings of a game; pass overrides to try out a variant
+    def __init__(self, **overrides):
+        self.player_speed = PLAYER_SPEED
+        self.ring_speed = RING_SPEED
+        self.pickup_range = PICKUP_RANGE
+        self.shot_decay = SHOT_DECAY
+        self.save_decay = SAVE_DECAY
+        self.catch_chance = CATCH_CHANCE
+        self.goalie_speed = GOALIE_SPEED
+        self.goalie_hold_frames = GOALIE_HOLD_FRAMES
+        self.goalie_throw_cooldown = GOALIE_THROW_COOLDOWN
+        self.shot_clock_duration = SHOT_CLOCK_DURATION
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise ValueError(f"Unknown rule: {name}")
+            setattr(self, name, value)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+DEFAULT_RULES = Rules()
+
+
+def formation(team, count):
+    # Starting spots for one team, spread over its own half. The first skater
+    # of the left team starts on the left blue line like the original game.
+    spots = []
+    for i in range(count):
+        column, row = divmod(i, 3)
+        x = max(WIDTH // 2 - 100 - column * 120, GOAL_LINE_1_X + 40)
+        y = HEIGHT // 2 + (0, -150, 150)[row]
+        if team == 1:
+            x = WIDTH - x - PLAYER_WIDTH
+        spots.append((x, y))
+    return spots
+
+
+# The entities keep their state in __slots__ rather than a __dict__ per
+# object, which makes each one a few fixed fields and attribute access in
+# the step loop cheaper. A new field has to be added to the class's slots.
+class Player:
+    __slots__ = ("rect", "speed", "team", "has_ring", "direction")
+
+    def __init__(self, x, y, speed=PLAYER_SPEED, team=0):
+        self.rect = pygame.Rect(x, y, PLAYER_WIDTH, PLAYER_HEIGHT)
+        self.speed = speed
+        self.team = team  # 0 attacks the right goal, 1 attacks the left
+        self.has_ring = False
+        self.direction = FACING_RIGHT
+
+    def update(self, inputs):
+        move_skaters(((self, inputs),))
+
+    def get_shoot_direction(self, aim):
+        aim_x, aim_y = aim
+        # Calculate direction vector from ring to the aim point (using ring's position)
+        ring_x = self.rect.right + 10  # Ring's x position (offset from player)
+        ring_y = self.rect.bottom      # Ring's y position
+        dx = aim_x - ring_x
+        dy = aim_y - ring_y
+        # Normalize the vector
+        length = math.sqrt(dx * dx + dy * dy)
+        if length > 0:
+            return [dx / length, dy / length]
+        return [1, 0]  # Default to right if aiming at the ring
+
+
+def move_skaters(controls):
+    # Arrow keys and WASD movement for every (skater, inputs) pair in one pass,
+    # with the lookups hoisted out of the loop. Skaters with no movement keys
+    # held are skipped: they are already on the rink and keep their heading.
+    rink = RINK_RECT
+    for skater, inputs in controls:
+        left, right, up, down = inputs.left, inputs.right, inputs.up, inputs.down
+        if not (left or right or up or down):
+            continue
+        rect = skater.rect
+        speed = skater.speed
+        if left:
+            rect.x -= speed
+            skater.direction = FACING_LEFT
+        if right:
+            rect.x += speed
+            skater.direction = FACING_RIGHT
+        if up:
+            rect.y -= speed
+            skater.direction = FACING_UP
+        if down:
+            rect.y += speed
+            skater.direction = FACING_DOWN
+        # Keep player on the rink
+        rect.clamp_ip(rink)
+
+
+def steer(player_rect, target, speed):
+    # Inputs that skate a player toward target, stopping once within a step of it
+    dx = target[0] - player_rect.centerx
+    dy = target[1] - player_rect.centery
+    return Inputs(left=dx < -speed, right=dx > speed, up=dy < -speed, down=dy > speed)
+
+
+def sweep_time(position, motion, rect):
+    # Fraction of motion after which a ring at position (top-left) first
+    # overlaps rect, or None if it doesn't during this motion. The test is
+    # swept, so a fast ring can't skip over a thin goalie between two steps.
+    enter, leave = 0.0, 1.0
+    for start, distance, low, high in (
+        (position[0], motion[0], rect.left - RING_SIZE, rect.right),
+        (position[1], motion[1], rect.top - RING_SIZE, rect.bottom),
+    ):
+        if distance == 0:
+            if not low < start < high:
+                return None
+            continue
+        low_time = (low - start) / distance
+        high_time = (high - start) / distance
+        if low_time > high_time:
+            low_time, high_time = high_time, low_time
+        enter = max(enter, low_time)
+        leave = min(leave, high_time)
+    if enter < leave:
+        return enter
+    return None
+
+
+def wall_time(start, distance, limit):
+    # Fraction of distance after which the ring reaches a wall at 0 or limit
+    if distance < 0 and start + distance < 0:
+        return -start / distance
+    if distance > 0 and start + distance > limit:
+        return (limit - start) / distance
+    return None
+
+
+class Ring:
+    __slots__ = ("rect", "position", "velocity", "active", "decay_factor")
+
+    def __init__(self):
+        self.rect = pygame.Rect(0, 0, RING_SIZE, RING_SIZE)
+        self.position = [0.0, 0.0]  # Exact top-left corner; rect is this rounded for drawing
+        self.velocity = [0, 0]
+        self.active = False
+        self.decay_factor = SHOT_DECAY  # General decay factor for all ring movements
+        # Start on the left center dot
+        self.set_center(LEFT_CENTER_DOT)
+
+    def set_position(self, x, y):
+        self.position[0] = x
+        self.position[1] = y
+        self.rect.topleft = (x, y)
+
+    def set_center(self, center):
+        self.set_position(center[0] - RING_SIZE / 2, center[1] - RING_SIZE / 2)
+
+    def set_bottomright(self, bottomright):
+        self.set_position(bottomright[0] - RING_SIZE, bottomright[1] - RING_SIZE)
+
+    def update(self, targets=()):
+        # Move for one step and return the first of targets the ring runs into
+        # (it stops touching it), or None. Earlier targets win ties.
+        if not self.active:
+            return None
+        # Apply velocity decay to all active ring movements
+        self.velocity[0] *= self.decay_factor
+        self.velocity[1] *= self.decay_factor
+        # Stop very slow movement to prevent endless sliding
+        if abs(self.velocity[0]) < STOP_SPEED and abs(self.velocity[1]) < STOP_SPEED:
+            self.velocity[0] = self.velocity[1] = 0
+
+        # A ring shot by a player on the boards can start outside the rink
+        x = min(max(self.position[0], 0), WIDTH - RING_SIZE)
+        y = min(max(self.position[1], 0), HEIGHT - RING_SIZE)
+        remaining = 1.0  # Fraction of this step's movement still to do
+        for _ in range(MAX_BOUNCES_PER_STEP):
+            motion = (self.velocity[0] * remaining, self.velocity[1] * remaining)
+            hit, hit_time = None, 1.0
+            for target in targets:
+                time = sweep_time((x, y), motion, target.rect)
+                if time is not None and (hit is None or time < hit_time):
+                    hit, hit_time = target, time
+            wall_x = wall_time(x, motion[0], WIDTH - RING_SIZE)
+            wall_y = wall_time(y, motion[1], HEIGHT - RING_SIZE)
+            walls = [t for t in (wall_x, wall_y) if t is not None]
+            bounce_time = min(walls) if walls else None
+            if hit is not None and (bounce_time is None or hit_time <= bounce_time):
+                x += motion[0] * hit_time
+                y += motion[1] * hit_time
+                break
+            if bounce_time is None:
+                x += motion[0]
+                y += motion[1]
+                break
+            # Bounce off walls at the exact point of contact
+            x += motion[0] * bounce_time
+            y += motion[1] * bounce_time
+            if wall_x == bounce_time:
+                x = 0.0 if motion[0] < 0 else float(WIDTH - RING_SIZE)
+                self.velocity[0] *= -1
+            if wall_y == bounce_time:
+                y = 0.0 if motion[1] < 0 else float(HEIGHT - RING_SIZE)
+                self.velocity[1] *= -1
+            remaining *= 1 - bounce_time
+        else:
+            hit = None
+        self.set_position(x, y)
+        return hit
+
+
+class Goal:
+    __slots__ = ("rect",)
+
+    def __init__(self, x, y):
+        self.rect = pygame.Rect(x, y, GOAL_WIDTH, GOAL_HEIGHT)
+
+
+class Goalie:
+    __slots__ = ("rect", "facing", "speed", "hold_frames", "throw_cooldown_frames", "direction", "goal_top",
+                 "goal_bottom", "has_ring", "hold_time", "throw_direction", "throw_cooldown", "target_y")
+
+    def __init__(self, x, y, facing, rules=DEFAULT_RULES):
+        self.rect = pygame.Rect(x, y, GOALIE_WIDTH, GOALIE_HEIGHT)
+        self.facing = facing  # 1 if the goalie throws to the right, -1 for left
+        self.speed = rules.goalie_speed
+        self.hold_frames = rules.goalie_hold_frames  # How long the ring is held before a throw
+        self.throw_cooldown_frames = rules.goalie_throw_cooldown
+        self.direction = 1  # 1 for down, -1 for up
+        self.goal_top = HEIGHT // 2 - 50  # Top of the goal
+        self.goal_bottom = HEIGHT // 2 + 50  # Bottom of the goal
+        self.has_ring = False  # Track if goalie is holding the ring
+        self.hold_time = 0  # Track how long goalie has held the ring
+        self.throw_direction = [0, 0]  # Direction to throw the ring
+        self.throw_cooldown = 0  # Cooldown after throwing before can catch again
+        self.target_y = None  # Top y the goalie skates to instead of patrolling (set by GameState.goalie_ai)
+
+    def update(self):
+        # Only move if not holding the ring
+        if not self.has_ring:
+            if self.target_y is None:
+                # Move up and down within goal area
+                self.rect.y += self.speed * self.direction
+
+                # Change direction at goal boundaries
+                if self.rect.top <= self.goal_top:
+                    self.direction = 1
+                elif self.rect.bottom >= self.goal_bottom:
+                    self.direction = -1
+            else:
+                # Skate toward the target without leaving the front of the goal
+                target = min(max(self.target_y, self.goal_top), self.goal_bottom - self.rect.height)
+                self.rect.y += min(max(target - self.rect.y, -self.speed), self.speed)
+
+            # Update throw cooldown
+            if self.throw_cooldown > 0:
+                self.throw_cooldown -= 1
+
+        # Update ring position if goalie has it
+        if self.has_ring:
+            self.hold_time += 1
+            if self.hold_time >= self.hold_frames:
+                self.has_ring = False
+                self.throw_cooldown = self.throw_cooldown_frames
+                return self.throw_direction  # Return direction to throw the ring
+        return None
+
+    def can_catch(self):
+        return not self.has_ring and self.throw_cooldown == 0
+
+
+class GameState:
+    def __init__(self, seed=None, rules=DEFAULT_RULES, roster=(1, 0)):
+        # Goalie catches and bounces draw from this, so a seed replays a game exactly
+        self.random = random.Random(seed)
+        self.rules = rules
+
+        # roster is the number of skaters on each team; the first one is the
+        # skater controlled through step()'s inputs
+        self.skaters = []
+        for team, count in enumerate(roster):
+            for x, y in formation(team, count):
+                self.skaters.append(Player(x, y, rules.player_speed, team))
+        self.player = self.skaters[0]
+        self.grid = SpatialHash()
+        self.ring = Ring()
+        # Create two goals
+        self.goal1 = Goal(GOAL_LINE_1_X - 20, HEIGHT // 2 - 50)  # Left side of its goal line
+        self.goal2 = Goal(GOAL_LINE_2_X, HEIGHT // 2 - 50)  # Right side of its goal line
+        # Create goalies, 30px in front of their goal lines
+        self.goalie1 = Goalie(GOAL_LINE_1_X + 30, HEIGHT // 2 - 30, 1, rules)
+        self.goalie2 = Goalie(GOAL_LINE_2_X - 30, HEIGHT // 2 - 30, -1, rules)
+
+        self.score = 0
+        self.team_scores = [0, 0]  # Goals scored by each team
+        self.shot_clock = rules.shot_clock_duration
+        self.shot_clock_elapsed = 0.0  # Seconds since the shot clock last ticked
+        self.shot_clock_running = True  # main.py stops it while instructions are shown
+        self.ring_picked_up_since_goal = False  # Track if ring has been picked up since last goal
+        self.frame = 0
+        self.events = []  # Names of what happened during the last step
+        self.profiler = None  # main.py --profile attaches a FrameProfiler to time each phase
+        self.goalie_ai = None  # An ai.AI here moves the goalies toward the ring instead of patrolling
+        self.rebuild_grid()
+
+    @property
+    def goalies(self):
+        return (self.goalie1, self.goalie2)
+
+    @property
+    def goals(self):
+        return (self.goal1, self.goal2)
+
+    @property
+    def carrier(self):
+        # The skater holding the ring, if any
+        for skater in self.skaters:
+            if skater.has_ring:
+                return skater
+        return None
+
+    def rebuild_grid(self):
+        self.grid.rebuild(self.skaters)
+
+    def skaters_near(self, point, radius):
+        # Skaters whose centers are within radius of point
+        x, y = point
+        found = []
+        for skater in self.grid.near(point, radius):
+            dx = skater.rect.centerx - x
+            dy = skater.rect.centery - y
+            if dx * dx + dy * dy <= radius * radius:
+                found.append(skater)
+        return found
+
+    def shoot(self, player, aim):
+        ring = self.ring
+        if not player.has_ring:
+            return
+        player.has_ring = False
+        ring.active = True
+        # Position ring at bottom right of player with offset
+        ring.set_bottomright((player.rect.right + 10, player.rect.bottom))
+        # Get direction from player to the aim point
+        direction = player.get_shoot_direction(aim)
+        ring.velocity = [direction[0] * self.rules.ring_speed,
+                         direction[1] * self.rules.ring_speed]
+        ring.decay_factor = self.rules.shot_decay  # Reset decay factor for player shots
+        self.shot_clock = self.rules.shot_clock_duration  # Reset shot clock when shooting
+        self.events.append("shot")
+
+    def toggle_pickup(self, player):
+        ring = self.ring
+        carrier = self.carrier
+        if carrier is not None and carrier is not player:
+            return  # Someone else has it; take it by checking them instead
+        # Calculate distance between player and ring
+        dx = ring.rect.centerx - player.rect.centerx
+        dy = ring.rect.centery - player.rect.centery
+        distance = math.sqrt(dx * dx + dy * dy)
+
+        # Toggle pickup if within range
+        if distance <= self.rules.pickup_range:
+            player.has_ring = not player.has_ring  # Toggle pickup state
+            if player.has_ring:
+                # Position ring at bottom right of player with offset
+                ring.set_bottomright((player.rect.right + 10, player.rect.bottom))
+                ring.active = False  # Stop the ring from moving
+                ring.velocity = [0, 0]  # Reset velocity
+                self.ring_picked_up_since_goal = True  # Mark that ring has been picked up
+                self.events.append("pickup")
+            else:
+                self.events.append("drop")
+
+    def reset_ring(self, center):
+        for skater in self.skaters:
+            skater.has_ring = False
+        self.ring.active = False
+        self.ring.velocity = [0, 0]
+        self.ring.set_center(center)
+        self.shot_clock = self.rules.shot_clock_duration
+        self.ring_picked_up_since_goal = False
+
+    def update_shot_clock(self, dt):
+        self.shot_clock_elapsed += dt
+        if self.shot_clock_elapsed >= 1:  # Every second
+            if self.shot_clock_running and self.ring_picked_up_since_goal:  # Only count down after first pickup
+                self.shot_clock -= 1
+                if self.shot_clock <= 0:
+                    # Time's up! Reset ring to center
+                    self.reset_ring(LEFT_CENTER_DOT)
+                    self.events.append("shot_clock")
+            self.shot_clock_elapsed = 0.0
+
+    def update_goalies(self):
+        ring = self.ring
+        for goalie in self.goalies:
+            if self.goalie_ai is not None:
+                goalie.target_y = self.goalie_ai.goalie_target(self, goalie)
+            throw_direction = goalie.update()
+            if throw_direction:
+                ring.active = True
+                # Position ring slightly in front of goalie (away from its net)
+                ring.set_center((goalie.rect.centerx + 20 * goalie.facing, goalie.rect.centery))
+                throw_speed = self.rules.ring_speed * 0.5  # Half speed for goalie throws
+                ring.velocity = [throw_direction[0] * throw_speed, throw_direction[1] * throw_speed]
+                ring.decay_factor = self.rules.save_decay  # Faster decay for goalie throws
+                goalie.hold_time = 0
+                self.shot_clock = self.rules.shot_clock_duration  # Reset shot clock on throw
+                self.events.append("throw")
+
+    def collision_targets(self):
+        # Goalie blocks are checked before goals
+        return [goalie for goalie in self.goalies if goalie.can_catch()] + [self.goal1, self.goal2]
+
+    def resolve_hit(self, target):
+        ring = self.ring
+        if isinstance(target, Goalie):
+            goalie = target
+            if self.random.random() < self.rules.catch_chance:
+                # Goalie catches the ring
+                ring.active = False
+                goalie.has_ring = True
+                goalie.hold_time = 0  # Reset hold time
+                # Calculate throw direction (away from net)
+                goalie.throw_direction = [goalie.facing, self.random.uniform(-1, 1)]
+                ring.set_center(goalie.rect.center)  # Position ring on goalie
+                self.events.append("catch")
+            else:
+                # Normal bounce
+                ring.velocity[0] *= -1  # Reverse x velocity
+                ring.velocity[1] *= -1  # Reverse y velocity
+                # Add some randomness to the bounce
+                ring.velocity[0] += self.random.uniform(-1, 1)
+                ring.velocity[1] += self.random.uniform(-1, 1)
+                ring.decay_factor = self.rules.save_decay  # Set decay factor for goalie saves
+                self.events.append("save")
+            self.shot_clock = self.rules.shot_clock_duration  # Reset shot clock when ring hits goalie
+        else:
+            self.score += 1
+            self.team_scores[0 if target is self.goal2 else 1] += 1
+            ring.active = False
+            # The team that got scored on restarts from its own center dot
+            ring.set_center(LEFT_CENTER_DOT if target is self.goal1 else RIGHT_CENTER_DOT)
+            ring.velocity = [0, 0]
+            self.shot_clock = self.rules.shot_clock_duration  # Reset shot clock on goal
+            self.ring_picked_up_since_goal = False  # Reset pickup flag after goal
+            self.events.append("goal")
+
+    def resolve_contacts(self):
+        # Push overlapping skaters apart; an opponent running into the carrier
+        # knocks the ring loose
+        self.rebuild_grid()
+        pushed = False
+        for first, second in list(self.grid.pairs()):
+            a, b = first.rect, second.rect
+            if not a.colliderect(b):
+                continue
+            pushed = True
+            overlap_x = min(a.right, b.right) - max(a.left, b.left)
+            overlap_y = min(a.bottom, b.bottom) - max(a.top, b.top)
+            if overlap_x < overlap_y:
+                side = -1 if a.centerx <= b.centerx else 1
+                a.x += side * (overlap_x - overlap_x // 2)
+                b.x -= side * (overlap_x // 2)
+            else:
+                side = -1 if a.centery <= b.centery else 1
+                a.y += side * (overlap_y - overlap_y // 2)
+                b.y -= side * (overlap_y // 2)
+            a.clamp_ip(RINK_RECT)
+            b.clamp_ip(RINK_RECT)
+            if first.team != second.team:
+                if first.has_ring:
+                    self.knock_loose(first, second)
+                elif second.has_ring:
+                    self.knock_loose(second, first)
+        if pushed:
+            self.rebuild_grid()
+
+    def knock_loose(self, carrier, checker):
+        carrier.has_ring = False
+        ring = self.ring
+        ring.active = True
+        speed = self.rules.ring_speed * 0.5
+        ring.velocity = [checker.direction[0] * speed, checker.direction[1] * speed]
+        ring.decay_factor = self.rules.save_decay
+        self.events.append("check")
+
+    def step(self, inputs=NO_INPUTS, dt=1 / FPS, skater_inputs=None):
+        # Advance the game by one frame; dt only drives the shot clock.
+        # inputs control self.player, skater_inputs maps other skaters to theirs.
+        self.events = []
+        controls = [(self.player, inputs)]
+        for skater in self.skaters[1:]:
+            controls.append((skater, skater_inputs.get(skater, NO_INPUTS) if skater_inputs else NO_INPUTS))
+
+        for skater, skater_input in controls:
+            if skater_input.shoot:
+                self.shoot(skater, skater_input.aim)
+        pickups = [skater for skater, skater_input in controls if skater_input.pickup]
+        if pickups:
+            # Only skaters the grid finds in range can reach the ring (it
+            # still holds where the last step's contacts left everyone).
+            # Contested ring: the closest skater gets there first.
+            center = self.ring.rect.center
+            in_range = self.skaters_near(center, self.rules.pickup_range)
+            pickups = [skater for skater in pickups if skater in in_range]
+            if len(pickups) > 1:
+                pickups.sort(key=lambda s: (s.rect.centerx - center[0]) ** 2 + (s.rect.centery - center[1]) ** 2)
+        for skater in pickups:
+            self.toggle_pickup(skater)
+        profiler = self.profiler
+        if profiler:
+            profiler.mark("inputs")
+
+        self.update_shot_clock(dt)
+        if profiler:
+            profiler.mark("shot_clock")
+
+        move_skaters(controls)
+        if profiler:
+            profiler.mark("skaters")
+        self.resolve_contacts()
+        if profiler:
+            profiler.mark("contacts")
+        self.update_goalies()
+        if profiler:
+            profiler.mark("goalies")
+
+        # Update ring position if a skater has it
+        carrier = self.carrier
+        if carrier is not None and not self.ring.active:
+            self.ring.set_bottomright((carrier.rect.right + 10, carrier.rect.bottom))
+
+        hit = self.ring.update(self.collision_targets())
+        if hit is not None:
+            self.resolve_hit(hit)
+        if profiler:
+            profiler.mark("ring")
+        self.frame += 1
+        return self.events
@@ -0,0 +1,108 @@
+# Score, shot clock and instructions drawing. Text is only rendered again when
+# its value changes, and the instructions overlay is put together once and
+# reused, so a normal frame draws the HUD without allocating any surfaces.
+# Everything cached is converted to the display's pixel format, so the Hud
+# has to be created after the display mode is set. Positions and font sizes are
+# in rink units scaled by the View, so a resized window gets a new Hud.
+import pygame
+from assets import *
+
+INSTRUCTIONS = [
+    "HOW TO PLAY:",
+    "ARROW KEYS or WASD: Move",
+    "LEFT CLICK near ring: Pick up",
+    "LEFT CLICK while holding: Drop",
+    "SPACE: Shoot ring",
+    "AIM: Mouse position determines",
+    "     shooting direction",
+    "Get close to ring to pick it up",
+    "Score by shooting into goals",
+    "30 second shot clock!",
+    "F: Fast-forward (1x, 8x, max)",
+    "",
+    "Click anywhere to start!",
+    "Press ESC to show/hide instructions"
+]
+INSTRUCTION_LINE_HEIGHT = 16
+TEXT_CACHE_SIZE = 64  # Rendered strings kept per cache before it starts over
+
+
+class TextCache:
+    # Rendered text surfaces keyed by the string they show
+    def __init__(self, font, color):
+        self.font = font
+        self.color = color
+        self.surfaces = {}
+
+    def render(self, text):
+        surface = self.surfaces.get(text)
+        if surface is None:
+            if len(self.surfaces) >= TEXT_CACHE_SIZE:
+                self.surfaces.clear()
+            surface = self.font.render(text, True, self.color).convert_alpha()
+            self.surfaces[text] = surface
+        return surface
+
+
+class Hud:
+    def __init__(self, view):
+        self.view = view
+        self.width, self.height = view.size
+        # Create fonts
+        score_font = pygame.font.Font(None, view.length(36))
+        self.instructions_font = pygame.font.Font(None, view.length(16))  # Smaller font for instructions
+        self.score_text = TextCache(score_font, RINK_BLUE)
+        self.clock_text = TextCache(score_font, (255, 255, 255))
+
+        # Background for the shot clock
+        self.clock_background = pygame.Surface((view.length(100), view.length(40)), pygame.SRCALPHA).convert_alpha()
+        self.clock_background.fill((0, 0, 0, 128))  # Semi-transparent black
+        self.instructions_overlay = None  # Built the first time it is shown
+
+    def draw(self, screen, state, show_instructions):
+        # Draws the HUD and returns the areas it covered
+        rects = []
+        # Draw score
+        rects.append(screen.blit(self.score_text.render(f"Score: {state.score}"), self.view.to_screen((RINK_WIDTH - 160, 20))))
+
+        # Draw shot clock (always visible when not in instructions)
+        if not show_instructions:
+            rects.append(screen.blit(self.clock_background, self.view.to_screen((20, 20))))
+            rects.append(screen.blit(self.clock_text.render(f"{state.shot_clock}s"), self.view.to_screen((30, 25))))
+        else:
+            rects.append(screen.blit(self.get_instructions_overlay(), (0, 0)))
+        return rects
+
+    def get_instructions_overlay(self):
+        if self.instructions_overlay is None:
+            self.instructions_overlay = self.create_instructions_overlay()
+        return self.instructions_overlay
+
+    def create_instructions_overlay(self):
+        # A semi-transparent overlay with the instructions panel in the middle
+        overlay = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 128))  # Black with 50% opacity
+
+        # Calculate total height and width of instructions
+        line_height = self.view.length(INSTRUCTION_LINE_HEIGHT)
+        total_height = len(INSTRUCTIONS) * line_height
+        max_width = max(self.instructions_font.size(text)[0] for text in INSTRUCTIONS)
+        start_y = (self.height - total_height) // 2
+        start_x = (self.width - max_width) // 2
+
+        # Draw background rectangle for text
+        padding = self.view.length(20)
+        bg_rect = pygame.Rect(
+            start_x - padding,
+            start_y - padding,
+            max_width + padding * 2,
+            total_height + padding * 2
+        )
+        pygame.draw.rect(overlay, (0, 0, 0), bg_rect)  # Black background
+        pygame.draw.rect(overlay, (255, 255, 255), bg_rect, self.view.length(2))  # White border
+
+        for i, text in enumerate(INSTRUCTIONS):
+            instruction_text = self.instructions_font.render(text, True, (255, 255, 255))  # White text
+            text_rect = instruction_text.get_rect(centerx=self.width // 2, y=start_y + i * line_height)
+            overlay.blit(instruction_text, text_rect)
+        return overlay.convert_alpha()
@@ -1,80 +1,71 @@
 import pygame
 import sys
-import random
 import math
-import os
+import time
+import argparse
+import socket
 from assets import *
+from game import *
+from timestep import FixedTimestep, FramePacer
+from hud import Hud
+from atlas import load_atlas
+from view import View, LETTERBOX_COLOR
+from profiler import FrameProfiler, LatencyMeter, NullProfiler
+from particles import ParticleSystem
+from quality import LEVELS, QualityGovernor
+
+# Only redraw the areas touched by moving sprites and the HUD each frame instead
+# of repainting and flipping the whole rink (set to False for full redraws)
+DIRTY_RECT_RENDERING = True
+# Sprites that move further than this in one step were placed (goal, pickup,
+# shot clock reset) rather than skated, so they are not interpolated
+SNAP_DISTANCE = 40
+# Keys that play the game, counted by --latency
+PLAY_KEYS = {pygame.K_SPACE, pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN,
+             pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_s}
+
+def draw_rink(surface, scale=1):
+    # Markings are laid out in rink units and multiplied by scale, so the same
+    # rink can be drawn at any window size
+    def at(x, y):
+        return (round(x * scale), round(y * scale))
+
+    def size(value):
+        return round(value * scale)
+
+    def width(value):
+        return max(1, round(value * scale))
 
-# Initialize Pygame
-pygame.init()
-
-# Get the base path for assets
-def get_asset_path(filename):
-    # If we're running as a PyInstaller bundle
-    if getattr(sys, 'frozen', False):
-        base_path = sys._MEIPASS
-    else:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base_path, 'assets', filename)
-
-# Load Lynx logo
-try:
-    lynx_logo = pygame.image.load(get_asset_path('lynxlogo.svg'))
-    lynx_logo = pygame.transform.scale(lynx_logo, (PLAYER_WIDTH, PLAYER_HEIGHT))
-except Exception as e:
-    print(f"Warning: Could not load lynxlogo.svg: {str(e)}. Using default player shape.")
-    lynx_logo = None
-
-# Constants
-WIDTH, HEIGHT = RINK_WIDTH, RINK_HEIGHT
-FPS = 60
-PLAYER_SPEED = 5
-RING_SPEED = 5  # Reduced from 8 to make the ring move slower
-CIRCLE_RADIUS = 60
-DOT_RADIUS = 6
-DOT_OFFSET = CIRCLE_RADIUS // 2  # Halfway between center and edge
-PICKUP_RANGE = 70  # Range within which the player can pick up the ring
-SHOT_CLOCK_DURATION = 30  # 30 seconds shot clock
-
-# Set up the game window
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Ringette Game")
-clock = pygame.time.Clock()
-
-# Create fonts
-score_font = pygame.font.Font(None, 36)
-instructions_font = pygame.font.Font(None, 16)  # Smaller font for instructions
-
-def draw_rink(surface):
     # Draw ice surface
     surface.fill(ICE_WHITE)
     
     # Draw rink outline (thicker border)
-    pygame.draw.rect(surface, RINK_BLUE, (0, 0, WIDTH, HEIGHT), 15)
+    pygame.draw.rect(surface, RINK_BLUE, (0, 0, size(WIDTH), size(HEIGHT)), width(15))
     
     # Draw center line (vertical red line)
-    pygame.draw.line(surface, RED_LINE, (WIDTH // 2, 0), (WIDTH // 2, HEIGHT), 8)
+    pygame.draw.line(surface, RED_LINE, at(WIDTH // 2, 0), at(WIDTH // 2, HEIGHT), width(8))
     
     # Draw blue lines (ringette has two blue lines with specific width)
     blue_line_width = 10  # Thinner blue lines
     # Move blue lines closer to center (about 1/4 of the way from center)
     blue_line_1_x = WIDTH // 2 - 100  # 100 pixels left of center
     blue_line_2_x = WIDTH // 2 + 100  # 100 pixels right of center
-    pygame.draw.rect(surface, BLUE_LINE, (blue_line_1_x - blue_line_width//2, 0, blue_line_width, HEIGHT))
-    pygame.draw.rect(surface, BLUE_LINE, (blue_line_2_x - blue_line_width//2, 0, blue_line_width, HEIGHT))
+    pygame.draw.rect(surface, BLUE_LINE, (*at(blue_line_1_x - blue_line_width//2, 0), width(blue_line_width), size(HEIGHT)))
+    pygame.draw.rect(surface, BLUE_LINE, (*at(blue_line_2_x - blue_line_width//2, 0), width(blue_line_width), size(HEIGHT)))
     
     # Draw goal lines (vertical red lines - thinner)
-    pygame.draw.line(surface, RED_LINE, (GOAL_LINE_1_X, 0), (GOAL_LINE_1_X, HEIGHT), 3)
-    pygame.draw.line(surface, RED_LINE, (GOAL_LINE_2_X, 0), (GOAL_LINE_2_X, HEIGHT), 3)
+    pygame.draw.line(surface, RED_LINE, at(GOAL_LINE_1_X, 0), at(GOAL_LINE_1_X, HEIGHT), width(3))
+    pygame.draw.line(surface, RED_LINE, at(GOAL_LINE_2_X, 0), at(GOAL_LINE_2_X, HEIGHT), width(3))
     
     # Draw face-off circles (larger circles with dots)
-    circle_radius = CIRCLE_RADIUS
-    dot_radius = DOT_RADIUS
+    circle_radius = size(CIRCLE_RADIUS)
+    dot_radius = size(DOT_RADIUS)
+    line_width = width(2)
     
     # Center face-off circle
-    pygame.draw.circle(surface, BLUE_LINE, (WIDTH // 2, HEIGHT // 2), circle_radius, 2)
-    pygame.draw.circle(surface, BLUE_LINE, (WIDTH // 2 - DOT_OFFSET, HEIGHT // 2), dot_radius)  # Left dot
-    pygame.draw.circle(surface, BLUE_LINE, (WIDTH // 2 + DOT_OFFSET, HEIGHT // 2), dot_radius)  # Right dot
+    pygame.draw.circle(surface, BLUE_LINE, at(WIDTH // 2, HEIGHT // 2), circle_radius, line_width)
+    pygame.draw.circle(surface, BLUE_LINE, at(WIDTH // 2 - DOT_OFFSET, HEIGHT // 2), dot_radius)  # Left dot
+    pygame.draw.circle(surface, BLUE_LINE, at(WIDTH // 2 + DOT_OFFSET, HEIGHT // 2), dot_radius)  # Right dot
     
 
     # Face off circles
@@ -83,475 +74,458 @@ def draw_rink(surface):
     higher_face_off = HEIGHT // 4  
     lower_face_off = HEIGHT*3 // 4  
 
-    # Higher face-off circles
-    pygame.draw.circle(surface, BLUE_LINE, (right_face_off, higher_face_off), circle_radius, 2)
-    pygame.draw.circle(surface, BLUE_LINE, (right_face_off - DOT_OFFSET, higher_face_off), dot_radius)  # Left dot
-    pygame.draw.circle(surface, BLUE_LINE, (right_face_off + DOT_OFFSET, higher_face_off), dot_radius)  # Right dot
-    pygame.draw.circle(surface, BLUE_LINE, (left_face_off, higher_face_off), circle_radius, 2)
-    pygame.draw.circle(surface, BLUE_LINE, (left_face_off - DOT_OFFSET, higher_face_off), dot_radius)  # Left dot
-    pygame.draw.circle(surface, BLUE_LINE, (left_face_off + DOT_OFFSET, higher_face_off), dot_radius)  # Right dot
-    
-    # Add vertical lines through higher face-off circles
-    pygame.draw.line(surface, BLUE_LINE, 
-                    (right_face_off, higher_face_off - circle_radius),
-                    (right_face_off, higher_face_off + circle_radius), 2)
-    pygame.draw.line(surface, BLUE_LINE,
-                    (left_face_off, higher_face_off - circle_radius),
-                    (left_face_off, higher_face_off + circle_radius), 2)
-    
-    # Lower face-off circles
-    pygame.draw.circle(surface, BLUE_LINE, (right_face_off, lower_face_off), circle_radius, 2)
-    pygame.draw.circle(surface, BLUE_LINE, (right_face_off - DOT_OFFSET, lower_face_off), dot_radius)  # Left dot
-    pygame.draw.circle(surface, BLUE_LINE, (right_face_off + DOT_OFFSET, lower_face_off), dot_radius)  # Right dot
-    pygame.draw.circle(surface, BLUE_LINE, (left_face_off, lower_face_off), circle_radius, 2)
-    pygame.draw.circle(surface, BLUE_LINE, (left_face_off - DOT_OFFSET, lower_face_off), dot_radius)  # Left dot
-    pygame.draw.circle(surface, BLUE_LINE, (left_face_off + DOT_OFFSET, lower_face_off), dot_radius)  # Right dot
-    
-    # Add vertical lines through lower face-off circles
-    pygame.draw.line(surface, BLUE_LINE,
-                    (right_face_off, lower_face_off - circle_radius),
-                    (right_face_off, lower_face_off + circle_radius), 2)
-    pygame.draw.line(surface, BLUE_LINE,
-                    (left_face_off, lower_face_off - circle_radius),
-                    (left_face_off, lower_face_off + circle_radius), 2)
+    for face_off_y in (higher_face_off, lower_face_off):
+        for face_off_x in (right_face_off, left_face_off):
+            pygame.draw.circle(surface, BLUE_LINE, at(face_off_x, face_off_y), circle_radius, line_width)
+            pygame.draw.circle(surface, BLUE_LINE, at(face_off_x - DOT_OFFSET, face_off_y), dot_radius)  # Left dot
+            pygame.draw.circle(surface, BLUE_LINE, at(face_off_x + DOT_OFFSET, face_off_y), dot_radius)  # Right dot
+        # Add vertical lines through the face-off circles
+        for face_off_x in (right_face_off, left_face_off):
+            pygame.draw.line(surface, BLUE_LINE,
+                            at(face_off_x, face_off_y - CIRCLE_RADIUS),
+                            at(face_off_x, face_off_y + CIRCLE_RADIUS), line_width)
 
 
     # Draw goal creases (proper semi-circles with specific radius)
     crease_radius = 60  # Decreased from 80
+    crease_size = (size(crease_radius*2), size(crease_radius*2))
     # Left goal crease (facing towards goal)
     pygame.draw.arc(surface, BLUE_LINE, 
-                   (GOAL_LINE_1_X - crease_radius, HEIGHT//2 - crease_radius, 
-                    crease_radius*2, crease_radius*2), 
-                   -math.pi/2, math.pi/2, 3)
+                   (at(GOAL_LINE_1_X - crease_radius, HEIGHT//2 - crease_radius), crease_size), 
+                   -math.pi/2, math.pi/2, width(3))
     # Right goal crease (facing towards goal)
     pygame.draw.arc(surface, BLUE_LINE, 
-                   (GOAL_LINE_2_X - crease_radius, HEIGHT//2 - crease_radius, 
-                    crease_radius*2, crease_radius*2), 
-                   math.pi/2, 3*math.pi/2, 3)
+                   (at(GOAL_LINE_2_X - crease_radius, HEIGHT//2 - crease_radius), crease_size), 
+                   math.pi/2, 3*math.pi/2, width(3))
     
     # Draw free play lines (ringette specific, closer to goal)
     free_play_distance = 150  # Standard ringette free play line distance
     pygame.draw.line(surface, RED_LINE, 
-                    (GOAL_LINE_1_X + free_play_distance, 0), 
-                    (GOAL_LINE_1_X + free_play_distance, HEIGHT), 3)
+                    at(GOAL_LINE_1_X + free_play_distance, 0), 
+                    at(GOAL_LINE_1_X + free_play_distance, HEIGHT), width(3))
     pygame.draw.line(surface, RED_LINE, 
-                    (GOAL_LINE_2_X - free_play_distance, 0), 
-                    (GOAL_LINE_2_X - free_play_distance, HEIGHT), 3)
-
-# Load sprites
-def create_ring_sprite():
-    surface = pygame.Surface((20, 20), pygame.SRCALPHA)
-    # Draw a blue ring
-    pygame.draw.circle(surface, RING_COLOR, (10, 10), 10)
-    pygame.draw.circle(surface, ICE_WHITE, (10, 10), 5)
-    return surface
-
-def create_goalie_sprite():
-    surface = pygame.Surface((20, 40), pygame.SRCALPHA)
-    
-    # Body (red jersey)
-    pygame.draw.rect(surface, (220, 20, 20), (5, 10, 10, 20))  # Torso
-    
-    # Head
-    pygame.draw.circle(surface, (255, 218, 185), (10, 7), 5)  # Flesh color
-    
-    # Arms (holding stick)
-    pygame.draw.line(surface, (220, 20, 20), (5, 15), (3, 25), 3)   # Left arm
-    pygame.draw.line(surface, (220, 20, 20), (15, 15), (17, 25), 3) # Right arm
-    
-    # Hands (holding stick)
-    pygame.draw.circle(surface, (255, 218, 185), (3, 25), 2)  # Left hand
-    pygame.draw.circle(surface, (255, 218, 185), (17, 25), 2)  # Right hand
-    
-    # Legs (slightly spread)
-    pygame.draw.line(surface, (0, 0, 0), (7, 30), (7, 38), 3)  # Left leg
-    pygame.draw.line(surface, (0, 0, 0), (13, 30), (13, 38), 3)  # Right leg
-    
-    # Goalie stick (held horizontally)
-    pygame.draw.line(surface, (139, 69, 19), (3, 25), (17, 25), 3)  # Brown stick
-    
-    return surface
-
-# Load all sprites
-ring_sprite = create_ring_sprite()
-goalie_sprite = create_goalie_sprite()
-
-class Player(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        if lynx_logo:
-            self.image = lynx_logo
-        else:
-            # Create a simple player shape for now
-            self.image = pygame.Surface((PLAYER_WIDTH, PLAYER_HEIGHT), pygame.SRCALPHA)
-            # Draw a simple player shape
-            pygame.draw.ellipse(self.image, PLAYER_COLOR, (0, 0, PLAYER_WIDTH, PLAYER_HEIGHT))
-            # Add a stick
-            pygame.draw.line(self.image, (139, 69, 19), 
-                            (PLAYER_WIDTH//2, PLAYER_HEIGHT//2),
-                            (PLAYER_WIDTH, PLAYER_HEIGHT//2), 3)
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.has_ring = False
-        self.direction = [1, 0]  # Default direction to right
-
-    def update(self, keys=None):
-        if keys:
-            # Arrow keys and WASD movement
-            if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-                self.rect.x -= PLAYER_SPEED
-                self.direction = [-1, 0]
-            if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-                self.rect.x += PLAYER_SPEED
-                self.direction = [1, 0]
-            if keys[pygame.K_UP] or keys[pygame.K_w]:
-                self.rect.y -= PLAYER_SPEED
-                self.direction = [0, -1]
-            if keys[pygame.K_DOWN] or keys[pygame.K_s]:
-                self.rect.y += PLAYER_SPEED
-                self.direction = [0, 1]
-
-        # Keep player on screen
-        self.rect.clamp_ip(screen.get_rect())
-
-    def get_shoot_direction(self):
-        # Get mouse position
-        mouse_x, mouse_y = pygame.mouse.get_pos()
-        # Calculate direction vector from ring to mouse (using ring's position)
-        ring_x = self.rect.right + 10  # Ring's x position (offset from player)
-        ring_y = self.rect.bottom      # Ring's y position
-        dx = mouse_x - ring_x
-        dy = mouse_y - ring_y
-        # Normalize the vector
-        length = math.sqrt(dx * dx + dy * dy)
-        if length > 0:
-            return [dx / length, dy / length]
-        return [1, 0]  # Default to right if mouse is on ring
-
-class Ring(pygame.sprite.Sprite):
-    def __init__(self):
+                    at(GOAL_LINE_2_X - free_play_distance, 0), 
+                    at(GOAL_LINE_2_X - free_play_distance, HEIGHT), width(3))
+
+# The rink never changes during a game, so it is drawn once into a cached
+# background surface at the window's size and only rebuilt when the window is
+# resized or the colours change. Nothing is scaled while frames are drawn.
+rink_background_cache = {}
+
+def get_rink_background(view):
+    key = (view.size, ICE_WHITE, RINK_BLUE, RED_LINE, BLUE_LINE)
+    background = rink_background_cache.get(key)
+    if background is None:
+        rink_background_cache.clear()
+        background = pygame.Surface(view.size).convert()
+        background.fill(LETTERBOX_COLOR)
+        draw_rink(background.subsurface((view.offset, view.rink_size)), view.scale)
+        rink_background_cache[key] = background
+    return background
+
+class EntitySprite(pygame.sprite.Sprite):
+    # Draws a game.py entity between its last two simulated positions, with
+    # the atlas sprite called name scaled for the view
+    def __init__(self, entity, name, view, sprites):
         super().__init__()
-        self.image = ring_sprite
+        self.entity = entity
+        self.name = name
+        self.previous = entity.rect.topleft
+        self.set_view(view, sprites)
+
+    def set_view(self, view, sprites):
+        self.view = view
+        self.image = sprites[self.name]
         self.rect = self.image.get_rect()
-        self.velocity = [0, 0]
-        self.active = False
-        self.decay_factor = 0.99  # General decay factor for all ring movements
-        # Start on the left center dot
-        self.rect.center = (WIDTH // 2 - DOT_OFFSET, HEIGHT // 2)
-
-    def update(self):
-        if self.active:
-            # Apply velocity decay to all active ring movements
-            self.velocity[0] *= self.decay_factor
-            self.velocity[1] *= self.decay_factor
-            # Stop very slow movement to prevent endless sliding
-            if abs(self.velocity[0]) < 0.1 and abs(self.velocity[1]) < 0.1:
-                self.velocity = [0, 0]
-
-            self.rect.x += self.velocity[0]
-            self.rect.y += self.velocity[1]
-
-            # Bounce off walls
-            if self.rect.left < 0 or self.rect.right > WIDTH:
-                self.velocity[0] *= -1
-            if self.rect.top < 0 or self.rect.bottom > HEIGHT:
-                self.velocity[1] *= -1
-
-class Goal(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        self.image = pygame.Surface((20, 100), pygame.SRCALPHA)
-        pygame.draw.rect(self.image, RINK_BLUE, (0, 0, 20, 100))
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
+        self.update(1)
 
-class Goalie(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        self.image = goalie_sprite
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.speed = 1  # Reduced from 4 to make goalie movement slower
-        self.direction = 1  # 1 for down, -1 for up
-        self.goal_top = HEIGHT // 2 - 50  # Top of the goal
-        self.goal_bottom = HEIGHT // 2 + 50  # Bottom of the goal
-        self.has_ring = False  # Track if goalie is holding the ring
-        self.hold_time = 0  # Track how long goalie has held the ring
-        self.throw_direction = [0, 0]  # Direction to throw the ring
-        self.throw_cooldown = 0  # Cooldown after throwing before can catch again
-
-    def update(self):
-        # Only move if not holding the ring
-        if not self.has_ring:
-            # Move up and down within goal area
-            self.rect.y += self.speed * self.direction
-            
-            # Change direction at goal boundaries
-            if self.rect.top <= self.goal_top:
-                self.direction = 1
-            elif self.rect.bottom >= self.goal_bottom:
-                self.direction = -1
-
-            # Update throw cooldown
-            if self.throw_cooldown > 0:
-                self.throw_cooldown -= 1
-
-        # Update ring position if goalie has it
-        if self.has_ring:
-            self.hold_time += 1
-            if self.hold_time >= 180:  # 3 seconds at 60 FPS
-                self.has_ring = False
-                self.throw_cooldown = 120  # 2 second cooldown (60 FPS * 2)
-                return self.throw_direction  # Return direction to throw the ring
-        return None
-
-    def can_catch(self):
-        return not self.has_ring and self.throw_cooldown == 0
-
-# Create game objects
-player = Player(WIDTH // 2 - 100, HEIGHT // 2)  # Start on left blue line
-ring = Ring()
-# Create two goals
-goal1 = Goal(GOAL_LINE_1_X - 20, HEIGHT // 2 - 50)  # Move goal1 to the left side of its goal line
-goal2 = Goal(GOAL_LINE_2_X, HEIGHT // 2 - 50)  # Move goal2 to the right side of its goal line
-# Create goalies
-goalie1 = Goalie(GOAL_LINE_1_X + 30, HEIGHT // 2 - 30)  # Left goalie, moved 30px in front of goal line
-goalie2 = Goalie(GOAL_LINE_2_X - 30, HEIGHT // 2 - 30)  # Right goalie, moved 30px in front of goal line
-
-# Create sprite groups
-all_sprites = pygame.sprite.Group()
-# Add ring first so it's drawn underneath
-all_sprites.add(ring)
-# Then add player so it's drawn on top
-all_sprites.add(player)
-# Add goals and goalies
-all_sprites.add(goal1)
-all_sprites.add(goal2)
-all_sprites.add(goalie1)
-all_sprites.add(goalie2)
-
-# Game variables
-score = 0
-show_instructions = True  # New variable to track if instructions should be shown
-shot_clock = SHOT_CLOCK_DURATION  # Initialize shot clock
-last_time = pygame.time.get_ticks()  # Track time for shot clock
-ring_picked_up_since_goal = False  # Track if ring has been picked up since last goal
-
-# Game loop
-running = True
-while running:
-    # Event handling
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE and player.has_ring:
-                player.has_ring = False
-                ring.active = True
-                # Position ring at bottom right of player with offset
-                ring.rect.bottomright = (player.rect.right + 10, player.rect.bottom)
-                # Get direction from player to mouse
-                direction = player.get_shoot_direction()
-                ring.velocity = [direction[0] * RING_SPEED, 
-                               direction[1] * RING_SPEED]
-                ring.decay_factor = 0.99  # Reset decay factor for player shots
-                shot_clock = SHOT_CLOCK_DURATION  # Reset shot clock when shooting
-            elif event.key == pygame.K_ESCAPE:  # Toggle instructions with Escape key
-                show_instructions = not show_instructions
-        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:  # Left mouse button
-            if show_instructions:
-                show_instructions = False  # Clear instructions on first click
-            else:
-                # Calculate distance between player and ring
-                dx = ring.rect.centerx - player.rect.centerx
-                dy = ring.rect.centery - player.rect.centery
-                distance = math.sqrt(dx * dx + dy * dy)
-                
-                # Toggle pickup if within range
-                if distance <= PICKUP_RANGE:
-                    player.has_ring = not player.has_ring  # Toggle pickup state
-                    if player.has_ring:
-                        # Position ring at bottom right of player with offset
-                        ring.rect.bottomright = (player.rect.right + 10, player.rect.bottom)
-                        ring.active = False  # Stop the ring from moving
-                        ring.velocity = [0, 0]  # Reset velocity
-                        ring_picked_up_since_goal = True  # Mark that ring has been picked up
-
-    # Update shot clock
-    current_time = pygame.time.get_ticks()
-    if current_time - last_time >= 1000:  # Every second
-        if not show_instructions and ring_picked_up_since_goal:  # Only count down after first pickup
-            shot_clock -= 1
-            if shot_clock <= 0:
-                # Time's up! Reset ring to center
-                player.has_ring = False
-                ring.active = False
-                ring.velocity = [0, 0]
-                ring.rect.center = (WIDTH // 2 - DOT_OFFSET, HEIGHT // 2)  # Reset to left center dot
-                shot_clock = SHOT_CLOCK_DURATION  # Reset shot clock
-                ring_picked_up_since_goal = False  # Reset pickup flag
-        last_time = current_time
+    def remember(self):
+        # Call before each simulation step
+        self.previous = self.entity.rect.topleft
 
-    # Get keys
-    keys = pygame.key.get_pressed()
+    def update(self, alpha):
+        x, y = self.entity.rect.topleft
+        previous_x, previous_y = self.previous
+        if abs(x - previous_x) + abs(y - previous_y) > SNAP_DISTANCE:
+            self.rect.topleft = self.view.to_screen((x, y))
+        else:
+            self.rect.topleft = self.view.to_screen((previous_x + (x - previous_x) * alpha,
+                                                     previous_y + (y - previous_y) * alpha))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ringette Game")
+    parser.add_argument("--size", default=f"{WIDTH}x{HEIGHT}", help="window size as WIDTHxHEIGHT")
+    parser.add_argument("--fullscreen", action="store_true", help="fill the screen at its own resolution")
+    parser.add_argument("--fps", type=int, default=FPS, help="frames drawn per second")
+    parser.add_argument("--speed", default="1", help="game speed multiplier, or 'max' for uncapped")
+    parser.add_argument("--skaters", type=int, default=1, help="skaters on your team")
+    parser.add_argument("--opponents", type=int, default=0, help="skaters on the other team")
+    parser.add_argument("--ai", action="store_true", help="computer-controlled teammates, opponents and goalies")
+    parser.add_argument("--record", metavar="FILE", help="record the game to a replay file")
+    parser.add_argument("--replay", metavar="FILE", help="watch a recorded game instead of playing")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="join a game hosted with python net.py serve")
+    parser.add_argument("--lag", type=float, default=0.0, help="with --connect, seconds to hold back every packet sent")
+    parser.add_argument("--loss", type=float, default=0.0, help="with --connect, fraction of packets sent to drop")
+    parser.add_argument("--broadcast", metavar="PORT", type=int, nargs="?", const=8765,
+                        help="let spectators watch in a browser at http://<this machine>:PORT/")
+    parser.add_argument("--match-log", metavar="DIR", help="log every shot, pickup, check, save and goal for analysis.py")
+    parser.add_argument("--seek", type=float, default=0, help="start the replay this many seconds in")
+    parser.add_argument("--no-effects", action="store_true", help="turn off ice spray, ring trails and bursts")
+    parser.add_argument("--quality", default="auto", choices=["auto"] + [str(level) for level in range(len(LEVELS))],
+                        help="'auto' gives up effects, HUD redraws and then frames when the machine can't keep up; "
+                             "a number fixes the level (0 is full quality)")
+    parser.add_argument("--frames", type=int, default=0, help="quit after drawing this many frames (benchmarks)")
+    parser.add_argument("--profile", action="store_true", help="time each phase of the frame (F3 shows the graph)")
+    parser.add_argument("--profile-out", metavar="FILE",
+                        help="write the frame timings on exit (.csv, .json or .trace.json for Chrome)")
+    parser.add_argument("--latency", action="store_true", help="measure input-to-screen latency and report it on exit")
+    parser.add_argument("--low-latency", action="store_true",
+                        help="read input as late as possible before each frame and draw the newest step")
+    parser.add_argument("--vsync", action="store_true", help="wait for the display's refresh when presenting")
+    args = parser.parse_args(argv)
+
+    # Initialize only what the game uses; audio and joysticks are never opened
+    pygame.display.init()
+    pygame.font.init()
+
+    # Set up the game window. The game plays out in rink units and the View
+    # scales them to whatever size the window is.
+    if args.fullscreen:
+        size, flags = (0, 0), pygame.FULLSCREEN
+    else:
+        window_width, _, window_height = args.size.lower().partition("x")
+        size, flags = (int(window_width), int(window_height)), pygame.RESIZABLE
+    screen = None
+    if args.vsync:
+        # SDL only syncs through its scaled renderer, which stretches this
+        # size to the window from then on instead of resizing the rink
+        if args.fullscreen:
+            size = pygame.display.get_desktop_sizes()[0]
+        try:
+            screen = pygame.display.set_mode(size, flags | pygame.SCALED, vsync=1)
+        except pygame.error as error:
+            print(f"Running without vsync: {error}")
+    if screen is None:
+        screen = pygame.display.set_mode(size, flags)
+    pygame.display.set_caption("Ringette Game")
+    clock = pygame.time.Clock()
+    view = View(screen.get_size())
+
+    # Score, shot clock and instructions, with their text cached
+    hud = Hud(view)
+
+    # Every sprite, from one atlas in the display's pixel format
+    sprites = load_atlas(view.scale)
+
+    # Create game objects
+    playback = None
+    recorder = None
+    ai = None
+    client = None
+    if args.connect:
+        from net import NetClient, parse_address  # The server runs the rules; this draws its snapshots
+
+        client = NetClient(parse_address(args.connect), args.lag, args.loss)
+        try:
+            state = client.join()
+        except (ConnectionError, OSError) as error:
+            parser.error(str(error))
+    elif args.replay:
+        from replay import Replay, Playback  # Only loaded when recording or replaying
+
+        replay = Replay(args.replay)
+        playback = Playback(replay, replay.frame_at(args.seek))
+        state = playback.state
+    else:
+        state = GameState(roster=(args.skaters, args.opponents))
+        if args.ai:
+            from ai import AI, load_tables
+
+            tables = load_tables()
+            if tables is None:
+                parser.error("the AI tables are missing; build them with python ai.py")
+            ai = AI(tables, state.rules)
+            state.goalie_ai = ai
+        if args.record:
+            from replay import ReplayRecorder
+
+            recorder = ReplayRecorder(args.record, state)
+
+    hub = None
+    if args.broadcast:
+        from broadcast import BroadcastHub  # Only loaded when broadcasting
+
+        hub = BroadcastHub(state, port=args.broadcast)
+        try:
+            hub.start()
+        except OSError as error:
+            parser.error(f"can't broadcast on port {args.broadcast}: {error}")
+        print(f"Broadcasting at http://{socket.gethostname()}:{args.broadcast}/")
+
+    match_log = None
+    if args.match_log:
+        if client is not None:
+            parser.error("--match-log only works for games whose rules run on this machine, not with --connect")
+        from matchlog import MatchLog, new_log_path  # Only loaded when logging
+
+        match_log = MatchLog(new_log_path(args.match_log), state)
+
+    # Create sprite groups (RenderUpdates reports the areas it drew over)
+    all_sprites = pygame.sprite.RenderUpdates()
+    # Add ring first so it's drawn underneath
+    all_sprites.add(EntitySprite(state.ring, "ring", view, sprites))
+    # Then add skaters so they're drawn on top
+    for skater in state.skaters:
+        all_sprites.add(EntitySprite(skater, "player" if skater.team == 0 else "opponent", view, sprites))
+    # Add goals and goalies
+    all_sprites.add(EntitySprite(state.goal1, "goal", view, sprites))
+    all_sprites.add(EntitySprite(state.goal2, "goal", view, sprites))
+    all_sprites.add(EntitySprite(state.goalie1, "goalie", view, sprites))
+    all_sprites.add(EntitySprite(state.goalie2, "goalie", view, sprites))
+
+    # Ice spray, ring trails and bursts
+    particles = None
+    if not args.no_effects:
+        particles = ParticleSystem()
+        particles.set_view(view)
+
+    # Game variables
+    show_instructions = playback is None  # New variable to track if instructions should be shown
+    timestep = FixedTimestep(None if args.speed == "max" else float(args.speed))
+    if client is not None:
+        timestep = FixedTimestep()  # The server keeps the time
+    last_time = time.perf_counter()
+    shoot = False  # SPACE and clicks wait here until a simulation step uses them
+    pickup = False
+    hud_rects = []  # Areas covered by the HUD when it was last drawn
+    overlay_rects = []  # Areas covered by the profiler graph and quality indicator last frame
+    sprite_rects = []  # Areas the sprites were cleared from and drawn over last frame
+    full_redraw = True  # Repaint the whole screen on the next frame
+    profiler = NullProfiler()
+    if args.profile or args.profile_out:
+        profiler = FrameProfiler()
+        profiler.visible = args.profile
+        state.profiler = profiler
+
+    # Quality levels, adjusted to the machine unless one is given
+    governor = QualityGovernor(args.fps, 0 if args.quality == "auto" else int(args.quality), args.quality == "auto")
+
+    # Input latency
+    meter = LatencyMeter() if args.latency else None
+    pacer = None
+    if args.low_latency:
+        pacer = FramePacer(governor.frame_rate, args.vsync)
+        # Keep the events nobody reads out of the queue; the keyboard and
+        # mouse state that get_pressed() and get_pos() read still updates
+        pygame.event.set_blocked([pygame.MOUSEMOTION, pygame.MOUSEBUTTONUP, pygame.MOUSEWHEEL, pygame.KEYUP,
+                                  pygame.TEXTINPUT, pygame.TEXTEDITING, pygame.FINGERDOWN, pygame.FINGERUP,
+                                  pygame.FINGERMOTION])
+
+    def run_step(inputs):
+        if meter is not None:
+            meter.step()
+        for sprite in all_sprites:
+            sprite.remember()
+        # Every skater but yours is either AI controlled or left standing
+        skater_inputs = ai.skater_inputs(state) if ai is not None else None
+        if playback is not None:
+            # Recorded inputs replace the keyboard and mouse
+            if not playback.done:
+                playback.step()
+        elif client is not None:
+            client.step(inputs)
+        elif recorder is not None:
+            recorder.step(inputs, timestep.step, skater_inputs)
+        else:
+            state.step(inputs, timestep.step, skater_inputs)
+        if hub is not None:
+            hub.publish(state)
+        if match_log is not None:
+            match_log.step(state)
+        if particles is not None:
+            particles.emit(state)
+        # SPACE and clicks only count for one step
+        inputs.shoot = inputs.pickup = False
+
+    # Game loop
+    running = True
+    frames_drawn = 0
+    while running:
+        profiler.begin_frame()
+        if pacer is not None:
+            pacer.wait()
+            profiler.mark("tick")
+        frame_started = time.perf_counter()
+        # Event handling
+        presses = 0  # Key presses and clicks, for the latency meter
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.VIDEORESIZE:
+                # Scale everything once for the new size, not every frame
+                screen = pygame.display.get_surface()
+                view = View(screen.get_size())
+                sprites = load_atlas(view.scale)
+                for sprite in all_sprites:
+                    sprite.set_view(view, sprites)
+                hud = Hud(view)
+                if particles is not None:
+                    particles.set_view(view)
+                hud_rects = []
+                overlay_rects = []
+                sprite_rects = []
+                full_redraw = True
+            elif event.type == pygame.KEYDOWN:
+                presses += event.key in PLAY_KEYS
+                if event.key == pygame.K_SPACE:
+                    shoot = True
+                elif event.key == pygame.K_ESCAPE:  # Toggle instructions with Escape key
+                    show_instructions = not show_instructions
+                elif event.key == pygame.K_f and client is None:  # Cycle fast-forward speeds
+                    speed = timestep.next_speed()
+                    pygame.display.set_caption("Ringette Game" if speed == 1 else
+                                               f"Ringette Game ({'max' if speed is None else f'{speed}x'})")
+                elif event.key == pygame.K_F3:  # Frame time graph, profiling from now on
+                    if not profiler.enabled:
+                        profiler = FrameProfiler()
+                        state.profiler = profiler
+                    profiler.toggle()
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:  # Left mouse button
+                presses += 1
+                if show_instructions:
+                    show_instructions = False  # Clear instructions on first click
+                else:
+                    pickup = True
+
+        # Get keys (arrow keys and WASD movement)
+        keys = pygame.key.get_pressed()
+        inputs = Inputs(
+            left=keys[pygame.K_LEFT] or keys[pygame.K_a],
+            right=keys[pygame.K_RIGHT] or keys[pygame.K_d],
+            up=keys[pygame.K_UP] or keys[pygame.K_w],
+            down=keys[pygame.K_DOWN] or keys[pygame.K_s],
+            shoot=shoot,
+            pickup=pickup,
+            aim=view.to_rink(pygame.mouse.get_pos()),
+        )
+        if meter is not None:
+            meter.polled(time.perf_counter(), presses)
+        profiler.mark("events")
 
-    # Update
-    player.update(keys)
-    
-    # Update goalies and check for throws
-    throw_direction = goalie1.update()
-    if throw_direction:
-        ring.active = True
-        # Position ring slightly in front of goalie (to the right)
-        ring.rect.center = (goalie1.rect.centerx + 20, goalie1.rect.centery)
-        ring.velocity = [throw_direction[0] * RING_SPEED * 0.5, throw_direction[1] * RING_SPEED * 0.5]  # Half speed for goalie throws
-        ring.decay_factor = 0.98  # Faster decay for goalie throws
-        goalie1.hold_time = 0
-        shot_clock = SHOT_CLOCK_DURATION  # Reset shot clock on throw
-    
-    throw_direction = goalie2.update()
-    if throw_direction:
-        ring.active = True
-        # Position ring slightly in front of goalie (to the left)
-        ring.rect.center = (goalie2.rect.centerx - 20, goalie2.rect.centery)
-        ring.velocity = [throw_direction[0] * RING_SPEED * 0.5, throw_direction[1] * RING_SPEED * 0.5]  # Half speed for goalie throws
-        ring.decay_factor = 0.98  # Faster decay for goalie throws
-        goalie2.hold_time = 0
-        shot_clock = SHOT_CLOCK_DURATION  # Reset shot clock on throw
-    
-    # Update ring position if player has it
-    if player.has_ring and not ring.active:
-        ring.rect.bottomright = (player.rect.right + 10, player.rect.bottom)
-    
-    ring.update()
-
-    # Check for goals and goalie blocks
-    if ring.active:
-        # Check for goalie blocks first
-        if pygame.sprite.collide_rect(ring, goalie1) and goalie1.can_catch():
-            if random.random() < 0.7:  # 70% chance to catch (30% chance to bounce)
-                # Goalie catches the ring
-                ring.active = False
-                goalie1.has_ring = True
-                goalie1.hold_time = 0  # Reset hold time
-                # Calculate throw direction (away from net)
-                goalie1.throw_direction = [1, random.uniform(-1, 1)]  # Left goalie throws right (away from net)
-                ring.rect.center = goalie1.rect.center  # Position ring on goalie
-            else:
-                # Normal bounce
-                ring.velocity[0] *= -1  # Reverse x velocity
-                ring.velocity[1] *= -1  # Reverse y velocity
-                # Add some randomness to the bounce
-                ring.velocity[0] += random.uniform(-1, 1)
-                ring.velocity[1] += random.uniform(-1, 1)
-                ring.decay_factor = 0.98  # Set decay factor for goalie saves
-            shot_clock = SHOT_CLOCK_DURATION  # Reset shot clock when ring hits goalie
-        elif pygame.sprite.collide_rect(ring, goalie2) and goalie2.can_catch():
-            if random.random() < 0.7:  # 70% chance to catch (30% chance to bounce)
-                # Goalie catches the ring
-                ring.active = False
-                goalie2.has_ring = True
-                goalie2.hold_time = 0  # Reset hold time
-                # Calculate throw direction (away from net)
-                goalie2.throw_direction = [-1, random.uniform(-1, 1)]  # Right goalie throws left (away from net)
-                ring.rect.center = goalie2.rect.center  # Position ring on goalie
+        # Update in fixed steps of game time
+        current_time = time.perf_counter()
+        frame_time = current_time - last_time
+        last_time = current_time
+        state.shot_clock_running = not show_instructions
+        if timestep.uncapped:
+            # Fast-forward as far as this frame's time budget allows
+            deadline = current_time + 1 / args.fps
+            run_step(inputs)
+            while time.perf_counter() < deadline:
+                run_step(inputs)
+        else:
+            for _ in range(timestep.advance(frame_time)):
+                run_step(inputs)
+        # Keep SPACE and clicks for the next frame if no step ran
+        shoot, pickup = inputs.shoot, inputs.pickup
+        # Low-latency mode draws the newest step rather than interpolating up to a step behind it
+        alpha = 1.0 if pacer is not None else timestep.alpha
+        all_sprites.update(alpha)
+        profiler.mark("interpolate")
+        if particles is not None:
+            particles.detail = governor.effects
+            particles.update()
+            profiler.mark("particles")
+        draw_hud = (full_redraw or show_instructions or not DIRTY_RECT_RENDERING
+                    or frames_drawn % governor.hud_interval == 0)
+        if not draw_hud:
+            # Restoring the rink under sprites or particles that covered the
+            # HUD last frame would leave a hole in it, so redraw it too
+            covered = sprite_rects + particles.rects if particles is not None else sprite_rects
+            draw_hud = any(rect.collidelist(covered) != -1 for rect in hud_rects)
+        restored = overlay_rects + hud_rects if draw_hud else overlay_rects
+
+        # Draw
+        dirty_rects = list(restored)
+        if DIRTY_RECT_RENDERING:
+            background = get_rink_background(view)
+            if full_redraw or show_instructions:
+                screen.blit(background, (0, 0))
             else:
-                # Normal bounce
-                ring.velocity[0] *= -1  # Reverse x velocity
-                ring.velocity[1] *= -1  # Reverse y velocity
-                # Add some randomness to the bounce
-                ring.velocity[0] += random.uniform(-1, 1)
-                ring.velocity[1] += random.uniform(-1, 1)
-                ring.decay_factor = 0.98  # Set decay factor for goalie saves
-            shot_clock = SHOT_CLOCK_DURATION  # Reset shot clock when ring hits goalie
-        elif pygame.sprite.collide_rect(ring, goal1):
-            score += 1
-            ring.active = False
-            # Place ring on left team's center dot (they got scored on)
-            ring.rect.center = (WIDTH // 2 - DOT_OFFSET, HEIGHT // 2)
-            ring.velocity = [0, 0]
-            shot_clock = SHOT_CLOCK_DURATION  # Reset shot clock on goal
-            ring_picked_up_since_goal = False  # Reset pickup flag after goal
-        elif pygame.sprite.collide_rect(ring, goal2):
-            score += 1
-            ring.active = False
-            # Place ring on right team's center dot (they got scored on)
-            ring.rect.center = (WIDTH // 2 + DOT_OFFSET, HEIGHT // 2)
-            ring.velocity = [0, 0]
-            shot_clock = SHOT_CLOCK_DURATION  # Reset shot clock on goal
-            ring_picked_up_since_goal = False  # Reset pickup flag after goal
-
-    # Draw
-    draw_rink(screen)
-    all_sprites.draw(screen)
-    
-    # Draw score
-    score_text = score_font.render(f"Score: {score}", True, RINK_BLUE)
-    screen.blit(score_text, (WIDTH - 160, 20))
-
-    # Draw shot clock (always visible when not in instructions)
-    if not show_instructions:
-        # Create a background for the shot clock
-        clock_bg = pygame.Surface((100, 40), pygame.SRCALPHA)
-        clock_bg.fill((0, 0, 0, 128))  # Semi-transparent black
-        screen.blit(clock_bg, (20, 20))
-        
-        # Draw the shot clock text
-        clock_text = score_font.render(f"{shot_clock}s", True, (255, 255, 255))
-        screen.blit(clock_text, (30, 25))
-
-    # Draw instructions popup if needed
-    if show_instructions:
-        # Create a semi-transparent overlay
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 128))  # Black with 50% opacity
-        screen.blit(overlay, (0, 0))
-        
-        # Instructions text
-        instructions = [
-            "HOW TO PLAY:",
-            "ARROW KEYS or WASD: Move",
-            "LEFT CLICK near ring: Pick up",
-            "LEFT CLICK while holding: Drop",
-            "SPACE: Shoot ring",
-            "AIM: Mouse position determines",
-            "     shooting direction",
-            "Get close to ring to pick it up",
-            "Score by shooting into goals",
-            "30 second shot clock!",
-            "",
-            "Click anywhere to start!",
-            "Press ESC to show/hide instructions"
-        ]
-        
-        # Calculate total height and width of instructions
-        total_height = len(instructions) * 16
-        max_width = max(instructions_font.size(text)[0] for text in instructions)
-        start_y = (HEIGHT - total_height) // 2
-        start_x = (WIDTH - max_width) // 2
-        
-        # Draw background rectangle for text
-        padding = 20
-        bg_rect = pygame.Rect(
-            start_x - padding,
-            start_y - padding,
-            max_width + padding * 2,
-            total_height + padding * 2
-        )
-        pygame.draw.rect(screen, (0, 0, 0), bg_rect)  # Black background
-        pygame.draw.rect(screen, (255, 255, 255), bg_rect, 2)  # White border
-        
-        for i, text in enumerate(instructions):
-            instruction_text = instructions_font.render(text, True, (255, 255, 255))  # White text
-            text_rect = instruction_text.get_rect(centerx=WIDTH//2, y=start_y + i * 16)
-            screen.blit(instruction_text, text_rect)
-
-    # Update display
-    pygame.display.flip()
-    clock.tick(FPS)
-
-pygame.quit()
-sys.exit() 
\ No newline at end of file
+                # Restore the rink under last frame's sprites and HUD
+                all_sprites.clear(screen, background)
+                for rect in restored:
+                    screen.blit(background, rect, rect)
+                if particles is not None:
+                    screen.blits([(background, rect, rect) for rect in particles.rects], False)
+            profiler.mark("background")
+            if particles is not None:
+                dirty_rects += particles.rects  # Where they were last frame
+                dirty_rects += particles.draw(screen)
+                profiler.mark("particles")
+            sprite_rects = all_sprites.draw(screen)
+            dirty_rects += sprite_rects
+        else:
+            screen.fill(LETTERBOX_COLOR)
+            draw_rink(screen.subsurface((view.offset, view.rink_size)), view.scale)
+            profiler.mark("background")
+            if particles is not None:
+                particles.draw(screen)
+                profiler.mark("particles")
+            all_sprites.draw(screen)
+        profiler.mark("sprites")
+        if draw_hud:
+            hud_rects = hud.draw(screen, state, show_instructions)
+            dirty_rects += hud_rects
+        profiler.mark("hud")
+        overlay_rects = []
+        if profiler.enabled and profiler.visible:
+            overlay_rects.append(profiler.draw(screen))
+            profiler.mark("profiler")
+        indicator = governor.draw(screen)
+        if indicator is not None:
+            overlay_rects.append(indicator)
+
+        # Update display
+        if DIRTY_RECT_RENDERING and not (full_redraw or show_instructions):
+            pygame.display.update(dirty_rects + overlay_rects)
+        else:
+            pygame.display.flip()
+        profiler.mark("display")
+        if meter is not None:
+            meter.presented(time.perf_counter(), (1 - alpha) * timestep.step)
+        # Closing the instructions uncovers the whole rink
+        full_redraw = show_instructions
+        if not timestep.uncapped:  # Fast-forwarding fills every frame on purpose
+            if governor.frame(time.perf_counter() - frame_started) and pacer is not None:
+                pacer.period = 1 / governor.frame_rate
+        if pacer is not None:
+            pacer.presented()
+        else:
+            clock.tick(governor.frame_rate)
+        profiler.mark("tick")
+        frames_drawn += 1
+        if frames_drawn == args.frames:
+            running = False
+        if client is not None and not client.connected:
+            print("Lost the connection to the server")
+            running = False
+
+    if recorder is not None:
+        recorder.close()
+    if client is not None:
+        client.close()
+    if hub is not None:
+        hub.close()
+    if match_log is not None:
+        match_log.close()
+        print(f"Match log written to {match_log.path}")
+    if args.profile_out:
+        profiler.export(args.profile_out)
+    if meter is not None:
+        print(meter.report())
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
+    sys.exit()
@@ -0,0 +1,234 @@
+# Match event logs for season analytics (see analysis.py).
+#
+#   python main.py --match-log logs/            one file per game played
+#   python matchlog.py simulate logs/ --matches 500 --skaters 3 --opponents 3
+#
+# Every shot, pickup, drop, check, goalie catch, save and throw, goal and shot
+# clock expiry becomes one record: the step it happened on, what happened,
+# who did it (a skater index or a goalie's carrier code from replay.py) and
+# their team, and where the ring was and how fast it was going at the end of
+# that step. A goal is credited to the last shooter, with the scoring team
+# and the ring as it was when that shot was taken.
+#
+# The file stores records by column: a JSON header, then blocks of up to
+# BLOCK_ROWS records, each one column after another.
+# Reading a column of a whole file is then a handful of memory copies, and a
+# file cut short by a crash loses only its unfinished block. Records are
+# collected in arrays on the game thread and written in blocks by a
+# background thread, so the game never waits on the disk.
+import argparse
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from game import *
+from replay import EVENT_NAMES, GOALIE_CARRIER, carrier_code
+
+MAGIC = b"RGML"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")  # Magic, version, length of the JSON that follows
+BLOCK = struct.Struct("<I")  # Records in the block that follows
+BLOCK_ROWS = 512
+FLUSH_STEPS = 30 * FPS  # Write a partial block at least this often
+# Name, array typecode and the matching NumPy dtype of each column
+COLUMNS = (
+    ("frame", "I", "<u4"),
+    ("kind", "B", "u1"),  # Index into EVENT_NAMES
+    ("actor", "b", "i1"),  # Skater index, GOALIE_CARRIER code, or -1
+    ("team", "b", "i1"),  # Team of the actor (goalie1 defends team 0's goal), or -1
+    ("x", "f", "<f4"),  # Ring center
+    ("y", "f", "<f4"),
+    ("vx", "f", "<f4"),  # Ring velocity
+    ("vy", "f", "<f4"),
+)
+NO_ACTOR = -1
+
+
+def goalie_team(code):
+    # goalie1 guards the left goal, which team 1 attacks
+    return GOALIE_CARRIER.index(code)
+
+
+class BlockWriter:
+    # Writes blocks handed over by MatchLog on a thread of its own
+    def __init__(self, file):
+        self.file = file
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="match log", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            columns = self.queue.get()
+            if columns is None:
+                break
+            self.file.write(BLOCK.pack(len(columns[0])))
+            for column in columns:
+                if sys.byteorder == "big":
+                    column.byteswap()
+                self.file.write(column.tobytes())
+            self.file.flush()
+        self.file.close()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class MatchLog:
+    # Call step(state) after every GameState.step() of one match
+    def __init__(self, path, state):
+        roster = [sum(1 for skater in state.skaters if skater.team == team) for team in (0, 1)]
+        header = {"version": VERSION, "fps": FPS, "roster": roster, "rules": state.rules.as_dict(),
+                  "events": EVENT_NAMES, "columns": [[name, dtype] for name, _, dtype in COLUMNS],
+                  "started": time.time()}
+        file = open(path, "wb")
+        text = json.dumps(header).encode("utf-8")
+        file.write(HEADER.pack(MAGIC, VERSION, len(text)))
+        file.write(text)
+        self.path = path
+        self.writer = BlockWriter(file)
+        self.columns = self.new_columns()
+        self.carrier = carrier_code(state)  # Who had the ring when the step started
+        self.shot = (NO_ACTOR, 0.0, 0.0, 0.0, 0.0)  # Actor and ring of the last shot
+        self.team_scores = list(state.team_scores)
+        self.last_flush = state.frame
+
+    def new_columns(self):
+        return [array(typecode) for _, typecode, _ in COLUMNS]
+
+    def team_of(self, state, code):
+        if code >= 0:
+            return state.skaters[code].team
+        if code in GOALIE_CARRIER:
+            return goalie_team(code)
+        return NO_ACTOR
+
+    def knocked_loose(self, state):
+        # The skater who picked the ring up and lost it to a check in the same
+        # step: the one it was held against before its first step loose
+        ring = state.ring
+        x = ring.rect.right - ring.velocity[0]
+        y = ring.rect.bottom - ring.velocity[1]
+        skater = min(state.skaters, key=lambda s: (s.rect.right + 10 - x) ** 2 + (s.rect.bottom - y) ** 2)
+        return state.skaters.index(skater)
+
+    def step(self, state):
+        carrier = carrier_code(state)
+        held = self.carrier  # Whoever had the ring before the step
+        for name in state.events:
+            if name in ("shot", "drop", "check", "shot_clock", "throw"):
+                actor = held
+            elif name in ("pickup", "catch"):
+                actor = carrier
+                if name == "pickup" and actor == NO_ACTOR and "check" in state.events:
+                    actor = held = self.knocked_loose(state)
+            elif name == "save":
+                # The goalie on the ring's side of the rink
+                actor = GOALIE_CARRIER[0] if state.ring.rect.centerx < WIDTH // 2 else GOALIE_CARRIER[1]
+            else:
+                actor = NO_ACTOR
+            if name == "goal":
+                actor, *ring = self.shot
+                team = 0 if state.team_scores[0] > self.team_scores[0] else 1
+                self.add(name, state.frame, actor, team, *ring)
+                continue
+            ring = state.ring
+            center = ring.rect.center
+            velocity = ring.velocity if ring.active else (0, 0)
+            self.add(name, state.frame, actor, self.team_of(state, actor), center[0], center[1], *velocity)
+            if name == "shot":
+                self.shot = (actor, center[0], center[1], *velocity)
+        self.carrier = carrier
+        self.team_scores = list(state.team_scores)
+        if len(self.columns[0]) >= BLOCK_ROWS or (self.columns[0] and state.frame - self.last_flush >= FLUSH_STEPS):
+            self.flush(state.frame)
+
+    def add(self, name, frame, actor, team, x, y, vx, vy):
+        for column, value in zip(self.columns, (frame, EVENT_NAMES.index(name), actor, team, x, y, vx, vy)):
+            column.append(value)
+
+    def flush(self, frame=None):
+        if self.columns[0]:
+            self.writer.queue.put(self.columns)
+            self.columns = self.new_columns()
+        if frame is not None:
+            self.last_flush = frame
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def new_log_path(directory):
+    # A fresh file name in directory for a match starting now
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"match-{stamp}.rgm")
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(directory, f"match-{stamp}-{suffix}.rgm")
+    return path
+
+
+def simulate_match(job):
+    # One headless AI game written to path, for testing the analytics
+    path, roster, seed, frames = job
+    from ai import AI, load_tables
+    from sweep import Bot, scripted_inputs
+
+    state = GameState(seed, roster=roster)
+    ai = AI(load_tables(), state.rules)
+    state.goalie_ai = ai
+    bot = Bot(seed)
+    with MatchLog(path, state) as log:
+        for _ in range(frames):
+            state.step(scripted_inputs(state, bot), skater_inputs=ai.skater_inputs(state))
+            log.step(state)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Match event logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    simulate = commands.add_parser("simulate", help="write logs of headless AI games")
+    simulate.add_argument("directory")
+    simulate.add_argument("--matches", type=int, default=100)
+    simulate.add_argument("--minutes", type=float, default=5, help="game time per match")
+    simulate.add_argument("--skaters", type=int, default=3)
+    simulate.add_argument("--opponents", type=int, default=3)
+    simulate.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from multiprocessing import Pool
+    from ai import load_tables
+
+    if load_tables() is None:
+        parser.error("the AI tables are missing; build them with python ai.py")
+    os.makedirs(args.directory, exist_ok=True)
+    frames = int(args.minutes * 60 * FPS)
+    jobs = [(os.path.join(args.directory, f"sim-{args.seed + i:05d}.rgm"), (args.skaters, args.opponents),
+             args.seed + i, frames) for i in range(args.matches)]
+    started = time.perf_counter()
+    with Pool() as pool:
+        for done, _ in enumerate(pool.imap_unordered(simulate_match, jobs), 1):
+            print(f"\r{done}/{len(jobs)} matches", end="", flush=True)
+    print(f"\nWrote {len(jobs)} matches in {time.perf_counter() - started:.0f} s")
+
+
+if __name__ == "__main__":
+    main()
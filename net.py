@@ -0,0 +1,552 @@
+# Networked multiplayer over UDP.
+#
+#   python net.py serve --skaters 3 --opponents 3 --ai      host a game
+#   python main.py --connect 192.168.1.20:5999             join it and play
+#   python net.py bot 127.0.0.1:5999 --lag 0.08 --loss 0.1 headless test player
+#
+# The server runs the only real GameState, stepped at a fixed 60 Hz on asyncio.
+# Each client takes over one skater and sends its inputs every step, numbered
+# and repeated in the next few packets so a lost packet costs nothing. Every
+# SNAPSHOT_INTERVAL steps the server sends each client the state as a delta
+# against the last snapshot that client acknowledged: a bitmask of the fields
+# that changed followed by just their values, so a quiet rink costs a few
+# bytes. The client moves its own skater as soon as a key is pressed; when a
+# snapshot says which inputs the server has applied, the skater is put where
+# the server has it and the newer inputs are replayed on top (prediction with
+# reconciliation). Everything else is drawn where the server last put it.
+#
+# --lag, --jitter and --loss delay, reorder and drop outgoing packets on
+# purpose, so all of this can be tried out on one machine.
+import argparse
+import asyncio
+import heapq
+import json
+import math
+import random
+import socket
+import struct
+import time
+from collections import deque
+from game import *
+from replay import EVENT_NAMES, GOALIE_CARRIER, INPUT_FLAGS, carrier_code, quantize
+from timestep import FixedTimestep
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 5999
+SNAPSHOT_INTERVAL = 2  # Steps between snapshots (30 a second)
+SNAPSHOT_HISTORY = 64  # Snapshots kept to diff against
+INPUT_REDUNDANCY = 8  # Inputs repeated in every input packet
+INPUT_BUFFER = 2  # Inputs the server waits to have queued after running out
+MAX_QUEUED_INPUTS = 6  # More waiting than this only adds latency, so the oldest are dropped
+MAX_UNACKED_INPUTS = 4 * FPS  # Inputs the client keeps for reconciliation
+TIMEOUT = 5.0  # Seconds of silence before the other end counts as gone
+HELLO_INTERVAL = 0.25
+NO_TICK = 0xFFFFFFFF
+
+# Packet types
+HELLO = b"H"
+WELCOME = b"W"
+FULL = b"F"
+INPUT = b"I"
+SNAPSHOT = b"S"
+BYE = b"B"
+
+HELLO_PACKET = struct.Struct("<cH")  # Type, protocol version
+WELCOME_PACKET = struct.Struct("<cH")  # Type, skater slot; the game's JSON header follows
+INPUT_PACKET = struct.Struct("<cIB")  # Type, newest snapshot tick received, number of inputs
+INPUT_ENTRY = struct.Struct("<IBhh")  # Sequence number, INPUT_FLAGS bits, aim
+SNAPSHOT_PACKET = struct.Struct("<cIII")  # Type, tick, baseline tick or NO_TICK, last input applied
+
+
+def parse_address(text, default_port=DEFAULT_PORT):
+    host, _, port = text.rpartition(":")
+    if not host:
+        host, port = text, default_port
+    return socket.gethostbyname(host), int(port)
+
+
+def pack_inputs(sequence, inputs):
+    flags = 0
+    for bit, name in enumerate(INPUT_FLAGS):
+        if getattr(inputs, name):
+            flags |= 1 << bit
+    return INPUT_ENTRY.pack(sequence, flags, inputs.aim[0], inputs.aim[1])
+
+
+def unpack_inputs(data, offset):
+    sequence, flags, aim_x, aim_y = INPUT_ENTRY.unpack_from(data, offset)
+    return sequence, Inputs(*(bool(flags & (1 << bit)) for bit in range(len(INPUT_FLAGS))), aim=(aim_x, aim_y))
+
+
+def snapshot_fields(skaters):
+    # Name and struct code of every field of a snapshot
+    fields = [("ring_x", "f"), ("ring_y", "f"), ("ring_active", "B"), ("goalie1_y", "h"), ("goalie2_y", "h"),
+              ("carrier", "b"), ("score", "H"), ("team_score0", "H"), ("team_score1", "H"),
+              ("shot_clock", "h"), ("events", "H")]
+    for i in range(skaters):
+        fields += [(f"x{i}", "h"), (f"y{i}", "h")]
+    return fields
+
+
+class SnapshotCodec:
+    # Captures what clients draw from a GameState, writes it as the fields
+    # that differ from a baseline snapshot, and applies it to a client's state
+    def __init__(self, skaters):
+        self.codes = [code for _, code in snapshot_fields(skaters)]
+        self.full = struct.Struct("<" + "".join(self.codes))
+        self.mask_size = (len(self.codes) + 7) // 8
+
+    def capture(self, state, events=0):
+        ring = state.ring
+        values = [ring.position[0], ring.position[1], ring.active, state.goalie1.rect.y, state.goalie2.rect.y,
+                  carrier_code(state), state.score, state.team_scores[0], state.team_scores[1],
+                  state.shot_clock, events]
+        for skater in state.skaters:
+            values += [skater.rect.x, skater.rect.y]
+        # Round trip through the wire format so diffs compare what clients see
+        return self.full.unpack(self.full.pack(*values))
+
+    def encode(self, values, baseline=None):
+        mask = 0
+        codes = ""
+        changed = []
+        for i, value in enumerate(values):
+            if baseline is None or value != baseline[i]:
+                mask |= 1 << i
+                codes += self.codes[i]
+                changed.append(value)
+        return mask.to_bytes(self.mask_size, "little") + struct.pack("<" + codes, *changed)
+
+    def decode(self, data, baseline=None):
+        mask = int.from_bytes(data[:self.mask_size], "little")
+        if baseline is None and mask != (1 << len(self.codes)) - 1:
+            raise ValueError("A snapshot without a baseline has to contain every field")
+        codes = "".join(code for i, code in enumerate(self.codes) if mask & (1 << i))
+        changed = iter(struct.unpack_from("<" + codes, data, self.mask_size))
+        return tuple(next(changed) if mask & (1 << i) else baseline[i] for i in range(len(self.codes)))
+
+    def apply(self, values, state):
+        (ring_x, ring_y, ring_active, goalie1_y, goalie2_y, carrier, state.score,
+         score0, score1, state.shot_clock, events) = values[:11]
+        state.team_scores = [score0, score1]
+        state.ring.set_position(ring_x, ring_y)
+        state.ring.active = bool(ring_active)
+        state.goalie1.rect.y = goalie1_y
+        state.goalie2.rect.y = goalie2_y
+        for code, goalie in zip(GOALIE_CARRIER, state.goalies):
+            goalie.has_ring = carrier == code
+        for i, skater in enumerate(state.skaters):
+            skater.rect.topleft = values[11 + i * 2:13 + i * 2]
+            skater.has_ring = carrier == i
+        state.events = [name for bit, name in enumerate(EVENT_NAMES) if events & (1 << bit)]
+
+
+class Link:
+    # Outgoing packets, held back by lag plus up to jitter seconds (which can
+    # reorder them) and dropped with probability loss, to imitate a bad network
+    def __init__(self, send, lag=0.0, loss=0.0, jitter=0.0, seed=None):
+        self.send_now = send
+        self.lag = lag
+        self.loss = loss
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.queue = []  # (due time, order sent, data, address)
+        self.sent = 0
+
+    def send(self, data, address, now):
+        self.sent += 1
+        if self.loss and self.random.random() < self.loss:
+            return
+        if not self.lag and not self.jitter:
+            self.send_now(data, address)
+            return
+        due = now + self.lag + self.random.uniform(0, self.jitter)
+        heapq.heappush(self.queue, (due, self.sent, data, address))
+
+    def flush(self, now):
+        while self.queue and self.queue[0][0] <= now:
+            _, _, data, address = heapq.heappop(self.queue)
+            self.send_now(data, address)
+
+    def next_due(self):
+        return self.queue[0][0] if self.queue else None
+
+
+class Peer:
+    # A connected client, as the server sees it
+    def __init__(self, address, slot, now):
+        self.address = address
+        self.slot = slot  # Index of the skater it controls
+        self.inputs = {}  # Sequence number -> Inputs not applied yet
+        self.applied = 0  # Sequence number of the last input applied
+        self.buffering = True  # Waiting for INPUT_BUFFER inputs before applying any
+        self.acked = None  # Newest snapshot tick the client has received
+        self.last_heard = now
+
+
+class GameServer(asyncio.DatagramProtocol):
+    def __init__(self, state, ai=None, snapshot_interval=SNAPSHOT_INTERVAL, lag=0.0, loss=0.0, jitter=0.0,
+                 seed=None, log=print):
+        self.state = state
+        self.ai = ai  # Plays the skaters no client has taken, if set
+        self.snapshot_interval = snapshot_interval
+        self.codec = SnapshotCodec(len(state.skaters))
+        roster = [sum(1 for skater in state.skaters if skater.team == team) for team in (0, 1)]
+        self.header = {"version": PROTOCOL_VERSION, "fps": FPS, "roster": roster,
+                       "rules": state.rules.as_dict(), "snapshot_interval": snapshot_interval}
+        self.peers = {}  # Address -> Peer
+        self.history = {}  # Tick -> snapshot values, to diff against
+        self.events = 0  # EVENT_NAMES bits since the last snapshot
+        self.transport = None
+        self.link = Link(self.send_now, lag, loss, jitter, seed)
+        self.log = log
+        self.snapshot_bytes = 0
+        self.snapshots_sent = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def send_now(self, data, address):
+        self.transport.sendto(data, address)
+
+    def free_slot(self):
+        taken = {peer.slot for peer in self.peers.values()}
+        for slot in range(len(self.state.skaters)):
+            if slot not in taken:
+                return slot
+        return None
+
+    def datagram_received(self, data, address):
+        now = time.monotonic()
+        kind = data[:1]
+        peer = self.peers.get(address)
+        if kind == HELLO:
+            try:
+                _, version = HELLO_PACKET.unpack_from(data)
+            except struct.error:
+                return
+            if version != PROTOCOL_VERSION:
+                return
+            if peer is None:
+                slot = self.free_slot()
+                if slot is None:
+                    self.link.send(FULL, address, now)
+                    return
+                peer = self.peers[address] = Peer(address, slot, now)
+                self.log(f"{address[0]}:{address[1]} joined as skater {slot}")
+            # Sent again for every HELLO in case the last WELCOME was lost
+            text = json.dumps(dict(self.header, slot=peer.slot)).encode("utf-8")
+            self.link.send(WELCOME_PACKET.pack(WELCOME, peer.slot) + text, address, now)
+        elif peer is None:
+            return
+        elif kind == INPUT:
+            self.receive_inputs(peer, data)
+        elif kind == BYE:
+            del self.peers[address]
+            self.log(f"{address[0]}:{address[1]} left")
+            return
+        peer.last_heard = now
+
+    def receive_inputs(self, peer, data):
+        try:
+            _, acked, count = INPUT_PACKET.unpack_from(data)
+            entries = [unpack_inputs(data, INPUT_PACKET.size + i * INPUT_ENTRY.size) for i in range(count)]
+        except struct.error:
+            return
+        if acked != NO_TICK and (peer.acked is None or acked > peer.acked):
+            peer.acked = acked
+        for sequence, inputs in entries:
+            if sequence > peer.applied:
+                peer.inputs[sequence] = inputs
+        while len(peer.inputs) > MAX_QUEUED_INPUTS:
+            oldest = min(peer.inputs)
+            del peer.inputs[oldest]
+            peer.applied = oldest
+
+    def next_inputs(self, peer):
+        # A skater whose inputs are late stands still rather than guessing, so
+        # every input is applied exactly once, as the client predicted it. A
+        # small buffer keeps uneven packet timing from stalling it every step.
+        if len(peer.inputs) >= INPUT_BUFFER:
+            peer.buffering = False
+        if peer.buffering or not peer.inputs:
+            peer.buffering = True
+            return NO_INPUTS
+        sequence = min(peer.inputs)
+        peer.applied = sequence
+        return peer.inputs.pop(sequence)
+
+    def tick(self, now):
+        # One step of the game, then snapshots if one is due
+        state = self.state
+        skater_inputs = self.ai.skater_inputs(state) if self.ai is not None else {}
+        for peer in list(self.peers.values()):
+            if now - peer.last_heard > TIMEOUT:
+                del self.peers[peer.address]
+                self.log(f"{peer.address[0]}:{peer.address[1]} timed out")
+                continue
+            skater_inputs[state.skaters[peer.slot]] = self.next_inputs(peer)
+        state.step(skater_inputs.pop(state.player, NO_INPUTS), skater_inputs=skater_inputs)
+        for name in state.events:
+            self.events |= 1 << EVENT_NAMES.index(name)
+        if state.frame % self.snapshot_interval == 0:
+            self.send_snapshots(now)
+
+    def send_snapshots(self, now):
+        tick = self.state.frame
+        values = self.codec.capture(self.state, self.events)
+        self.events = 0
+        self.history[tick] = values
+        self.history.pop(tick - SNAPSHOT_HISTORY * self.snapshot_interval, None)
+        for peer in self.peers.values():
+            baseline = self.history.get(peer.acked)
+            packet = SNAPSHOT_PACKET.pack(SNAPSHOT, tick, NO_TICK if baseline is None else peer.acked, peer.applied)
+            packet += self.codec.encode(values, baseline)
+            self.link.send(packet, peer.address, now)
+            self.snapshot_bytes += len(packet)
+            self.snapshots_sent += 1
+
+    async def run(self, duration=None):
+        # Steps the game in real time, for duration seconds or until cancelled
+        timestep = FixedTimestep()
+        started = last = time.monotonic()
+        while duration is None or last - started < duration:
+            now = time.monotonic()
+            for _ in range(timestep.advance(now - last)):
+                self.tick(now)
+            last = now
+            self.link.flush(now)
+            wait = timestep.step - timestep.accumulator
+            due = self.link.next_due()
+            if due is not None:
+                wait = min(wait, due - now)
+            await asyncio.sleep(max(wait, 0))
+
+
+async def serve(state, host="0.0.0.0", port=DEFAULT_PORT, duration=None, **options):
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: GameServer(state, **options),
+                                                            local_addr=(host, port))
+    try:
+        await server.run(duration)
+    finally:
+        transport.close()
+    return server
+
+
+class NetClient:
+    # The client end. It is polled from the game loop instead of running on
+    # asyncio, so main.py can drive it one step at a time. Its GameState only
+    # mirrors the server's and is never stepped; state.player is the skater
+    # this client controls.
+    def __init__(self, address, lag=0.0, loss=0.0, jitter=0.0, seed=None):
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.link = Link(lambda data, address: self.socket.sendto(data, address), lag, loss, jitter, seed)
+        self.state = None
+        self.player = None
+        self.header = None
+        self.codec = None
+        self.sequence = 0
+        self.recent = deque(maxlen=INPUT_REDUNDANCY)  # Packed inputs repeated in each packet
+        self.unacked = deque(maxlen=MAX_UNACKED_INPUTS)  # (sequence, inputs) not applied by the server yet
+        self.sent_at = {}  # Sequence number -> when it was sent, for measuring input delay
+        self.snapshots = {}  # Tick -> snapshot values, to decode deltas against
+        self.tick = None  # Newest snapshot applied
+        self.last_heard = time.monotonic()
+        # Counters for reports
+        self.snapshot_bytes = 0
+        self.snapshot_count = 0
+        self.full_snapshots = 0
+        self.corrections = 0  # Snapshots that moved our predicted skater
+        self.correction_distance = 0.0
+        self.input_delays = []
+
+    @property
+    def connected(self):
+        return time.monotonic() - self.last_heard < TIMEOUT
+
+    def join(self, timeout=TIMEOUT):
+        # Blocks until the server answers, then returns the mirrored GameState
+        deadline = time.monotonic() + timeout
+        next_hello = 0
+        while self.state is None:
+            now = time.monotonic()
+            if now > deadline:
+                raise ConnectionError(f"No answer from {self.address[0]}:{self.address[1]}")
+            if now >= next_hello:
+                self.link.send(HELLO_PACKET.pack(HELLO, PROTOCOL_VERSION), self.address, now)
+                next_hello = now + HELLO_INTERVAL
+            self.poll()
+            time.sleep(0.01)
+        self.last_heard = time.monotonic()
+        return self.state
+
+    def close(self):
+        self.socket.sendto(BYE, self.address)
+        self.socket.close()
+
+    def poll(self):
+        # Sends whatever the simulated link let through and handles every packet waiting
+        now = time.monotonic()
+        self.link.flush(now)
+        while True:
+            try:
+                data, address = self.socket.recvfrom(65536)
+            except (BlockingIOError, InterruptedError, ConnectionResetError):
+                break
+            if address != self.address:
+                continue
+            self.last_heard = now
+            kind = data[:1]
+            if kind == WELCOME and self.state is None:
+                self.welcome(data)
+            elif kind == SNAPSHOT and self.state is not None:
+                self.receive_snapshot(data, now)
+            elif kind == FULL:
+                raise ConnectionError("The game is full")
+
+    def welcome(self, data):
+        _, slot = WELCOME_PACKET.unpack_from(data)
+        self.header = json.loads(data[WELCOME_PACKET.size:])
+        state = GameState(rules=Rules(**self.header["rules"]), roster=self.header["roster"])
+        state.player = state.skaters[slot]
+        self.codec = SnapshotCodec(len(state.skaters))
+        self.player = state.player
+        self.state = state
+
+    def receive_snapshot(self, data, now):
+        try:
+            _, tick, baseline_tick, applied = SNAPSHOT_PACKET.unpack_from(data)
+            baseline = None
+            if baseline_tick != NO_TICK:
+                baseline = self.snapshots.get(baseline_tick)
+                if baseline is None:
+                    return  # Diffed against one we have already thrown away
+            values = self.codec.decode(data[SNAPSHOT_PACKET.size:], baseline)
+        except (struct.error, ValueError):
+            return
+        self.snapshot_bytes += len(data)
+        self.snapshot_count += 1
+        self.full_snapshots += baseline is None
+        if self.tick is not None and tick <= self.tick:
+            return  # Arrived after a newer one
+        self.snapshots[tick] = values
+        oldest = tick - SNAPSHOT_HISTORY * self.header["snapshot_interval"]
+        for old in [old for old in self.snapshots if old < oldest]:
+            del self.snapshots[old]
+        self.tick = tick
+        self.state.frame = tick
+
+        # Start from where the server has us and redo the inputs it hasn't applied yet
+        predicted = self.player.rect.topleft
+        self.codec.apply(values, self.state)
+        while self.unacked and self.unacked[0][0] <= applied:
+            sequence, _ = self.unacked.popleft()
+            sent = self.sent_at.pop(sequence, None)
+            if sent is not None and sequence == applied:
+                self.input_delays.append(now - sent)
+        for sequence in [sequence for sequence in self.sent_at if sequence <= applied]:
+            del self.sent_at[sequence]
+        for _, inputs in self.unacked:
+            self.player.update(inputs)
+        self.carry_ring()
+        if self.player.rect.topleft != predicted:
+            self.corrections += 1
+            self.correction_distance += math.hypot(self.player.rect.x - predicted[0],
+                                                   self.player.rect.y - predicted[1])
+
+    def carry_ring(self):
+        # Our skater is drawn ahead of the snapshots, so the ring it carries is too
+        if self.player.has_ring:
+            self.state.ring.set_bottomright((self.player.rect.right + 10, self.player.rect.bottom))
+
+    def step(self, inputs):
+        # Sends one step's inputs and moves our skater straight away
+        inputs = quantize(inputs)
+        self.sequence += 1
+        self.unacked.append((self.sequence, inputs))
+        self.sent_at[self.sequence] = time.monotonic()
+        self.recent.append(pack_inputs(self.sequence, inputs))
+        packet = INPUT_PACKET.pack(INPUT, NO_TICK if self.tick is None else self.tick, len(self.recent))
+        self.link.send(packet + b"".join(self.recent), self.address, time.monotonic())
+        self.player.update(inputs)
+        self.carry_ring()
+        self.poll()
+
+
+def run_bot(address, seconds, lag=0.0, loss=0.0, jitter=0.0, seed=None):
+    # A headless client playing sweep.py's scripted skater, for trying the
+    # netcode out; returns the client for its counters
+    from sweep import Bot, scripted_inputs
+
+    client = NetClient(address, lag, loss, jitter, seed)
+    state = client.join()
+    bot = Bot(seed or 0)
+    timestep = FixedTimestep()
+    started = last = time.monotonic()
+    while time.monotonic() - started < seconds and client.connected:
+        now = time.monotonic()
+        for _ in range(timestep.advance(now - last)):
+            client.step(scripted_inputs(state, bot))
+        last = now
+        client.poll()
+        time.sleep(max(timestep.step - timestep.accumulator, 0))
+    client.close()
+    return client
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Networked multiplayer server and test client")
+    commands = parser.add_subparsers(dest="command", required=True)
+    server_parser = commands.add_parser("serve", help="host a game")
+    server_parser.add_argument("--host", default="0.0.0.0", help="address to listen on")
+    server_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    server_parser.add_argument("--skaters", type=int, default=2, help="skaters on the left team")
+    server_parser.add_argument("--opponents", type=int, default=2, help="skaters on the right team")
+    server_parser.add_argument("--ai", action="store_true", help="AI plays the skaters nobody joined as, and the goalies")
+    server_parser.add_argument("--seconds", type=float, help="stop after this long")
+    bot_parser = commands.add_parser("bot", help="join a game with a scripted skater and report on the connection")
+    bot_parser.add_argument("address", help="HOST:PORT of the server")
+    bot_parser.add_argument("--seconds", type=float, default=30)
+    bot_parser.add_argument("--seed", type=int)
+    for command in (server_parser, bot_parser):
+        command.add_argument("--lag", type=float, default=0.0, help="seconds to hold back every packet sent")
+        command.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+        command.add_argument("--loss", type=float, default=0.0, help="fraction of packets sent to drop")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        state = GameState(roster=(args.skaters, args.opponents))
+        ai = None
+        if args.ai:
+            from ai import AI, load_tables
+
+            tables = load_tables()
+            if tables is None:
+                parser.error("the AI tables are missing; build them with python ai.py")
+            ai = AI(tables, state.rules)
+            state.goalie_ai = ai
+        print(f"Serving {args.skaters} on {args.opponents} on {args.host}:{args.port}")
+        try:
+            server = asyncio.run(serve(state, args.host, args.port, args.seconds, ai=ai,
+                                       lag=args.lag, loss=args.loss, jitter=args.jitter))
+        except KeyboardInterrupt:
+            return
+        if server.snapshots_sent:
+            full = SNAPSHOT_PACKET.size + server.codec.mask_size + server.codec.full.size
+            print(f"{server.snapshots_sent} snapshots, {server.snapshot_bytes / server.snapshots_sent:.1f} bytes "
+                  f"on average ({full} without deltas)")
+    else:
+        client = run_bot(parse_address(args.address), args.seconds, args.lag, args.loss, args.jitter, args.seed)
+        count = max(client.snapshot_count, 1)
+        delays = sorted(client.input_delays) or [0.0]
+        print(f"{client.snapshot_count} snapshots ({client.full_snapshots} full), "
+              f"{client.snapshot_bytes / count:.1f} bytes on average")
+        print(f"input delay p50 {delays[len(delays) // 2] * 1000:.0f} ms, p95 {delays[int(len(delays) * 0.95)] * 1000:.0f} ms")
+        print(f"{client.corrections} corrections, {client.correction_distance / max(client.corrections, 1):.1f} px on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# Visual effects: ice spray when a skater turns, a trail behind a fast ring,
+# and a burst when a goal goes in or a goalie makes a save.
+#
+# Particles are not objects. Each one is a slot in a set of arrays allocated
+# once at CAPACITY, and the live ones are kept packed at the front: when a
+# particle dies, the last live one moves into its slot, so that slot and the
+# ones after it are the free list. A particle only stores where and when it
+# started, so nothing is written back while it lives: the distance it has
+# covered and the image for its fade level come from tables per kind, looked
+# up by its age and the steps it has left. One pass over the live slots lays
+# out where each is drawn, and drawing hands all of them to Surface.blits()
+# in one call, so a busy frame allocates nothing but that list. At most
+# SPAWN_BUDGET particles start in a frame and the rest of a big burst is
+# dropped, which keeps the cost of a frame bounded however much happens in it.
+import random
+from array import array
+import pygame
+from game import *
+
+CAPACITY = 600
+SPAWN_BUDGET = 40  # New particles per frame
+FADE_LEVELS = 4  # Images per kind, from faint to full strength
+TRAIL_SPEED = 3  # Ring speed (per step) above which it leaves a trail
+SPRAY_COUNT = 6
+BURST_COUNT = 24
+
+# Color, diameter in rink units, lifetime in steps and the speed kept per step
+SPRAY, TRAIL, GOAL_BURST, SAVE_BURST = range(4)
+KINDS = (
+    ((120, 170, 215), 5, 16, 0.85),  # Shavings, pale blue so they show on the ice
+    ((255, 170, 40), 6, 10, 1.0),
+    ((255, 60, 40), 6, 45, 0.92),
+    ((40, 110, 255), 5, 25, 0.9),
+)
+
+
+class ParticleSystem:
+    def __init__(self, capacity=CAPACITY, seed=None):
+        self.capacity = capacity
+        self.x = array("f", bytes(4 * capacity))  # Where it started, in window pixels
+        self.y = array("f", bytes(4 * capacity))
+        self.vx = array("f", bytes(4 * capacity))  # Starting speed, in window pixels per step
+        self.vy = array("f", bytes(4 * capacity))
+        self.born = array("l", bytes(array("l").itemsize * capacity))  # Step it started on
+        self.end = array("l", bytes(array("l").itemsize * capacity))  # Step it dies on
+        self.kind = array("B", bytes(capacity))
+        self.count = 0  # Live particles, in slots [0, count)
+        self.detail = 1.0  # Share of SPAWN_BUDGET used; the quality governor turns it down
+        self.budget = SPAWN_BUDGET
+        self.clock = 0  # Steps emitted so far
+        self.steps = 0  # Steps run since the last update()
+        # Effects are random but mustn't touch the game's own generator
+        self.random = random.Random(seed)
+        self.headings = {}  # Direction each skater was facing after the last step
+        self.ring_center = None
+        self.team_scores = None
+        self.view = None
+        # Per kind, indexed by age: the distance covered, in starting speeds
+        self.travel = []
+        for _, _, lifetime, keep in KINDS:
+            travel = [0.0]
+            for age in range(lifetime):
+                travel.append(travel[-1] + keep ** age)
+            self.travel.append(travel)
+        self.looks = None  # Per kind, indexed by steps left: the image at that fade level
+        self.blits = None  # (image, screen position) of every live particle, None to lay them out again
+        self.rects = []  # Where particles were drawn last frame
+
+    def spawn(self, kind, x, y, vx, vy):
+        # Starts a particle at (x, y) in rink units; False when the frame's
+        # budget or the arrays are used up
+        i = self.count
+        if self.budget <= 0 or i == self.capacity:
+            return False
+        view = self.view
+        scale = view.scale
+        self.x[i] = view.offset[0] + x * scale
+        self.y[i] = view.offset[1] + y * scale
+        self.vx[i] = vx * scale
+        self.vy[i] = vy * scale
+        self.born[i] = self.clock
+        self.end[i] = self.clock + max(1, int(KINDS[kind][2] * self.random.uniform(0.6, 1.0)))
+        self.kind[i] = kind
+        self.count = i + 1
+        self.budget -= 1
+        return True
+
+    def burst(self, kind, center, count=BURST_COUNT, speed=4):
+        uniform = self.random.uniform
+        for _ in range(count):
+            if not self.spawn(kind, center[0], center[1], uniform(-speed, speed), uniform(-speed, speed)):
+                break
+
+    def emit(self, state):
+        # Call after every GameState.step()
+        self.steps += 1
+        self.clock += 1
+        uniform = self.random.uniform
+        for skater in state.skaters:
+            heading = skater.direction
+            last = self.headings.get(skater)
+            if last is not None and last != heading:
+                # Shavings thrown out behind the skate, against the new heading
+                x, y = skater.rect.centerx, skater.rect.bottom
+                for _ in range(SPRAY_COUNT):
+                    if not self.spawn(SPRAY, x, y, -heading[0] * uniform(1, 3) + uniform(-1, 1),
+                                      -heading[1] * uniform(1, 3) + uniform(-1, 1)):
+                        break
+            self.headings[skater] = heading
+        ring = state.ring
+        vx, vy = ring.velocity
+        if ring.active and vx * vx + vy * vy > TRAIL_SPEED * TRAIL_SPEED:
+            self.spawn(TRAIL, ring.rect.centerx, ring.rect.centery, uniform(-0.3, 0.3), uniform(-0.3, 0.3))
+        for name in state.events:
+            if name == "goal" and self.team_scores is not None:
+                # In the net the last step's ring went into, before it was reset
+                goal = state.goal2 if state.team_scores[0] > self.team_scores[0] else state.goal1
+                self.burst(GOAL_BURST, goal.rect.center)
+            elif name == "save" and self.ring_center is not None:
+                self.burst(SAVE_BURST, self.ring_center, BURST_COUNT // 2, 3)
+        self.ring_center = ring.rect.center
+        self.team_scores = list(state.team_scores)
+
+    def update(self):
+        # Retires the particles that ran out of life and lays out the next
+        # draw(). Call once per frame.
+        steps = self.steps
+        self.steps = 0
+        self.budget = int(SPAWN_BUDGET * self.detail)
+        if not steps and self.blits is not None:
+            return  # Nothing moved, so the last layout still holds
+        x, y, vx, vy, born, end, kinds = self.x, self.y, self.vx, self.vy, self.born, self.end, self.kind
+        travel, looks = self.travel, self.looks
+        now = self.clock
+        blits = []
+        append = blits.append
+        count = self.count
+        i = 0
+        while i < count:
+            left = end[i] - now
+            if left <= 0:
+                # Fill the hole with the last live particle
+                count -= 1
+                x[i], y[i], vx[i], vy[i], born[i], end[i], kinds[i] = (
+                    x[count], y[count], vx[count], vy[count], born[count], end[count], kinds[count])
+                continue
+            kind = kinds[i]
+            covered = travel[kind][now - born[i]]
+            append((looks[kind][left], (x[i] + vx[i] * covered, y[i] + vy[i] * covered)))
+            i += 1
+        self.count = count
+        self.blits = blits
+
+    def clear(self):
+        self.count = 0
+        self.steps = 0
+        self.blits = []
+
+    def set_view(self, view):
+        # Images of every kind at every fade level, scaled and converted for
+        # view, and the particles in flight moved over to it. Particles are
+        # laid out by their top-left corner, which is close enough to the
+        # center at these sizes.
+        old = self.view
+        if old is not None:
+            x, y, vx, vy = self.x, self.y, self.vx, self.vy
+            ratio = view.scale / old.scale
+            for i in range(self.count):
+                x[i], y[i] = view.to_screen(old.to_rink((x[i], y[i])))
+                vx[i] *= ratio
+                vy[i] *= ratio
+        self.view = view
+        self.looks = []
+        top = FADE_LEVELS - 1
+        for color, size, lifetime, _ in KINDS:
+            diameter = view.length(size)
+            images = []
+            for level in range(1, FADE_LEVELS + 1):
+                image = pygame.Surface((diameter, diameter), pygame.SRCALPHA)
+                pygame.draw.circle(image, (*color, 255 * level // FADE_LEVELS), (diameter / 2, diameter / 2), diameter / 2)
+                images.append(image.convert_alpha())
+            # Full strength for the first half of a particle's life, then fading out
+            self.looks.append([images[min(top, left * FADE_LEVELS * 2 // lifetime)] for left in range(lifetime + 1)])
+        self.blits = None
+        self.rects = []
+
+    def draw(self, surface):
+        # Draws every live particle and returns the rects drawn over
+        self.rects = surface.blits(self.blits) if self.blits else []
+        return self.rects
@@ -0,0 +1,258 @@
+# Per-phase frame timing for main.py --profile.
+#
+# Each frame the loop calls mark(phase) at the end of every phase, and the time
+# since the previous mark is added to that phase. GameState.step() marks its
+# own phases when a profiler is attached, so fast-forwarded frames that run
+# many steps add up per phase. The last HISTORY_FRAMES frames are kept in flat
+# preallocated arrays, so profiling allocates nothing per frame.
+import csv
+import json
+import time
+from array import array
+import pygame
+
+PHASES = (
+    "events",  # Event pump and reading the keyboard and mouse
+    "inputs",  # Shots and pickups at the start of each step
+    "shot_clock",
+    "skaters",  # Skater updates
+    "contacts",  # Pushing skaters apart and checks
+    "goalies",  # Goalie movement and throws
+    "ring",  # Ring movement, collisions and their outcome
+    "interpolate",  # Placing sprites between the last two steps
+    "background",  # Restoring or drawing the rink
+    "particles",  # Moving and drawing effects
+    "sprites",
+    "hud",
+    "profiler",  # Drawing this graph
+    "display",  # display.update or flip
+    "tick",  # Waiting in clock.tick or for the frame pacer
+)
+HISTORY_FRAMES = 1024
+FRAME_BUDGET = 1000 / 60  # Milliseconds; the line drawn across the graph
+GRAPH_WIDTH = 240  # One column per frame
+GRAPH_HEIGHT = 80
+GRAPH_SCALE_MS = 2 * FRAME_BUDGET  # Frame time at the top of the graph
+READOUT_INTERVAL = 30  # Frames between updates of the text readout
+PHASE_COLORS = (
+    (120, 120, 255), (255, 160, 0), (200, 200, 200), (0, 200, 0), (0, 120, 0),
+    (255, 0, 255), (255, 60, 60), (160, 160, 0), (0, 160, 200), (255, 200, 150), (0, 220, 220),
+    (255, 255, 0), (90, 90, 90), (255, 120, 180), (60, 60, 60),
+)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class NullProfiler:
+    # Stands in when profiling is off
+    enabled = False
+
+    def begin_frame(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+
+class FrameProfiler:
+    enabled = True
+
+    def __init__(self, history=HISTORY_FRAMES):
+        self.history = history
+        self.phase_index = {name: i for i, name in enumerate(PHASES)}
+        self.times = array("d", bytes(8 * history * len(PHASES)))  # Seconds per frame and phase
+        self.starts = array("d", bytes(8 * history))  # perf_counter() at the start of each frame
+        self.frames = 0  # Frames begun so far
+        self.row = 0  # Offset of the current frame in times
+        self.last = time.perf_counter()
+        self.origin = self.last
+        # On-screen graph, built when first shown
+        self.visible = False
+        self.graph = None
+        self.readout = []
+        self.font = None
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        slot = self.frames % self.history
+        self.row = slot * len(PHASES)
+        for i in range(self.row, self.row + len(PHASES)):
+            self.times[i] = 0.0
+        self.starts[slot] = now
+        self.frames += 1
+        self.last = now
+
+    def mark(self, phase):
+        # Adds the time since the previous mark to phase
+        now = time.perf_counter()
+        self.times[self.row + self.phase_index[phase]] += now - self.last
+        self.last = now
+
+    def recorded_slots(self):
+        # Ring buffer slots of the finished frames, oldest first
+        count = min(self.frames - 1, self.history)
+        first = self.frames - 1 - count
+        return [(first + i) % self.history for i in range(count)]
+
+    def frame_ms(self, slot):
+        row = slot * len(PHASES)
+        return [self.times[row + i] * 1000 for i in range(len(PHASES))]
+
+    def summary(self):
+        # Mean and percentiles in milliseconds of each phase and the whole frame
+        rows = [self.frame_ms(slot) for slot in self.recorded_slots()]
+        columns = {name: sorted(row[i] for row in rows) for i, name in enumerate(PHASES)}
+        columns["frame"] = sorted(sum(row) for row in rows)
+        result = {}
+        for name, values in columns.items():
+            result[name] = {
+                "mean": sum(values) / len(values) if values else 0.0,
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+                "max": values[-1] if values else 0.0,
+            }
+        return result
+
+    # Exports
+
+    def export(self, path):
+        # Format from the file name: .csv, .trace.json (Chrome trace) or .json
+        if path.endswith(".csv"):
+            self.export_csv(path)
+        elif path.endswith(".trace.json"):
+            self.export_chrome_trace(path)
+        else:
+            self.export_json(path)
+
+    def export_json(self, path):
+        slots = self.recorded_slots()
+        with open(path, "w") as f:
+            json.dump({
+                "phases": list(PHASES),
+                "summary": self.summary(),
+                "frames": [dict(zip(PHASES, self.frame_ms(slot))) for slot in slots],
+            }, f, indent=1)
+
+    def export_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["start_ms", "frame_ms"] + list(PHASES))
+            for slot in self.recorded_slots():
+                row = self.frame_ms(slot)
+                writer.writerow([f"{(self.starts[slot] - self.origin) * 1000:.3f}", f"{sum(row):.3f}"]
+                                + [f"{value:.3f}" for value in row])
+
+    def export_chrome_trace(self, path):
+        # Loads in chrome://tracing and Perfetto. Phases are laid out one after
+        # another inside their frame; time a phase spent spread over several
+        # steps is shown as one block.
+        events = []
+        for slot in self.recorded_slots():
+            start = (self.starts[slot] - self.origin) * 1e6
+            row = self.frame_ms(slot)
+            events.append({"name": "frame", "ph": "X", "pid": 1, "tid": 1,
+                           "ts": start, "dur": sum(row) * 1000})
+            for name, duration in zip(PHASES, row):
+                if duration > 0:
+                    events.append({"name": name, "ph": "X", "pid": 1, "tid": 1,
+                                   "ts": start, "dur": duration * 1000})
+                    start += duration * 1000
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    # On-screen graph
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def draw(self, screen):
+        # Draws the graph in the bottom left corner and returns the area it covered
+        if self.graph is None:
+            self.graph = pygame.Surface((GRAPH_WIDTH, GRAPH_HEIGHT))
+            self.graph.fill((0, 0, 0))
+            self.font = pygame.font.Font(None, 16)
+        self.add_column()
+        if self.frames % READOUT_INTERVAL == 0 or not self.readout:
+            self.update_readout()
+
+        x = 10
+        y = screen.get_height() - GRAPH_HEIGHT - 10
+        area = screen.blit(self.graph, (x, y))
+        budget_y = y + GRAPH_HEIGHT - int(GRAPH_HEIGHT * FRAME_BUDGET / GRAPH_SCALE_MS)
+        pygame.draw.line(screen, (255, 255, 255), (x, budget_y), (x + GRAPH_WIDTH - 1, budget_y))
+        for line in reversed(self.readout):
+            y -= line.get_height()
+            area = area.union(screen.blit(line, (x, y)))
+        return area
+
+    def add_column(self):
+        # Scroll the graph left and draw the last finished frame as a stacked bar
+        if self.frames < 2:
+            return
+        graph = self.graph
+        graph.scroll(-1, 0)
+        column = GRAPH_WIDTH - 1
+        pygame.draw.line(graph, (0, 0, 0), (column, 0), (column, GRAPH_HEIGHT - 1))
+        bottom = GRAPH_HEIGHT
+        for color, value in zip(PHASE_COLORS, self.frame_ms((self.frames - 2) % self.history)):
+            height = value * GRAPH_HEIGHT / GRAPH_SCALE_MS
+            top = max(int(bottom - height), 0)
+            if top < bottom:
+                pygame.draw.line(graph, color, (column, top), (column, bottom - 1))
+                bottom = top
+
+    def update_readout(self):
+        summary = self.summary()
+        frame = summary.pop("frame")
+        slowest = sorted(summary, key=lambda name: summary[name]["p95"], reverse=True)[:3]
+        lines = [(f"frame p50 {frame['p50']:.2f}  p95 {frame['p95']:.2f}  p99 {frame['p99']:.2f} ms",
+                  (255, 255, 255))]
+        # The slowest phases, in their graph colors
+        lines += [(f"{name} p95 {summary[name]['p95']:.2f} ms", PHASE_COLORS[PHASES.index(name)])
+                  for name in slowest]
+        self.readout = [self.font.render(text, True, color, (0, 0, 0)) for text, color in lines]
+
+
+class LatencyMeter:
+    # Input-to-screen latency for main.py --latency. pygame doesn't pass on
+    # SDL's event timestamps, so a key press or click is taken to have
+    # happened halfway between the loop's last two reads of the event queue
+    # (the average for a press at a random moment). It counts as shown once
+    # a step has applied it and the next frame is presented, plus however
+    # far behind the newest step that frame's sprites were interpolated.
+    def __init__(self):
+        self.samples = []  # Milliseconds
+        self.last_poll = None
+        self.unstepped = []  # Estimated press times not yet seen by a step
+        self.stepped = []  # Applied by a step, waiting for the next present
+
+    def polled(self, now, presses):
+        # The event queue was read at now and held presses key presses or clicks
+        pressed = now if self.last_poll is None else (now + self.last_poll) / 2
+        self.unstepped.extend([pressed] * presses)
+        self.last_poll = now
+
+    def step(self):
+        self.stepped.extend(self.unstepped)
+        self.unstepped = []
+
+    def presented(self, now, behind=0.0):
+        # A frame was presented at now, drawn behind seconds of game time behind the newest step
+        for pressed in self.stepped:
+            self.samples.append((now + behind - pressed) * 1000)
+        self.stepped = []
+
+    def summary(self):
+        values = sorted(self.samples)
+        return {"presses": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99), "max": values[-1] if values else 0.0}
+
+    def report(self):
+        summary = self.summary()
+        return (f"Input latency over {summary['presses']} presses: p50 {summary['p50']:.1f} ms, "
+                f"p95 {summary['p95']:.1f} ms, p99 {summary['p99']:.1f} ms, max {summary['max']:.1f} ms")
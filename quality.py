@@ -0,0 +1,94 @@
+# Adaptive quality, so one build runs smoothly on slow and fast machines.
+# main.py tells the QualityGovernor how long each frame's work took (all of
+# it but waiting for the next frame). When the slowest frames among the last
+# WINDOW come close to the frame budget it drops one level, giving up the
+# optional work in LEVELS in order, and after a long run of frames with
+# plenty of headroom it goes back up one. The last levels draw fewer frames a
+# second. The simulation never gives anything up: each frame then runs more
+# of the fixed steps, so the game keeps its speed.
+#
+#   python main.py --quality auto   adapt (the default)
+#   python main.py --quality 2      stay at level 2
+import pygame
+from game import FPS
+from profiler import percentile
+
+# Name, share of the particle effects kept, frames per HUD redraw and what the
+# frame rate is divided by
+LEVELS = (
+    ("full", 1.0, 1, 1),
+    ("fewer effects", 0.5, 1, 1),
+    ("slower HUD", 0.5, 4, 1),
+    ("no effects", 0.0, 4, 1),
+    ("half frame rate", 0.0, 4, 2),
+    ("third frame rate", 0.0, 4, 3),
+)
+WINDOW = 30  # Frames looked at, and frames to wait after a change
+DEGRADE_AT = 0.85  # Drop a level when the 90th percentile frame passes this share of the budget
+RESTORE_AT = 0.5  # Frames taking less than this share of the level above's budget have headroom
+RESTORE_FRAMES = 3 * FPS  # Frames in a row with headroom before going up a level
+MAX_RESTORE_FRAMES = 60 * FPS  # Longest wait after levels that had to be dropped again
+INDICATOR_COLOR = (255, 160, 0)
+
+
+class QualityGovernor:
+    def __init__(self, fps=FPS, level=0, adaptive=True):
+        self.fps = fps
+        self.adaptive = adaptive
+        self.works = []  # Seconds of work in each of the last WINDOW frames
+        self.calm = 0  # Frames in a row with headroom
+        self.restore_frames = RESTORE_FRAMES
+        self.restored = None  # When the level last went up, in frames
+        self.frames = 0
+        self.font = None
+        self.label = None  # Indicator for the current level, made when first drawn
+        self.set_level(level)
+
+    def set_level(self, level):
+        # Switches to level (0 is full quality); it stays there unless adaptive
+        self.level = max(0, min(level, len(LEVELS) - 1))
+        self.name, self.effects, self.hud_interval, self.divider = LEVELS[self.level]
+        self.frame_rate = self.fps / self.divider
+        # Frames faster than this could run at the level above
+        self.headroom = RESTORE_AT * LEVELS[max(0, self.level - 1)][3] / self.fps
+        self.works = []
+        self.calm = 0
+        self.wait = WINDOW
+        self.label = None
+
+    def frame(self, work):
+        # Call once per frame with the seconds spent on it; True when the level changed
+        self.frames += 1
+        if not self.adaptive:
+            return False
+        works = self.works
+        works.append(work)
+        if len(works) > WINDOW:
+            del works[0]
+        self.calm = self.calm + 1 if work < self.headroom else 0
+        if self.wait:
+            self.wait -= 1
+            return False
+        if percentile(sorted(works), 0.9) > DEGRADE_AT / self.frame_rate and self.level < len(LEVELS) - 1:
+            if self.restored is not None and self.frames - self.restored < 2 * WINDOW:
+                # Going up was a mistake; wait longer before trying again
+                self.restore_frames = min(2 * self.restore_frames, MAX_RESTORE_FRAMES)
+            self.set_level(self.level + 1)
+            return True
+        if self.calm >= self.restore_frames and self.level > 0:
+            self.restored = self.frames
+            self.set_level(self.level - 1)
+            return True
+        return False
+
+    def draw(self, screen):
+        # The level in the bottom right corner while it isn't full quality;
+        # returns the area covered, or None
+        if self.level == 0:
+            return None
+        if self.label is None:
+            if self.font is None:
+                self.font = pygame.font.Font(None, 16)
+            self.label = self.font.render(f"Quality {self.level}: {self.name}", True, INDICATOR_COLOR, (0, 0, 0)).convert()
+        width, height = screen.get_size()
+        return screen.blit(self.label, self.label.get_rect(bottomright=(width - 10, height - 10)))
@@ -0,0 +1,397 @@
+# Binary match recordings.
+#
+#   python main.py --record match.rgr       record while playing
+#   python main.py --replay match.rgr       watch it again (--speed max, --seek)
+#   python replay.py match.rgr --seek 90    replay headless and check it
+#   python replay.py *.rgr --scan           summarize many files without simulating
+#
+# A file is a small JSON header followed by blocks. Each block starts with a
+# keyframe (the complete game state, random generator included) and holds up
+# to keyframe_interval fixed-width step records: the inputs of every skater,
+# the random draws made during the step and a compact copy of the state after
+# it. Every record and keyframe of a file has the same size, and closing the
+# file appends an index of the keyframes, so seeking to any frame is a lookup
+# plus at most one block of simulation. A recording that was cut short has no
+# index; it is rebuilt by walking the blocks.
+import argparse
+import bisect
+import json
+import math
+import mmap
+import os
+import random
+import struct
+import time
+from game import *
+
+MAGIC = b"RGRP"
+INDEX_MAGIC = b"RGIX"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")  # Magic, version, length of the JSON that follows
+INDEX_ENTRY = struct.Struct("<IQ")  # Frame and file offset of a keyframe
+INDEX_TAIL = struct.Struct("<Q4s")  # Offset of the index, INDEX_MAGIC
+KEYFRAME_INTERVAL = 10 * FPS  # Frames between keyframes
+MAX_DRAWS = 3  # A goalie save uses three random numbers, nothing else uses more
+EVENT_NAMES = ("shot", "pickup", "drop", "shot_clock", "throw", "catch", "save", "goal", "check")
+INPUT_FLAGS = ("left", "right", "up", "down", "shoot", "pickup")
+GOALIE_CARRIER = (-2, -3)  # Carrier codes for goalie1 and goalie2; -1 is a loose ring
+
+
+def step_fields(skaters):
+    # Name and struct code of every field of a step record
+    fields = [("running", "B")]
+    for i in range(skaters):
+        fields += [(f"input{i}", "B"), (f"aim_x{i}", "h"), (f"aim_y{i}", "h")]
+    fields += [("ring_x", "f"), ("ring_y", "f"), ("goalie1_y", "h"), ("goalie2_y", "h")]
+    for i in range(skaters):
+        fields += [(f"x{i}", "h"), (f"y{i}", "h")]
+    fields += [("carrier", "b"), ("score", "H"), ("shot_clock", "h"), ("events", "H"), ("draws", "B")]
+    fields += [(f"draw{i}", "d") for i in range(MAX_DRAWS)]
+    return fields
+
+
+def keyframe_format(skaters):
+    return ("<IIIIhdB" + "ddddd"  # Frame, scores, shot clock, flags, ring
+            + "hbBHddH" * 2  # Goalies
+            + "hhBbb" * skaters
+            + "625Id")  # Random generator state
+
+
+class RecordingRandom(random.Random):
+    # Keeps every number handed out since draws was last cleared
+    def __init__(self, seed=None):
+        self.draws = []
+        super().__init__(seed)
+
+    def random(self):
+        value = super().random()
+        self.draws.append(value)
+        return value
+
+
+class ReplayRandom(random.Random):
+    # Hands out the recorded numbers of the current step. The generator still
+    # advances, so it stays usable if the game carries on after the replay.
+    def __init__(self, seed=None):
+        self.draws = []
+        super().__init__(seed)
+
+    def random(self):
+        value = super().random()
+        if not self.draws:
+            raise ValueError("Replay diverged: the game drew a random number the recording doesn't have")
+        return self.draws.pop(0)
+
+
+def quantize(inputs):
+    # The aim is stored in whole pixels, so the recorded game uses it that way too
+    return Inputs(inputs.left, inputs.right, inputs.up, inputs.down, inputs.shoot, inputs.pickup,
+                  (int(round(inputs.aim[0])), int(round(inputs.aim[1]))))
+
+
+def carrier_code(state):
+    for i, skater in enumerate(state.skaters):
+        if skater.has_ring:
+            return i
+    for code, goalie in zip(GOALIE_CARRIER, state.goalies):
+        if goalie.has_ring:
+            return code
+    return -1
+
+
+class Layout:
+    # Sizes of everything in a file with a given number of skaters
+    def __init__(self, header):
+        self.header = header
+        self.skaters = sum(header["roster"])
+        self.interval = header["keyframe_interval"]
+        self.step = struct.Struct("<" + "".join(code for _, code in step_fields(self.skaters)))
+        self.keyframe = struct.Struct(keyframe_format(self.skaters))
+        self.block_size = self.keyframe.size + self.interval * self.step.size
+        self.goalie_ai = None
+        if header.get("goalie_ai"):
+            from ai import AI, load_tables  # Only games against AI goalies need the tables
+
+            tables = load_tables()
+            if tables is None:
+                raise ValueError("Replay was recorded with AI goalies but the AI tables are missing")
+            self.goalie_ai = AI(tables, Rules(**header["rules"]))
+
+    def pack_step(self, state, running, controls, draws):
+        values = [running]
+        for inputs in controls:
+            flags = 0
+            for bit, name in enumerate(INPUT_FLAGS):
+                if getattr(inputs, name):
+                    flags |= 1 << bit
+            values += [flags, inputs.aim[0], inputs.aim[1]]
+        ring = state.ring
+        values += [ring.position[0], ring.position[1], state.goalie1.rect.y, state.goalie2.rect.y]
+        for skater in state.skaters:
+            values += [skater.rect.x, skater.rect.y]
+        events = 0
+        for name in state.events:
+            events |= 1 << EVENT_NAMES.index(name)
+        values += [carrier_code(state), state.score, state.shot_clock, events, len(draws)]
+        values += list(draws) + [0.0] * (MAX_DRAWS - len(draws))
+        return self.step.pack(*values)
+
+    def unpack_step(self, data, offset=0):
+        # (shot clock running, inputs of every skater, random draws)
+        values = self.step.unpack_from(data, offset)
+        controls = []
+        for i in range(self.skaters):
+            flags, aim_x, aim_y = values[1 + i * 3:4 + i * 3]
+            controls.append(Inputs(*(bool(flags & (1 << bit)) for bit in range(len(INPUT_FLAGS))),
+                                   aim=(aim_x, aim_y)))
+        draw_count = values[-MAX_DRAWS - 1]
+        return bool(values[0]), controls, list(values[len(values) - MAX_DRAWS:][:draw_count])
+
+    def pack_keyframe(self, state):
+        ring = state.ring
+        flags = state.shot_clock_running | state.ring_picked_up_since_goal << 1 | ring.active << 2
+        values = [state.frame, state.score, state.team_scores[0], state.team_scores[1],
+                  state.shot_clock, state.shot_clock_elapsed, flags,
+                  ring.position[0], ring.position[1], ring.velocity[0], ring.velocity[1], ring.decay_factor]
+        for goalie in state.goalies:
+            values += [goalie.rect.y, goalie.direction, goalie.has_ring, goalie.hold_time,
+                       goalie.throw_direction[0], goalie.throw_direction[1], goalie.throw_cooldown]
+        for skater in state.skaters:
+            values += [skater.rect.x, skater.rect.y, skater.has_ring, skater.direction[0], skater.direction[1]]
+        _, words, gauss = state.random.getstate()
+        values += list(words) + [math.nan if gauss is None else gauss]
+        return self.keyframe.pack(*values)
+
+    def unpack_keyframe(self, data, offset=0):
+        values = list(self.keyframe.unpack_from(data, offset))
+        state = GameState(rules=Rules(**self.header["rules"]), roster=self.header["roster"])
+        state.goalie_ai = self.goalie_ai
+        (state.frame, state.score, score0, score1, state.shot_clock,
+         state.shot_clock_elapsed, flags) = values[:7]
+        state.team_scores = [score0, score1]
+        state.shot_clock_running = bool(flags & 1)
+        state.ring_picked_up_since_goal = bool(flags & 2)
+        ring = state.ring
+        ring.active = bool(flags & 4)
+        ring.set_position(values[7], values[8])
+        ring.velocity = [values[9], values[10]]
+        ring.decay_factor = values[11]
+        position = 12
+        for goalie in state.goalies:
+            (goalie.rect.y, goalie.direction, has_ring, goalie.hold_time,
+             throw_x, throw_y, goalie.throw_cooldown) = values[position:position + 7]
+            goalie.has_ring = bool(has_ring)
+            goalie.throw_direction = [throw_x, throw_y]
+            position += 7
+        for skater in state.skaters:
+            skater.rect.x, skater.rect.y, has_ring, direction_x, direction_y = values[position:position + 5]
+            skater.has_ring = bool(has_ring)
+            skater.direction = (direction_x, direction_y)
+            position += 5
+        gauss = values[-1]
+        state.random = ReplayRandom()
+        state.random.setstate((3, tuple(values[position:position + 625]), None if math.isnan(gauss) else gauss))
+        state.rebuild_grid()
+        return state
+
+
+class ReplayRecorder:
+    # Drop-in for GameState.step() that also writes everything to path
+    def __init__(self, path, state, dt=1 / FPS, keyframe_interval=KEYFRAME_INTERVAL):
+        self.state = state
+        self.dt = dt
+        roster = [sum(1 for skater in state.skaters if skater.team == team) for team in (0, 1)]
+        header = {"version": VERSION, "fps": FPS, "dt": dt, "roster": roster,
+                  "rules": state.rules.as_dict(), "keyframe_interval": keyframe_interval,
+                  "goalie_ai": state.goalie_ai is not None}
+        self.layout = Layout(header)
+        # Swap in a generator that remembers its draws, carrying on where the old one was
+        generator = RecordingRandom()
+        generator.setstate(state.random.getstate())
+        state.random = generator
+        self.index = []
+        self.steps = 0
+        self.file = open(path, "wb")
+        text = json.dumps(header).encode("utf-8")
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(text)))
+        self.file.write(text)
+
+    def step(self, inputs=NO_INPUTS, dt=None, skater_inputs=None):
+        state = self.state
+        if dt is not None and dt != self.dt:
+            raise ValueError(f"Recording runs at a fixed step of {self.dt}, got {dt}")
+        if self.steps % self.layout.interval == 0:
+            # Whatever was written so far is complete, so flush it with the keyframe
+            self.file.flush()
+            self.index.append((state.frame, self.file.tell()))
+            self.file.write(self.layout.pack_keyframe(state))
+        controls = [quantize(inputs)]
+        for skater in state.skaters[1:]:
+            controls.append(quantize(skater_inputs.get(skater, NO_INPUTS) if skater_inputs else NO_INPUTS))
+        running = state.shot_clock_running
+        state.random.draws.clear()
+        events = state.step(controls[0], self.dt, dict(zip(state.skaters[1:], controls[1:])))
+        self.file.write(self.layout.pack_step(state, running, controls, state.random.draws))
+        self.steps += 1
+        return events
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(struct.pack("<I", len(self.index)))
+        for frame, offset in self.index:
+            self.file.write(INDEX_ENTRY.pack(frame, offset))
+        self.file.write(INDEX_TAIL.pack(index_offset, INDEX_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Replay:
+    # A recording opened for reading. The file is memory mapped, so opening
+    # and seeking don't read more than the parts that are used.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, length = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a replay")
+        if version != VERSION:
+            raise ValueError(f"{path} is replay version {version}, expected {VERSION}")
+        self.header = json.loads(self.data[HEADER.size:HEADER.size + length])
+        self.layout = Layout(self.header)
+        self.data_start = HEADER.size + length
+        self.index, data_end = self.read_index()
+        # Steps in each block; only the last one can be short
+        self.block_steps = [min(self.layout.interval, (data_end - offset - self.layout.keyframe.size)
+                                // self.layout.step.size) for _, offset in self.index]
+        self.start_frame = self.index[0][0] if self.index else 0
+        self.frames = sum(self.block_steps)
+
+    def read_index(self):
+        data = self.data
+        if len(data) >= self.data_start + INDEX_TAIL.size:
+            index_offset, magic = INDEX_TAIL.unpack_from(data, len(data) - INDEX_TAIL.size)
+            if magic == INDEX_MAGIC:
+                count, = struct.unpack_from("<I", data, index_offset)
+                entries = [INDEX_ENTRY.unpack_from(data, index_offset + 4 + i * INDEX_ENTRY.size)
+                           for i in range(count)]
+                return entries, index_offset
+        # Cut short: every block has the same size, so walk them
+        entries = []
+        offset = self.data_start
+        while offset + self.layout.keyframe.size <= len(data):
+            frame, = struct.unpack_from("<I", data, offset)
+            entries.append((frame, offset))
+            offset += self.layout.block_size
+        return entries, len(data)
+
+    def close(self):
+        self.data.close()
+
+    def frame_at(self, seconds):
+        return self.start_frame + int(seconds * self.header["fps"])
+
+    def step_offset(self, frame):
+        block, step = divmod(frame - self.start_frame, self.layout.interval)
+        return self.index[block][1] + self.layout.keyframe.size + step * self.layout.step.size
+
+    def read_step(self, frame):
+        return self.layout.unpack_step(self.data, self.step_offset(frame))
+
+    def raw_step(self, frame):
+        offset = self.step_offset(frame)
+        return self.data[offset:offset + self.layout.step.size]
+
+    def keyframe_before(self, frame):
+        # The game state at the last keyframe at or before frame
+        block = max(bisect.bisect_right([f for f, _ in self.index], frame) - 1, 0)
+        return self.layout.unpack_keyframe(self.data, self.index[block][1])
+
+    def scan(self):
+        # Every step record as one NumPy structured array, without simulating
+        import numpy as np  # Only needed for scanning
+
+        dtype = np.dtype([(name, "<" + code) for name, code in step_fields(self.layout.skaters)])
+        blocks = [np.frombuffer(self.data, dtype, count, offset + self.layout.keyframe.size)
+                  for (_, offset), count in zip(self.index, self.block_steps)]
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype)
+
+
+class Playback:
+    # Runs a recording forward from any frame, checking each step against it
+    def __init__(self, replay, start_frame=None, verify=True):
+        self.replay = replay
+        self.verify = verify
+        start_frame = replay.start_frame if start_frame is None else start_frame
+        start_frame = min(max(start_frame, replay.start_frame), replay.start_frame + replay.frames)
+        self.state = replay.keyframe_before(start_frame)
+        while self.state.frame < start_frame:
+            self.step()
+
+    @property
+    def done(self):
+        return self.state.frame >= self.replay.start_frame + self.replay.frames
+
+    def step(self):
+        # Replays one recorded step and returns its events
+        state = self.state
+        frame = state.frame
+        running, controls, draws = self.replay.read_step(frame)
+        state.shot_clock_running = running
+        state.random.draws = list(draws)
+        events = state.step(controls[0], self.replay.header["dt"], dict(zip(state.skaters[1:], controls[1:])))
+        if self.verify:
+            if state.random.draws:
+                raise ValueError(f"Replay diverged at frame {frame}: recorded random draws were not used")
+            if self.replay.layout.pack_step(state, running, controls, draws) != self.replay.raw_step(frame):
+                raise ValueError(f"Replay diverged at frame {frame}")
+        return events
+
+
+def summarize_scan(records):
+    totals = {name: 0 for name in EVENT_NAMES}
+    for bit, name in enumerate(EVENT_NAMES):
+        totals[name] = int(((records["events"] >> bit) & 1).sum())
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded matches without a window")
+    parser.add_argument("files", nargs="+", help="replay files")
+    parser.add_argument("--seek", type=float, default=0, help="start this many seconds in")
+    parser.add_argument("--scan", action="store_true", help="read the recorded states instead of simulating")
+    parser.add_argument("--no-verify", dest="verify", action="store_false",
+                        help="don't compare the replayed game with the recording")
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        replay = Replay(path)
+        fps = replay.header["fps"]
+        started = time.perf_counter()
+        if args.scan:
+            records = replay.scan()[replay.frame_at(args.seek) - replay.start_frame:]
+            totals = summarize_scan(records)
+            steps = len(records)
+        else:
+            playback = Playback(replay, replay.frame_at(args.seek), args.verify)
+            totals = {name: 0 for name in EVENT_NAMES}
+            steps = 0
+            while not playback.done:
+                for event in playback.step():
+                    totals[event] += 1
+                steps += 1
+        elapsed = time.perf_counter() - started
+        events = "  ".join(f"{name}={count}" for name, count in totals.items() if count)
+        print(f"{os.path.basename(path)}: {replay.frames / fps:.1f}s, {steps} steps in {elapsed:.2f}s  {events}")
+        replay.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Uniform grid over the rink for proximity queries. Every step the skaters are
+# dropped into the cells their rects cover, so "who is near the ring" and "who
+# is touching whom" only look at a few cells instead of every pair of skaters.
+from assets import RINK_WIDTH, RINK_HEIGHT
+
+CELL_SIZE = 64  # Bigger than a skater, so each one covers at most four cells
+
+
+class SpatialHash:
+    def __init__(self, cell_size=CELL_SIZE, width=RINK_WIDTH, height=RINK_HEIGHT):
+        self.cell_size = cell_size
+        self.columns = width // cell_size + 1
+        self.rows = height // cell_size + 1
+        self.cells = {}
+
+    def clear(self):
+        self.cells.clear()
+
+    def cell_range(self, left, top, right, bottom):
+        size = self.cell_size
+        first_column = min(max(int(left) // size, 0), self.columns - 1)
+        last_column = min(max(int(right) // size, 0), self.columns - 1)
+        first_row = min(max(int(top) // size, 0), self.rows - 1)
+        last_row = min(max(int(bottom) // size, 0), self.rows - 1)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                yield row * self.columns + column
+
+    def insert(self, item, rect):
+        for cell in self.cell_range(rect.left, rect.top, rect.right - 1, rect.bottom - 1):
+            self.cells.setdefault(cell, []).append(item)
+
+    def rebuild(self, items):
+        # clear() and then insert() each item by its .rect, in one pass that
+        # fills the cells in the same order. GameState rebuilds the grid up
+        # to twice a step, so this is the hot path of a crowded rink.
+        cells = self.cells
+        cells.clear()
+        size = self.cell_size
+        columns = self.columns
+        last_column = columns - 1
+        last_row = self.rows - 1
+        for item in items:
+            left, top, width, height = item.rect
+            # Clamped to the grid with comparisons; min() and max() calls
+            # would cost more than the rest of the loop
+            first_column = left // size
+            last = (left + width - 1) // size
+            first_column = 0 if first_column < 0 else last_column if first_column > last_column else first_column
+            last = 0 if last < 0 else last_column if last > last_column else last
+            first_row = top // size
+            bottom = (top + height - 1) // size
+            first_row = 0 if first_row < 0 else last_row if first_row > last_row else first_row
+            bottom = 0 if bottom < 0 else last_row if bottom > last_row else bottom
+            for row in range(first_row * columns, (bottom + 1) * columns, columns):
+                for cell in range(row + first_column, row + last + 1):
+                    found = cells.get(cell)
+                    if found is None:
+                        cells[cell] = [item]
+                    else:
+                        found.append(item)
+
+    def query(self, left, top, right, bottom):
+        # Everything in the cells touching the box (callers do the exact test)
+        found = []
+        seen = set()
+        for cell in self.cell_range(left, top, right, bottom):
+            for item in self.cells.get(cell, ()):
+                if id(item) not in seen:
+                    seen.add(id(item))
+                    found.append(item)
+        return found
+
+    def near(self, point, radius):
+        x, y = point
+        return self.query(x - radius, y - radius, x + radius, y + radius)
+
+    def pairs(self):
+        # Each pair of items sharing at least one cell, once
+        seen = set()
+        for items in self.cells.values():
+            if len(items) < 2:
+                continue
+            for i, first in enumerate(items):
+                for second in items[i + 1:]:
+                    key = (id(first), id(second)) if id(first) < id(second) else (id(second), id(first))
+                    if key not in seen:
+                        seen.add(key)
+                        yield first, second
@@ -0,0 +1,222 @@
+# Parameter sweeps over the game's balance settings.
+#
+#   python sweep.py ring_speed=4,5,6 catch_chance=0.6,0.7 --games 16
+#
+# Every combination of values is a cell. Each cell plays a number of headless
+# games with a scripted skater, spread over a process pool. Finished games are
+# cached on disk under a hash of their settings and seed, so rerunning a sweep
+# (or resuming an interrupted one) only plays the games that are missing.
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import sys
+from multiprocessing import Pool
+from game import *
+
+# Bump when the rules or the scripted skater change so old results are ignored
+SWEEP_VERSION = 3
+DEFAULT_CACHE_DIR = ".sweep_cache"
+GAME_MINUTES = 5
+SHOOTING_X = GOAL_LINE_2_X - 220  # Where the scripted skater lines up its shots
+LOOSE_RING_SPEED = 1  # The skater only picks up a ring that has nearly stopped
+# What became of a shot: the first of these after it, or a miss when someone
+# picks the ring up, the next shot is taken or the game ends first. A shot
+# that bounces off a goalie more than once is still one save.
+SHOT_OUTCOMES = ("goal", "catch", "save")
+
+
+def config_hash(config):
+    text = json.dumps(config, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def job_seed(cell, game):
+    # Seeds depend only on the cell and game number, never on scheduling
+    return int(config_hash({"cell": cell, "game": game})[:16], 16)
+
+
+def scripted_inputs(state, bot):
+    # A simple skater: chase the ring, pick it up once it slows down, carry it
+    # to the shooting spot and shoot at the right-hand goal
+    player, ring = state.player, state.ring
+    if player.has_ring:
+        inputs = steer(player.rect, (SHOOTING_X, bot.shooting_y), state.rules.player_speed)
+        if not (inputs.left or inputs.right or inputs.up or inputs.down):
+            inputs.shoot = True
+            inputs.aim = (GOAL_LINE_2_X + GOAL_WIDTH // 2, HEIGHT // 2 + bot.random.uniform(-60, 60))
+            bot.shooting_y = bot.random.uniform(150, 450)
+        return inputs
+    inputs = steer(player.rect, ring.rect.center, state.rules.player_speed)
+    goalie_has_ring = any(goalie.has_ring for goalie in state.goalies)
+    ring_moving = ring.active and math.hypot(*ring.velocity) > LOOSE_RING_SPEED
+    if not goalie_has_ring and not ring_moving:
+        dx = ring.rect.centerx - player.rect.centerx
+        dy = ring.rect.centery - player.rect.centery
+        inputs.pickup = math.sqrt(dx * dx + dy * dy) <= state.rules.pickup_range
+    return inputs
+
+
+class Bot:
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.shooting_y = HEIGHT // 2
+
+
+def play_game(job):
+    rules_overrides, seed, frames = job
+    state = GameState(seed, Rules(**rules_overrides))
+    bot = Bot(seed + 1)
+    counts = {"shot": 0, "pickup": 0, "catch": 0, "save": 0, "goal": 0, "shot_clock": 0,
+              "shot_goal": 0, "shot_catch": 0, "shot_save": 0, "shot_miss": 0}
+    possession_frames = 0
+    shot_open = False  # The last shot has no outcome yet
+    for _ in range(frames):
+        events = state.step(scripted_inputs(state, bot))
+        for event in events:
+            if event in counts:
+                counts[event] += 1
+            if shot_open and event in SHOT_OUTCOMES:
+                counts["shot_" + event] += 1
+                shot_open = False
+            elif event in ("shot", "pickup"):
+                if shot_open:
+                    counts["shot_miss"] += 1
+                shot_open = event == "shot"
+        if state.player.has_ring:
+            possession_frames += 1
+    counts["shot_miss"] += shot_open
+    counts["possession_frames"] = possession_frames
+    counts["frames"] = frames
+    return counts
+
+
+def summarize(results):
+    totals = {}
+    for result in results:
+        for key, value in result.items():
+            totals[key] = totals.get(key, 0) + value
+    shots = max(totals["shot"], 1)
+    minutes = totals["frames"] / FPS / 60
+    return {
+        "games": len(results),
+        "shots": totals["shot"],
+        "goal_rate": totals["shot_goal"] / shots,
+        "save_rate": (totals["shot_catch"] + totals["shot_save"]) / shots,
+        "miss_rate": totals["shot_miss"] / shots,
+        "possession_seconds": totals["possession_frames"] / FPS / max(totals["pickup"], 1),
+        "shot_clock_expiries_per_minute": totals["shot_clock"] / minutes,
+    }
+
+
+class ResultCache:
+    # One small JSON file per finished game, named after the hash of its job
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so an interrupted sweep never leaves half a file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(temp_path, path)
+
+
+def expand_grid(grid):
+    names = sorted(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def run_sweep(grid, games=8, frames=GAME_MINUTES * 60 * FPS, workers=None,
+              cache_dir=DEFAULT_CACHE_DIR, progress=None):
+    cache = ResultCache(cache_dir)
+    cells = list(expand_grid(grid))
+    results = {i: [] for i in range(len(cells))}
+    pending = []
+    for i, cell in enumerate(cells):
+        rules = Rules(**cell).as_dict()  # Validates the names
+        for game in range(games):
+            seed = job_seed(rules, game)
+            key = config_hash({"version": SWEEP_VERSION, "rules": rules, "seed": seed, "frames": frames})
+            cached = cache.get(key)
+            if cached is None:
+                pending.append((i, key, (cell, seed, frames)))
+            else:
+                results[i].append(cached)
+
+    if pending:
+        with Pool(workers) as pool:
+            jobs = pool.imap(play_game, [job for _, _, job in pending])
+            for done, ((i, key, _), result) in enumerate(zip(pending, jobs), 1):
+                cache.put(key, result)
+                results[i].append(result)
+                if progress:
+                    progress(done, len(pending))
+
+    return [dict(cell, **summarize(results[i])) for i, cell in enumerate(cells)]
+
+
+def parse_values(text):
+    values = []
+    for item in text.split(","):
+        try:
+            values.append(int(item))
+        except ValueError:
+            values.append(float(item))
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep balance settings over headless games")
+    parser.add_argument("grid", nargs="+", help="name=value1,value2,... for any setting in game.Rules")
+    parser.add_argument("--games", type=int, default=8, help="games per cell")
+    parser.add_argument("--minutes", type=float, default=GAME_MINUTES, help="length of each game")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="result cache directory")
+    parser.add_argument("--out", help="also write the table to this CSV file")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    for item in args.grid:
+        name, _, values = item.partition("=")
+        if not values:
+            parser.error(f"Expected name=values, got {item!r}")
+        grid[name] = parse_values(values)
+
+    def progress(done, total):
+        print(f"\r{done}/{total} games", end="", file=sys.stderr, flush=True)
+
+    rows = run_sweep(grid, args.games, int(args.minutes * 60 * FPS), args.workers, args.cache, progress)
+    print(file=sys.stderr)
+
+    columns = list(rows[0])
+    print("  ".join(columns))
+    for row in rows:
+        print("  ".join(f"{row[c]:.3f}" if isinstance(row[c], float) else str(row[c]) for c in columns))
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
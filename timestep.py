@@ -0,0 +1,92 @@
+# Fixed-timestep driver: the rules always advance in steps of 1/FPS seconds of
+# game time, however fast or slow frames are drawn. Leftover time is exposed as
+# an interpolation factor so sprites can be drawn between two steps.
+import time
+from game import FPS
+
+STEP = 1 / FPS
+MAX_STEPS_PER_FRAME = 10  # At normal speed, drop time rather than spiral after a long stall
+MAX_FRAME_TIME = 0.25  # Seconds; longer pauses (dragging the window etc.) are ignored
+FAST_FORWARD_SPEEDS = (1, 8, None)  # None runs as many steps as fit in a frame
+
+
+class FixedTimestep:
+    def __init__(self, time_scale=1, step=STEP):
+        self.step = step
+        self.time_scale = time_scale
+        self.accumulator = 0.0
+
+    @property
+    def uncapped(self):
+        return self.time_scale is None
+
+    @property
+    def alpha(self):
+        # How far between the last two steps the next frame should be drawn
+        if self.uncapped:
+            return 1.0
+        return self.accumulator / self.step
+
+    def advance(self, frame_time):
+        # Number of steps to run for frame_time seconds of real time
+        if self.uncapped:
+            raise ValueError("Uncapped mode has no fixed step count")
+        self.accumulator += min(frame_time, MAX_FRAME_TIME) * self.time_scale
+        steps = int(self.accumulator / self.step)
+        max_steps = int(MAX_STEPS_PER_FRAME * max(1, self.time_scale))
+        if steps > max_steps:
+            steps = max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+    def next_speed(self):
+        # Cycle through normal speed, 8x and uncapped
+        speeds = FAST_FORWARD_SPEEDS
+        index = speeds.index(self.time_scale) if self.time_scale in speeds else -1
+        self.time_scale = speeds[(index + 1) % len(speeds)]
+        self.accumulator = 0.0
+        return self.time_scale
+
+
+SPIN_TIME = 0.002  # Seconds before a deadline to stop sleeping and spin; sleep() can overshoot by a millisecond or more
+PACING_MARGIN = 0.001  # Seconds left spare between finishing a frame and its deadline
+WORK_DECAY = 0.99  # How fast the frame work estimate forgets a slow frame
+
+
+def sleep_until(deadline):
+    remaining = deadline - time.perf_counter()
+    if remaining > SPIN_TIME:
+        time.sleep(remaining - SPIN_TIME)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class FramePacer:
+    # Frame pacing for main.py --low-latency. clock.tick() sleeps after a
+    # frame, so with vsync the loop reads input just after one vblank and its
+    # frame waits in flip() for the next. This sleeps before the frame
+    # instead, until only the time it takes to read input, step and draw is
+    # left, so input is as fresh as possible when the frame is shown. Frames
+    # are due on an absolute schedule so timing errors don't add up, or
+    # one period after flip() returned with vsync, which locks to the display.
+    def __init__(self, fps, vsync=False):
+        self.period = 1 / fps
+        self.vsync = vsync
+        self.deadline = None  # When the next frame should be on screen
+        self.work = self.period / 4  # Time from reading input to presenting, a slowly decaying maximum
+        self.started = None
+
+    def wait(self):
+        # Sleeps until it's time to start the next frame
+        now = time.perf_counter()
+        if self.deadline is None or self.deadline - self.work < now:
+            self.deadline = now + self.work + PACING_MARGIN  # Behind: start straight away
+        sleep_until(self.deadline - self.work - PACING_MARGIN)
+        self.started = time.perf_counter()
+
+    def presented(self):
+        now = time.perf_counter()
+        self.work = max(now - self.started, self.work * WORK_DECAY)
+        self.deadline = (now if self.vsync else self.deadline) + self.period
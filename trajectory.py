@@ -0,0 +1,179 @@
+# Where a loose ring will go, worked out without stepping it. Ring.update keeps
+# velocity * decay ** k on step k, so after n steps the ring has travelled
+# velocity * (decay + decay ** 2 + ... + decay ** n), a geometric series, and
+# walls only mirror that path back into the rink. Positions, the stopping
+# point, wall bounces and the first target in the way all come out of a few
+# logarithms instead of hundreds of Ring.update calls. Results match stepping
+# the ring up to floating point rounding, until it hits something (a save or a
+# catch changes the decay, so the prediction ends there).
+import math
+from game import *
+
+LIMIT_X = WIDTH - RING_SIZE  # Furthest the ring's top-left corner can go
+LIMIT_Y = HEIGHT - RING_SIZE
+
+
+def fold(distance, limit):
+    # A coordinate that ran distance along a line folded back at 0 and limit
+    period = 2 * limit
+    distance %= period
+    return distance if distance <= limit else period - distance
+
+
+def direction(distance, limit):
+    # 1 while moving the way the ring started, -1 after an odd number of walls
+    return -1 if math.floor(distance / limit) % 2 else 1
+
+
+class Trajectory:
+    def __init__(self, position, velocity, decay):
+        # position is the ring's top-left corner and velocity its velocity
+        # before the next Ring.update, which decays it first
+        self.start = (min(max(position[0], 0), LIMIT_X), min(max(position[1], 0), LIMIT_Y))
+        self.velocity = tuple(velocity)
+        self.decay = decay
+        self.stop_step = self.find_stop_step()
+        # Distance along the whole path, in units of the starting velocity
+        self.total = math.inf if self.stop_step is None else self.travel(self.stop_step)
+
+    @classmethod
+    def from_ring(cls, ring):
+        if not ring.active:
+            return cls(ring.position, (0, 0), ring.decay_factor)
+        return cls(ring.position, ring.velocity, ring.decay_factor)
+
+    def find_stop_step(self):
+        # The step on which both velocity components drop below STOP_SPEED and
+        # the ring stays put; it moves on every step before this one. None if
+        # it never slows down that far.
+        speed = max(abs(self.velocity[0]), abs(self.velocity[1]))
+        if speed * self.decay < STOP_SPEED:
+            return 1
+        if self.decay >= 1:
+            return None
+        step = int(math.log(STOP_SPEED / speed) / math.log(self.decay)) + 1
+        # Step to the exact answer in case the logarithms rounded the wrong way
+        while step > 1 and speed * self.decay ** (step - 1) < STOP_SPEED:
+            step -= 1
+        while speed * self.decay ** step >= STOP_SPEED:
+            step += 1
+        return step
+
+    def travel(self, steps):
+        # Distance along the path after steps, in units of the starting velocity
+        if self.stop_step is not None:
+            steps = min(steps, self.stop_step - 1)
+        if self.decay == 1:
+            return float(steps)
+        return self.decay * (1 - self.decay ** steps) / (1 - self.decay)
+
+    def steps_to(self, travel):
+        # Steps (with a fraction for part of a step) it takes to travel that far,
+        # or None if the ring stops short of it
+        if travel <= 0:
+            return 0.0
+        if travel > self.total:
+            return None
+        if self.decay == 1:
+            return travel
+        decay = self.decay
+        step = math.ceil(math.log(1 - travel * (1 - decay) / decay) / math.log(decay))
+        step = max(step, 1)
+        # The step whose movement covers travel, correcting for rounding
+        while step > 1 and self.travel(step - 1) >= travel:
+            step -= 1
+        while self.travel(step) < travel:
+            step += 1
+        return step - 1 + (travel - self.travel(step - 1)) / decay ** step
+
+    def point(self, travel):
+        return (fold(self.start[0] + self.velocity[0] * travel, LIMIT_X),
+                fold(self.start[1] + self.velocity[1] * travel, LIMIT_Y))
+
+    def position_at(self, steps):
+        # Top-left corner of the ring after that many more steps
+        return self.point(self.travel(steps))
+
+    def velocity_at(self, steps):
+        # Ring.velocity after that many more steps
+        if self.stop_step is not None and steps >= self.stop_step:
+            return (0, 0)
+        travel = self.travel(steps)
+        scale = self.decay ** steps
+        return (self.velocity[0] * scale * direction(self.start[0] + self.velocity[0] * travel, LIMIT_X),
+                self.velocity[1] * scale * direction(self.start[1] + self.velocity[1] * travel, LIMIT_Y))
+
+    def stopping_point(self):
+        # Where the ring comes to rest, or None if it never does
+        if self.stop_step is None:
+            return None
+        return self.point(self.total)
+
+    def bounce_travels(self):
+        # Travel at each wall the ring reaches before it stops, in order
+        travels = []
+        for start, speed, limit in ((self.start[0], self.velocity[0], LIMIT_X),
+                                    (self.start[1], self.velocity[1], LIMIT_Y)):
+            if speed == 0 or math.isinf(self.total):
+                continue
+            # Walls sit at every multiple of limit along the unfolded line. A
+            # ring already on the wall it is moving into bounces straight away.
+            end = start + speed * self.total
+            if speed > 0:
+                walls = range(1, math.ceil(end / limit))
+            else:
+                walls = range(0, math.floor(end / limit), -1)
+            travels.extend((wall * limit - start) / speed for wall in walls)
+        return sorted(set(travels))
+
+    def bounces(self):
+        # (steps, point) for every wall bounce before the ring stops
+        return [(self.steps_to(travel), self.point(travel)) for travel in self.bounce_travels()]
+
+    def first_hit(self, targets):
+        # The first of targets the ring runs into as (target, steps, point), or
+        # None if it stops or runs off every one first. Targets are anything
+        # with a rect, checked the way Ring.update checks them (earlier ones
+        # win ties). The path is straight between bounces, so each stretch is
+        # a single swept test per target.
+        if math.isinf(self.total):
+            return None
+        edges = [0.0] + self.bounce_travels() + [self.total]
+        # A ring that doesn't move still hits whatever it is sitting in
+        stretches = [(begin, end) for begin, end in zip(edges, edges[1:]) if end > begin] or [(0.0, 0.0)]
+        for begin, end in stretches:
+            middle = (begin + end) / 2
+            motion = ((end - begin) * self.velocity[0] * direction(self.start[0] + self.velocity[0] * middle, LIMIT_X),
+                      (end - begin) * self.velocity[1] * direction(self.start[1] + self.velocity[1] * middle, LIMIT_Y))
+            start = self.point(begin)
+            hit, hit_time = None, None
+            for target in targets:
+                time = sweep_time(start, motion, target.rect)
+                if time is not None and (hit is None or time < hit_time):
+                    hit, hit_time = target, time
+            if hit is not None:
+                travel = begin + (end - begin) * hit_time
+                return hit, self.steps_to(travel), self.point(travel)
+        return None
+
+
+class Band:
+    # Everywhere a goalie can be while it skates back and forth in front of
+    # its goal, as a target for Trajectory.first_hit
+    def __init__(self, goalie):
+        self.goalie = goalie
+        top = min(goalie.goal_top, goalie.rect.top)
+        bottom = max(goalie.goal_bottom, goalie.rect.bottom)
+        self.rect = pygame.Rect(goalie.rect.x, top, goalie.rect.width, bottom - top)
+
+
+def predict_shot(state):
+    # Where the loose ring in state ends up: the goal or goalie band it reaches
+    # first as (target, steps, point), with Band wrapping the goalies, or
+    # (None, stop_step, stopping_point) if it comes to rest first
+    trajectory = Trajectory.from_ring(state.ring)
+    targets = [Band(goalie) for goalie in state.goalies if goalie.can_catch()] + list(state.goals)
+    hit = trajectory.first_hit(targets)
+    if hit is not None:
+        return hit
+    return None, trajectory.stop_step, trajectory.stopping_point()
@@ -0,0 +1,27 @@
+# Mapping between rink units, which game.py simulates in, and window pixels.
+# The rink is scaled to fit the window and centred, with the leftover space
+# as bars on the sides or top and bottom. Everything drawn at a given window
+# size (rink background, sprites, HUD text) is built once for that View.
+from assets import RINK_WIDTH, RINK_HEIGHT
+
+LETTERBOX_COLOR = (0, 0, 0)
+
+
+class View:
+    def __init__(self, size):
+        self.size = tuple(size)
+        self.scale = min(self.size[0] / RINK_WIDTH, self.size[1] / RINK_HEIGHT)
+        self.rink_size = (round(RINK_WIDTH * self.scale), round(RINK_HEIGHT * self.scale))
+        self.offset = ((self.size[0] - self.rink_size[0]) // 2, (self.size[1] - self.rink_size[1]) // 2)
+
+    def length(self, value):
+        # A distance or line width in rink units, in whole pixels (at least one)
+        return max(1, round(value * self.scale))
+
+    def to_screen(self, point):
+        # Window position of a point in rink units. Left as floats so that
+        # pygame.Rect rounds them the same way it rounds everything else.
+        return (self.offset[0] + point[0] * self.scale, self.offset[1] + point[1] * self.scale)
+
+    def to_rink(self, point):
+        return ((point[0] - self.offset[0]) / self.scale, (point[1] - self.offset[1]) / self.scale)